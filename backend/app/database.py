@@ -2,20 +2,77 @@
 # UniFi Backup Manager - Database Configuration
 # -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
 
+import asyncio
+import time
 from collections.abc import AsyncGenerator
+from typing import Any
 
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy import exc, make_url, text
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
-from app.config import get_settings
+from app.config import Settings, get_settings
+from app.metrics import PoolCollector, instrument_engine, registry
 
 settings = get_settings()
 
-engine = create_async_engine(
-    settings.database_url,
-    echo=settings.debug,
-    pool_pre_ping=True,
-)
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long checkouts wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.timeouts = 0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+
+def engine_options(settings: Settings) -> dict[str, Any]:
+    """Keyword arguments for create_async_engine built from settings."""
+    options: dict[str, Any] = {"echo": settings.debug, "pool_pre_ping": True}
+    url = make_url(settings.database_url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # In-memory SQLite needs its single shared connection.
+        return options
+
+    options.update(
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_recycle=settings.db_pool_recycle_seconds,
+        pool_timeout=settings.db_pool_timeout_seconds,
+    )
+    if url.get_driver_name() == "asyncpg":
+        options["connect_args"] = {
+            "prepared_statement_cache_size": settings.db_statement_cache_size
+        }
+    return options
+
+
+engine = create_async_engine(settings.database_url, **engine_options(settings))
+if settings.metrics_enabled:
+    instrument_engine(engine)
+    registry.register(PoolCollector(engine))
 
 AsyncSessionLocal = async_sessionmaker(
     engine,
@@ -45,3 +102,62 @@ async def init_db() -> None:
     """Initialize database tables."""
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+
+
+async def prewarm_pool(count: int, target: AsyncEngine = engine) -> int:
+    """Open up to ``count`` connections at once so they sit idle in the pool.
+
+    Never opens more than the pool's base size, since overflow connections
+    are closed on checkin. Returns how many connections were opened.
+    """
+    pool = target.pool
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        count = min(count, pool.size())
+    if count <= 0:
+        return 0
+
+    # Every connection is held until all are open; otherwise the pool would
+    # hand the same one back each time.
+    opened = 0
+    all_open = asyncio.Event()
+
+    async def open_one() -> None:
+        nonlocal opened
+        try:
+            async with target.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+                opened += 1
+                if opened == count:
+                    all_open.set()
+                await all_open.wait()
+        except Exception:
+            all_open.set()
+            raise
+
+    await asyncio.gather(*(open_one() for _ in range(count)))
+    return count
+
+
+def pool_status(target: AsyncEngine = engine) -> dict[str, Any]:
+    """Snapshot of connection pool usage."""
+    pool = target.pool
+    status: dict[str, Any] = {"pool_class": type(pool).__name__}
+    if not isinstance(pool, AsyncAdaptedQueuePool):
+        return status
+
+    status.update(
+        size=pool.size(),
+        checked_out=pool.checkedout(),
+        idle=pool.checkedin(),
+        overflow=max(pool.overflow(), 0),
+        max_overflow=pool._max_overflow,
+        timeout_seconds=pool.timeout(),
+    )
+    if isinstance(pool, InstrumentedQueuePool):
+        status.update(
+            checkouts=pool.checkouts,
+            timeouts=pool.timeouts,
+            wait_seconds_total=pool.wait_seconds_total,
+            wait_seconds_max=pool.wait_seconds_max,
+        )
+    return status
@@ -2,24 +2,31 @@
 # UniFi Backup Manager - FastAPI Dependencies
 # -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database import get_db
 from app.models.user import User
 from app.services.auth_service import AuthService
+from app.services.user_cache import user_cache
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: AsyncSession = Depends(get_db),
-) -> User:
-    """Dependency to get the current authenticated user."""
-    token = credentials.credentials
-    payload = AuthService.decode_token(token)
+async def _user_for_token(token: str, token_type: str, db: AsyncSession) -> User:
+    """Resolve a JWT of ``token_type`` to an active user, or raise 401/403.
+
+    Token payloads and user rows are served from ``user_cache`` when fresh; a
+    cached user is merged into the request session without a query so
+    handlers can still modify and commit it.
+    """
+    payload = user_cache.get_payload(token)
+    if payload is None:
+        payload = AuthService.decode_token(token)
+        if payload is not None:
+            user_cache.put_payload(token, payload)
 
     if payload is None:
         raise HTTPException(
@@ -28,7 +35,7 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    if payload.get("type") != "access":
+    if payload.get("type") != token_type:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token type",
@@ -43,7 +50,14 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    user = await AuthService.get_user_by_id(db, int(user_id))
+    snapshot = user_cache.get_user(int(user_id))
+    if snapshot is not None:
+        user = await db.merge(snapshot, load=False)
+    else:
+        user = await AuthService.get_user_by_id(db, int(user_id))
+        if user is not None:
+            user_cache.put_user(user)
+
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -60,6 +74,35 @@ async def get_current_user(
     return user
 
 
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_db),
+) -> User:
+    """Dependency to get the current authenticated user."""
+    return await _user_for_token(credentials.credentials, "access", db)
+
+
+async def get_event_stream_user(
+    token: str | None = Query(None),
+    credentials: HTTPAuthorizationCredentials | None = Depends(optional_security),
+    db: AsyncSession = Depends(get_db),
+) -> User:
+    """Dependency for the SSE stream, which EventSource can't send headers to.
+
+    Accepts a short-lived event stream token in ``?token=`` as well as the
+    usual bearer access token.
+    """
+    if token is not None:
+        return await _user_for_token(token, "events", db)
+    if credentials is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return await _user_for_token(credentials.credentials, "access", db)
+
+
 async def get_current_admin_user(
     current_user: User = Depends(get_current_user),
 ) -> User:
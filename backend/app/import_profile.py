@@ -0,0 +1,77 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Import Profiler
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+#
+# Reports what importing the app costs, module by module, using
+# Python's -X importtime in a fresh interpreter.
+# Run with: python -m app.import_profile [module] [--top N]
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import argparse
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import NamedTuple
+
+
+class ImportCost(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+
+
+def parse_importtime(output: str) -> list[ImportCost]:
+    """Parse ``-X importtime`` stderr into per-module costs."""
+    costs = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:") :].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # header line
+        costs.append(ImportCost(fields[2].strip(), int(fields[0]), int(fields[1])))
+    return costs
+
+
+def profile_import(module: str = "app.main") -> tuple[float, list[ImportCost]]:
+    """Import ``module`` in a fresh interpreter; returns wall seconds and costs."""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return time.perf_counter() - start, parse_importtime(result.stderr)
+
+
+def by_package(costs: list[ImportCost]) -> dict[str, int]:
+    """Total self time per top-level package, in microseconds."""
+    totals: dict[str, int] = defaultdict(int)
+    for cost in costs:
+        totals[cost.module.split(".")[0]] += cost.self_us
+    return dict(totals)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Report per-module import cost.")
+    parser.add_argument("module", nargs="?", default="app.main")
+    parser.add_argument("--top", type=int, default=25)
+    args = parser.parse_args()
+
+    wall, costs = profile_import(args.module)
+    print(f"import {args.module}: {wall * 1000:.0f} ms wall (including interpreter start)\n")
+
+    print("By package (self time):")
+    packages = sorted(by_package(costs).items(), key=lambda item: item[1], reverse=True)
+    for package, self_us in packages[: args.top]:
+        print(f"  {self_us / 1000:8.1f} ms  {package}")
+
+    print("\nBy module (cumulative):")
+    for cost in sorted(costs, key=lambda c: c.cumulative_us, reverse=True)[: args.top]:
+        print(f"  {cost.cumulative_us / 1000:8.1f} ms  {cost.module}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,9 @@
 # UniFi Backup Manager - Initialize Admin User
 # -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
 #
-# This script creates the initial admin user if one doesn't exist.
-# Run with: python -m app.init_admin
+# Creates the initial admin user if one doesn't exist. The API does this at
+# startup (see app.startup); this module can also be run by hand with:
+#   python -m app.init_admin
 #
 # Environment variables:
 #   ADMIN_USERNAME - Admin username (default: admin)
@@ -13,52 +14,59 @@
 # -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
 
 import asyncio
-import os
 import sys
 
 from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import get_settings
 from app.database import AsyncSessionLocal
 from app.models.user import User
 from app.services.auth_service import AuthService
 
 
-async def create_initial_admin():
-    """Create the initial admin user if one doesn't exist."""
-    username = os.environ.get("ADMIN_USERNAME", "admin")
-    email = os.environ.get("ADMIN_EMAIL", "admin@localhost")
-    password = os.environ.get("ADMIN_PASSWORD")
+async def ensure_admin(db: AsyncSession, username: str, email: str, password: str) -> str:
+    """Create the admin user unless an admin exists; returns a status message.
 
+    Raises ValueError when the password or username can't be used.
+    """
     if not password:
-        print("Error: ADMIN_PASSWORD environment variable is required")
-        sys.exit(1)
+        raise ValueError("ADMIN_PASSWORD environment variable is required")
 
     if len(password) < 8:
-        print("Error: ADMIN_PASSWORD must be at least 8 characters")
-        sys.exit(1)
+        raise ValueError("ADMIN_PASSWORD must be at least 8 characters")
 
-    async with AsyncSessionLocal() as db:
-        # Check if any admin user exists
-        result = await db.execute(select(User).where(User.is_admin == True))  # noqa: E712
-        existing_admin = result.scalar_one_or_none()
+    # Check if any admin user exists
+    result = await db.execute(select(User).where(User.is_admin == True).limit(1))  # noqa: E712
+    existing_admin = result.scalar_one_or_none()
 
-        if existing_admin:
-            print(f"Admin user already exists: {existing_admin.username}")
-            return
+    if existing_admin:
+        return f"Admin user already exists: {existing_admin.username}"
 
-        # Check if username is taken
-        result = await db.execute(select(User).where(User.username == username))
-        if result.scalar_one_or_none():
-            print(f"Error: Username '{username}' is already taken")
-            sys.exit(1)
+    # Check if username is taken
+    result = await db.execute(select(User).where(User.username == username))
+    if result.scalar_one_or_none():
+        raise ValueError(f"Username '{username}' is already taken")
+
+    # Create admin user
+    user = await AuthService.create_user(
+        db, username=username, email=email, password=password, is_admin=True
+    )
+    return f"Admin user created: {user.username} <{user.email}>"
 
-        # Create admin user
-        user = await AuthService.create_user(
-            db, username=username, email=email, password=password, is_admin=True
-        )
-        print("Admin user created successfully!")
-        print(f"  Username: {user.username}")
-        print(f"  Email: {user.email}")
+
+async def create_initial_admin():
+    """Create the initial admin user if one doesn't exist."""
+    settings = get_settings()
+    async with AsyncSessionLocal() as db:
+        try:
+            message = await ensure_admin(
+                db, settings.admin_username, settings.admin_email, settings.admin_password
+            )
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+    print(message)
 
 
 if __name__ == "__main__":
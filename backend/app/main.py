@@ -2,26 +2,101 @@
 # UniFi Backup Manager - FastAPI Application
 # -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
 
-from contextlib import asynccontextmanager
+import asyncio
+import logging
+from contextlib import asynccontextmanager, suppress
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.config import get_settings
-from app.database import init_db
+from app.database import prewarm_pool
+from app.metrics import MetricsMiddleware, render
 from app.routers.auth import router as auth_router
+from app.routers.backups import router as backups_router
+from app.routers.devices import router as devices_router
+from app.routers.settings import router as settings_router
+from app.services.auth_service import AuthService
+from app.services.device_status import get_status_cache
+from app.services.retention_service import RetentionService
+from app.services.scrub_service import get_scrubber
+from app.services.storage_service import StorageService
+from app.startup import startup
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Set once this process has finished a re-encryption pass as leader.
+_keys_rotated = False
+
+
+async def rotate_device_keys() -> None:
+    """Re-encrypt device API keys under the current Fernet key, once per process."""
+    global _keys_rotated
+    if _keys_rotated:
+        return
+    from app.services.key_rotation_service import KeyRotationService
+
+    try:
+        await KeyRotationService.reencrypt_all()
+    except Exception:
+        # A failed pass must not take the scheduler down with it; the next leader retries.
+        logger.exception("Re-encrypting device API keys failed")
+        return
+    _keys_rotated = True
+
+
+async def leader_duties() -> None:
+    """Work that must run in exactly one process across all replicas."""
+    async with asyncio.TaskGroup() as group:
+        if settings.scheduler_enabled:
+            from app.services.schedule_engine import ScheduleEngine
+
+            group.create_task(ScheduleEngine().run())
+        if settings.retention_interval_minutes > 0:
+            group.create_task(RetentionService.run_pruner())
+        if settings.storage_reconcile_interval_minutes > 0:
+            group.create_task(StorageService.run_reconciler())
+        if settings.scrub_cron:
+            group.create_task(get_scrubber().run_forever())
+        if settings.fernet_previous_keys:
+            group.create_task(rotate_device_keys())
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan events."""
     # Startup
-    await init_db()
+    await startup()
+    if settings.db_pool_prewarm > 0:
+        await prewarm_pool(settings.db_pool_prewarm)
+    if settings.bcrypt_target_ms > 0:
+        await asyncio.to_thread(AuthService.calibrate_bcrypt)
+    tasks = []
+    if (
+        settings.scheduler_enabled
+        or settings.retention_interval_minutes > 0
+        or settings.storage_reconcile_interval_minutes > 0
+        or settings.scrub_cron
+        or settings.fernet_previous_keys
+    ):
+        from app.services.leader_election import get_leader_elector
+
+        tasks.append(asyncio.create_task(get_leader_elector().run(leader_duties)))
+    if settings.worker_enabled:
+        from app.services.job_queue import BackupWorker
+
+        tasks.append(asyncio.create_task(BackupWorker().run()))
     yield
     # Shutdown
-    pass
+    for task in tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    if get_scrubber.cache_info().currsize:
+        await get_scrubber().stop()
+    if get_status_cache.cache_info().currsize:
+        await get_status_cache().close()
 
 
 app = FastAPI(
@@ -40,11 +115,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Metrics middleware (outermost, so latency includes the other middleware)
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(auth_router, prefix="/api")
+app.include_router(backups_router, prefix="/api")
+app.include_router(devices_router, prefix="/api")
+app.include_router(settings_router, prefix="/api")
 
 
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint."""
-    return {"status": "healthy", "version": "1.0.0"}
+    from app.services.leader_election import get_leader_elector
+
+    return {"status": "healthy", "version": "1.0.0", "scheduler": get_leader_elector().status()}
+
+
+if settings.metrics_enabled:
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        """Prometheus metrics."""
+        body, content_type = render()
+        return Response(content=body, media_type=content_type)
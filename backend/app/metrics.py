@@ -0,0 +1,219 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Prometheus Metrics
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+#
+# Instruments shared by the API, the database layer and the backup services,
+# served in Prometheus text format at /metrics. Enough to tell whether a slow
+# request is waiting on Postgres, bcrypt or a controller.
+#
+# Labels are kept low-cardinality: routes use their path template, queries
+# are grouped by verb and table, devices by id.
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import re
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+registry = CollectorRegistry()
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template.",
+    ["method", "route", "status"],
+    registry=registry,
+)
+http_requests_in_progress = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests currently being served.",
+    registry=registry,
+)
+db_query_duration = Histogram(
+    "db_query_duration_seconds",
+    "Database statement execution time by verb and table.",
+    ["statement"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+    registry=registry,
+)
+password_hash_duration = Histogram(
+    "password_hash_duration_seconds",
+    "Time spent in bcrypt hashing and verification, including queueing.",
+    ["operation"],
+    registry=registry,
+)
+controller_request_duration = Histogram(
+    "unifi_request_duration_seconds",
+    "UniFi controller API call latency.",
+    ["operation"],
+    registry=registry,
+)
+backups_in_flight = Gauge(
+    "backups_in_flight",
+    "Backups currently running.",
+    registry=registry,
+)
+backup_bytes_ingested = Counter(
+    "backup_ingested_bytes",
+    "Backup bytes written to storage; rate() gives throughput per device.",
+    ["device_id"],
+    registry=registry,
+)
+backup_throughput = Gauge(
+    "backup_last_throughput_bytes_per_second",
+    "Average ingest throughput of the device's most recent completed backup.",
+    ["device_id"],
+    registry=registry,
+)
+scrub_bytes_read = Counter(
+    "scrub_read_bytes",
+    "Bytes read from storage by the integrity scrubber.",
+    registry=registry,
+)
+scrub_results = Counter(
+    "scrub_results",
+    "Backups checked by the integrity scrubber, by outcome.",
+    ["result"],
+    registry=registry,
+)
+
+_STATEMENT_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE|TABLE)\s+"?(\w+)"?', re.IGNORECASE)
+
+
+def statement_label(statement: str) -> str:
+    """Group a SQL statement as "<VERB> <table>", e.g. "SELECT backups"."""
+    verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "UNKNOWN"
+    match = _STATEMENT_TABLE.search(statement)
+    return f"{verb} {match.group(1)}" if match else verb
+
+
+class PoolCollector:
+    """Reports connection pool usage at scrape time."""
+
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+
+    def collect(self):
+        from app.database import pool_status
+
+        status = pool_status(self.engine)
+        for key, help_text in (
+            ("size", "Configured pool size."),
+            ("checked_out", "Connections in use."),
+            ("idle", "Idle connections in the pool."),
+            ("overflow", "Connections open beyond the pool size."),
+        ):
+            if key in status:
+                yield GaugeMetricFamily(f"db_pool_{key}", help_text, value=status[key])
+        for key, help_text in (
+            ("checkouts", "Connection checkouts."),
+            ("timeouts", "Checkouts that timed out waiting for a connection."),
+            ("wait_seconds_total", "Time spent waiting for a connection."),
+        ):
+            if key in status:
+                name = key.removesuffix("_total")
+                yield CounterMetricFamily(f"db_pool_{name}", help_text, value=status[key])
+
+
+class UserCacheCollector:
+    """Reports the authenticated-user cache's hit rate and size at scrape time."""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def collect(self):
+        stats = self.cache.stats()
+        hits = CounterMetricFamily(
+            "user_cache_hits", "Auth cache lookups served from memory.", labels=["cache"]
+        )
+        misses = CounterMetricFamily(
+            "user_cache_misses", "Auth cache lookups that fell through.", labels=["cache"]
+        )
+        entries = GaugeMetricFamily("user_cache_entries", "Auth cache entries.", labels=["cache"])
+        for cache in ("token", "user"):
+            hits.add_metric([cache], stats[f"{cache}_hits"])
+            misses.add_metric([cache], stats[f"{cache}_misses"])
+            entries.add_metric([cache], stats[f"{cache}_entries"])
+        yield from (hits, misses, entries)
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Time every statement executed through the engine."""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _stop(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_start"].pop()
+        db_query_duration.labels(statement_label(statement)).observe(time.perf_counter() - started)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_start"):
+            conn.info["query_start"].pop()
+
+
+def route_template(scope) -> str:
+    """Path template of the route that handled a request, e.g. "/api/backups/{backup_id}"."""
+    route = scope.get("route")
+    template = getattr(route, "path_format", None) or getattr(route, "path", None)
+    if template is None:
+        # Unmatched paths share one label so scanners can't blow up cardinality.
+        return "<unmatched>"
+    path = scope.get("path", "")
+    regex = getattr(route, "path_regex", None)
+    if regex is not None and not regex.fullmatch(path):
+        # Some FastAPI versions record the route as declared on its APIRouter,
+        # without the include_router prefix; recover the prefix from the path.
+        for i, char in enumerate(path):
+            if i and char == "/" and regex.fullmatch(path[i:]):
+                return path[:i] + template
+    return template
+
+
+def render() -> tuple[bytes, str]:
+    """Current metrics as (body, content type)."""
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency for HTTP requests."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        http_requests_in_progress.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_progress.dec()
+            http_request_duration.labels(
+                scope["method"], route_template(scope), str(status_code)
+            ).observe(time.perf_counter() - start)
@@ -3,9 +3,23 @@
 # -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
 
 from app.models.backup import Backup
+from app.models.backup_chunk import BackupChunk
+from app.models.backup_job import BackupJob
+from app.models.backup_rollup import BackupCountBucket
 from app.models.device import Device
 from app.models.schedule import Schedule
 from app.models.settings import SystemSettings
+from app.models.storage_counter import DeviceStorageCounter
 from app.models.user import User
 
-__all__ = ["User", "Device", "Backup", "Schedule", "SystemSettings"]
+__all__ = [
+    "User",
+    "Device",
+    "Backup",
+    "BackupChunk",
+    "BackupJob",
+    "BackupCountBucket",
+    "DeviceStorageCounter",
+    "Schedule",
+    "SystemSettings",
+]
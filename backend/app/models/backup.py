@@ -4,7 +4,7 @@
 
 from datetime import datetime
 
-from sqlalchemy import BigInteger, DateTime, ForeignKey, Integer, String, Text, func
+from sqlalchemy import BigInteger, DateTime, ForeignKey, Index, Integer, String, Text, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
@@ -14,6 +14,12 @@ class Backup(Base):
     """Backup record model."""
 
     __tablename__ = "backups"
+    __table_args__ = (
+        # Keyset pagination of a single device's history: WHERE device_id = ? ORDER BY created_at
+        Index("ix_backups_device_id_created_at", "device_id", "created_at"),
+    )
+    # Fetch server-generated created_at on INSERT; the count rollup needs it during flush.
+    __mapper_args__ = {"eager_defaults": True}
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     device_id: Mapped[int] = mapped_column(
@@ -22,6 +28,15 @@ class Backup(Base):
     filename: Mapped[str] = mapped_column(String(255), nullable=False)
     file_path: Mapped[str] = mapped_column(String(500), nullable=False)
     file_size: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    checksum: Mapped[str | None] = mapped_column(String(64), nullable=True)  # sha256 hex
+    # Stored codec ("zstd") and bytes on disk; file_size and checksum describe the plain file.
+    compression: Mapped[str | None] = mapped_column(String(16), nullable=True)
+    compressed_size: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    # "chunked": file_path is a manifest into the dedup chunk store.
+    layout: Mapped[str | None] = mapped_column(String(16), nullable=True)
+    # Last scrub: "ok", "corrupt" or "missing" (None until first checked).
+    integrity: Mapped[str | None] = mapped_column(String(16), nullable=True)
+    verified_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
     backup_type: Mapped[str] = mapped_column(String(20), nullable=False)  # manual, scheduled
     status: Mapped[str] = mapped_column(
         String(20), default="pending", nullable=False
@@ -33,5 +48,13 @@ class Backup(Base):
         DateTime(timezone=True), server_default=func.now(), nullable=False, index=True
     )
 
-    # Relationships
-    device: Mapped["Device"] = relationship("Device", back_populates="backups")  # noqa: F821
+    # Relationships. lazy="raise": load them with joinedload/selectinload in the
+    # query, so an N+1 (or IO outside the async greenlet) fails instead of crawling.
+    device: Mapped["Device"] = relationship(  # noqa: F821
+        "Device", back_populates="backups", lazy="raise"
+    )
+
+    @property
+    def device_name(self) -> str | None:
+        """Owning device's name (for the schema); needs ``device`` eager-loaded."""
+        return self.device.name if self.device is not None else None
@@ -0,0 +1,27 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Backup Chunk Model
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+from datetime import datetime
+
+from sqlalchemy import BigInteger, DateTime, Index, Integer, String, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class BackupChunk(Base):
+    """One deduplicated chunk in the chunk store and how many manifests use it."""
+
+    __tablename__ = "backup_chunks"
+    __table_args__ = (
+        # Garbage collection scan: WHERE refcount <= 0
+        Index("ix_backup_chunks_refcount", "refcount"),
+    )
+
+    digest: Mapped[str] = mapped_column(String(64), primary_key=True)  # sha256 hex
+    size: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    refcount: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
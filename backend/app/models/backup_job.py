@@ -0,0 +1,64 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Backup Job Model
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+#
+# Durable queue of device backups to run. Workers in any number of
+# processes claim rows with SELECT ... FOR UPDATE SKIP LOCKED and hold a
+# lease (locked_until) that they extend by heartbeating. A job whose lease
+# lapses is claimable again, so a crashed worker's jobs are retried.
+#
+# At most one queued or running job exists per device (partial unique
+# index), so a device is never backed up twice at the same time.
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+from datetime import datetime
+
+from sqlalchemy import DateTime, ForeignKey, Index, Integer, String, Text, func, text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+# Jobs in these states hold their device.
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class BackupJob(Base):
+    """Queued backup of one device."""
+
+    __tablename__ = "backup_jobs"
+    __table_args__ = (
+        Index(
+            "uq_backup_jobs_active_device",
+            "device_id",
+            unique=True,
+            postgresql_where=text("status IN ('queued', 'running')"),
+            sqlite_where=text("status IN ('queued', 'running')"),
+        ),
+        # Claim scan: WHERE status = ? ORDER BY available_at
+        Index("ix_backup_jobs_status_available_at", "status", "available_at"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    device_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("devices.id", ondelete="CASCADE"), nullable=False
+    )
+    backup_type: Mapped[str] = mapped_column(String(20), nullable=False)  # manual, scheduled
+    status: Mapped[str] = mapped_column(
+        String(20), default="queued", nullable=False
+    )  # queued, running, completed, failed
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    max_attempts: Mapped[int] = mapped_column(Integer, nullable=False)
+    available_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    locked_by: Mapped[str | None] = mapped_column(String(100), nullable=True)
+    locked_until: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    # Last attempt's Backup row
+    backup_id: Mapped[int | None] = mapped_column(
+        Integer, ForeignKey("backups.id", ondelete="SET NULL"), nullable=True
+    )
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
+    )
@@ -0,0 +1,136 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Backup Count Rollup Model
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+#
+# Pre-aggregated backup counts so the calendar never has to GROUP BY over
+# the whole backups table. Counts are kept per 15-minute UTC bucket rather
+# than per calendar day: every real-world UTC offset is a multiple of 15
+# minutes, so any time zone's local day is an exact union of buckets.
+#
+# The table is maintained from a Session after_flush hook, which runs inside
+# the same transaction as the Backup insert/update/delete that caused it.
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+from collections import defaultdict
+from datetime import UTC, datetime
+
+from sqlalchemy import DateTime, ForeignKey, Integer, String, delete, event, inspect, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Mapped, Session, mapped_column
+
+from app.database import Base
+from app.models.backup import Backup
+
+BUCKET_MINUTES = 15
+
+
+def bucket_for(when: datetime) -> datetime:
+    """Floor a timestamp to the start of its UTC rollup bucket."""
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=UTC)
+    when = when.astimezone(UTC)
+    return when.replace(minute=when.minute - when.minute % BUCKET_MINUTES, second=0, microsecond=0)
+
+
+class BackupCountBucket(Base):
+    """Backup counts per device, status and 15-minute UTC bucket."""
+
+    __tablename__ = "backup_count_buckets"
+
+    device_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("devices.id", ondelete="CASCADE"), primary_key=True
+    )
+    bucket: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True, index=True)
+    status: Mapped[str] = mapped_column(String(20), primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+
+def committed_value(state, key: str):
+    """Value of an attribute as of the last load/flush, ignoring pending changes."""
+    history = state.attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return state.attrs[key].loaded_value
+
+
+def _collect_deltas(session: Session) -> dict[tuple[int, datetime, str], int]:
+    deltas: dict[tuple[int, datetime, str], int] = defaultdict(int)
+
+    for obj in session.new:
+        if isinstance(obj, Backup):
+            deltas[(obj.device_id, bucket_for(obj.created_at), obj.status)] += 1
+
+    for obj in session.deleted:
+        if isinstance(obj, Backup):
+            state = inspect(obj)
+            key = (
+                committed_value(state, "device_id"),
+                bucket_for(committed_value(state, "created_at")),
+                committed_value(state, "status"),
+            )
+            deltas[key] -= 1
+
+    for obj in session.dirty:
+        if not isinstance(obj, Backup):
+            continue
+        state = inspect(obj)
+        if not any(
+            state.attrs[key].history.has_changes() for key in ("device_id", "created_at", "status")
+        ):
+            continue
+        old = (
+            committed_value(state, "device_id"),
+            bucket_for(committed_value(state, "created_at")),
+            committed_value(state, "status"),
+        )
+        new = (obj.device_id, bucket_for(obj.created_at), obj.status)
+        if old != new:
+            deltas[old] -= 1
+            deltas[new] += 1
+
+    return {key: delta for key, delta in deltas.items() if delta}
+
+
+def apply_count_deltas(session: Session, deltas: dict[tuple[int, datetime, str], int]) -> None:
+    """Apply signed count changes to the rollup on the session's connection."""
+    if not deltas:
+        return
+    conn = session.connection()
+    table = BackupCountBucket.__table__
+    dialect = conn.dialect.name
+
+    for (device_id, bucket, status), delta in deltas.items():
+        if delta > 0 and dialect in ("postgresql", "sqlite"):
+            insert = pg_insert if dialect == "postgresql" else sqlite_insert
+            stmt = insert(table).values(
+                device_id=device_id, bucket=bucket, status=status, count=delta
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["device_id", "bucket", "status"],
+                set_={"count": table.c.count + delta},
+            )
+            conn.execute(stmt)
+            continue
+
+        key_filter = (
+            (table.c.device_id == device_id)
+            & (table.c.bucket == bucket)
+            & (table.c.status == status)
+        )
+        updated = conn.execute(update(table).where(key_filter).values(count=table.c.count + delta))
+        if updated.rowcount == 0 and delta > 0:
+            conn.execute(
+                table.insert().values(
+                    device_id=device_id, bucket=bucket, status=status, count=delta
+                )
+            )
+        if delta < 0:
+            conn.execute(delete(table).where(key_filter & (table.c.count <= 0)))
+
+
+@event.listens_for(Session, "after_flush")
+def _maintain_backup_counts(session: Session, flush_context) -> None:
+    apply_count_deltas(session, _collect_deltas(session))
@@ -32,10 +32,11 @@ class Device(Base):
         DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
     )
 
-    # Relationships
+    # Relationships (lazy="raise", see Backup). Deleting a device through the
+    # ORM cascades to these, so selectinload them first.
     backups: Mapped[list["Backup"]] = relationship(  # noqa: F821
-        "Backup", back_populates="device", cascade="all, delete-orphan"
+        "Backup", back_populates="device", cascade="all, delete-orphan", lazy="raise"
     )
     schedules: Mapped[list["Schedule"]] = relationship(  # noqa: F821
-        "Schedule", back_populates="device", cascade="all, delete-orphan"
+        "Schedule", back_populates="device", cascade="all, delete-orphan", lazy="raise"
     )
@@ -23,6 +23,13 @@ class Schedule(Base):
     cron_expression: Mapped[str | None] = mapped_column(String(100), nullable=True)
     interval_hours: Mapped[int | None] = mapped_column(Integer, nullable=True)
     retention_days: Mapped[int] = mapped_column(Integer, default=30, nullable=False)
+    # Grandfather-father-son: also keep the newest backup of this many recent
+    # days / ISO weeks / months, even when older than retention_days.
+    keep_daily: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    keep_weekly: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    keep_monthly: Mapped[int] = mapped_column(
+        Integer, default=0, server_default="0", nullable=False
+    )
     is_enabled: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
     last_run: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
     next_run: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
@@ -33,5 +40,12 @@ class Schedule(Base):
         DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
     )
 
-    # Relationships
-    device: Mapped["Device"] = relationship("Device", back_populates="schedules")  # noqa: F821
+    # Relationships (lazy="raise", see Backup)
+    device: Mapped["Device"] = relationship(  # noqa: F821
+        "Device", back_populates="schedules", lazy="raise"
+    )
+
+    @property
+    def device_name(self) -> str | None:
+        """Owning device's name (for the schema); needs ``device`` eager-loaded."""
+        return self.device.name if self.device is not None else None
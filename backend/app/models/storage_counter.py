@@ -0,0 +1,129 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Device Storage Counter Model
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+#
+# Running totals of stored backups per device, so storage stats never have
+# to walk backup_path or SUM over the backups table. Only completed backups
+# count, since those are the ones with a file on disk.
+#
+# Like the calendar rollup, counters are adjusted from a Session after_flush
+# hook in the same transaction as the Backup change. StorageService runs a
+# periodic reconcile to repair drift from out-of-band edits.
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import BigInteger, DateTime, ForeignKey, Integer, event, func, inspect
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Mapped, Session, mapped_column
+from sqlalchemy.orm.base import NO_VALUE
+
+from app.database import Base
+from app.models.backup import Backup
+from app.models.backup_rollup import committed_value
+
+
+class DeviceStorageCounter(Base):
+    """Count and total size of completed backups for one device."""
+
+    __tablename__ = "device_storage_counters"
+
+    device_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("devices.id", ondelete="CASCADE"), primary_key=True
+    )
+    backup_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    total_size: Mapped[int] = mapped_column(BigInteger, default=0, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
+    )
+
+
+def _contribution(
+    status: str | None, file_size: int | None, compressed_size: int | None
+) -> tuple[int, int]:
+    # Bytes on disk: the compressed size when the backup is stored compressed.
+    if status == "completed":
+        return 1, (compressed_size if compressed_size is not None else file_size) or 0
+    return 0, 0
+
+
+def _compressed_size(state, committed: bool) -> int | None:
+    # Ingest always sets compressed_size for compressed backups, so an
+    # attribute that was never loaded on this instance is NULL.
+    value = (
+        committed_value(state, "compressed_size")
+        if committed
+        else state.dict.get("compressed_size")
+    )
+    return None if value is NO_VALUE else value
+
+
+def _committed_contribution(state) -> tuple[int, int]:
+    return _contribution(
+        committed_value(state, "status"),
+        committed_value(state, "file_size"),
+        _compressed_size(state, committed=True),
+    )
+
+
+def _current_contribution(obj: Backup) -> tuple[int, int]:
+    return _contribution(obj.status, obj.file_size, _compressed_size(inspect(obj), committed=False))
+
+
+def _collect_deltas(session: Session) -> dict[int, tuple[int, int]]:
+    deltas: dict[int, list[int]] = defaultdict(lambda: [0, 0])
+
+    def add(device_id, contribution, sign):
+        deltas[device_id][0] += sign * contribution[0]
+        deltas[device_id][1] += sign * contribution[1]
+
+    for obj in session.new:
+        if isinstance(obj, Backup):
+            add(obj.device_id, _current_contribution(obj), 1)
+
+    for obj in session.deleted:
+        if isinstance(obj, Backup):
+            state = inspect(obj)
+            add(committed_value(state, "device_id"), _committed_contribution(state), -1)
+
+    for obj in session.dirty:
+        if not isinstance(obj, Backup):
+            continue
+        state = inspect(obj)
+        if not any(
+            state.attrs[key].history.has_changes()
+            for key in ("device_id", "status", "file_size", "compressed_size")
+        ):
+            continue
+        add(committed_value(state, "device_id"), _committed_contribution(state), -1)
+        add(obj.device_id, _current_contribution(obj), 1)
+
+    return {device_id: (d[0], d[1]) for device_id, d in deltas.items() if d != [0, 0]}
+
+
+def apply_storage_deltas(session: Session, deltas: dict[int, tuple[int, int]]) -> None:
+    """Apply (count, bytes) changes to per-device counters on the session's connection."""
+    if not deltas:
+        return
+    conn = session.connection()
+    table = DeviceStorageCounter.__table__
+    insert = pg_insert if conn.dialect.name == "postgresql" else sqlite_insert
+
+    for device_id, (count, size) in deltas.items():
+        stmt = insert(table).values(device_id=device_id, backup_count=count, total_size=size)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["device_id"],
+            set_={
+                "backup_count": table.c.backup_count + count,
+                "total_size": table.c.total_size + size,
+                "updated_at": func.now(),
+            },
+        )
+        conn.execute(stmt)
+
+
+@event.listens_for(Session, "after_flush")
+def _maintain_storage_counters(session: Session, flush_context) -> None:
+    apply_storage_deltas(session, _collect_deltas(session))
@@ -3,5 +3,8 @@
 # -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
 
 from app.routers.auth import router as auth_router
+from app.routers.backups import router as backups_router
+from app.routers.devices import router as devices_router
+from app.routers.settings import router as settings_router
 
-__all__ = ["auth_router"]
+__all__ = ["auth_router", "backups_router", "devices_router", "settings_router"]
@@ -78,13 +78,15 @@ async def change_password(
     db: AsyncSession = Depends(get_db),
 ):
     """Change current user's password."""
-    if not AuthService.verify_password(password_data.current_password, current_user.password_hash):
+    if not await AuthService.verify_password_async(
+        password_data.current_password, current_user.password_hash
+    ):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Current password is incorrect",
         )
 
-    current_user.password_hash = AuthService.hash_password(password_data.new_password)
+    current_user.password_hash = await AuthService.hash_password_async(password_data.new_password)
     await db.commit()
 
     return {"message": "Password changed successfully"}
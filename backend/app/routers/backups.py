@@ -0,0 +1,353 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Backups Router
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import calendar
+import os
+from datetime import date
+from email.utils import formatdate
+from pathlib import Path
+from urllib.parse import quote
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import anyio
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import get_settings
+from app.database import get_db
+from app.dependencies import get_current_admin_user, get_current_user, get_event_stream_user
+from app.models.backup import Backup
+from app.models.user import User
+from app.responses import ORJSONResponse
+from app.schemas.backup import Backup as BackupSchema
+from app.schemas.backup import (
+    BackupCalendar,
+    BackupCalendarDay,
+    BackupList,
+    BackupProgress,
+    PruneSummary,
+    ScrubStatus,
+    backup_rows,
+)
+from app.schemas.user import EventStreamToken
+from app.services.auth_service import AuthService
+from app.services.backup_query_service import BackupQueryService, InvalidCursorError
+from app.services.chunk_store import CHUNKED, ChunkStore
+from app.services.compression import ZSTD, iter_decompressed
+from app.services.progress import get_progress_hub
+from app.services.retention_service import PruneInProgressError, RetentionService
+from app.services.scrub_service import get_scrubber
+
+router = APIRouter(prefix="/backups", tags=["Backups"])
+
+settings = get_settings()
+
+
+def _resolve_backup_file(backup: Backup) -> Path:
+    """Return the on-disk path for a backup, refusing anything outside backup_path."""
+    root = Path(settings.backup_path).resolve()
+    path = Path(backup.file_path).resolve()
+    if not path.is_relative_to(root):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Backup file not found")
+    return path
+
+
+def _zone(tz: str) -> ZoneInfo:
+    try:
+        return ZoneInfo(tz)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown time zone: {tz}"
+        ) from None
+
+
+def _etag(backup: Backup, stat_result: os.stat_result) -> str:
+    """Strong ETag from the ingest checksum, falling back to size and mtime."""
+    if backup.checksum:
+        return f'"{backup.checksum}"'
+    return f'W/"{stat_result.st_size:x}-{int(stat_result.st_mtime):x}"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    return header.strip() == "*" or etag in (tag.strip() for tag in header.split(","))
+
+
+def _accepts_encoding(request: Request, coding: str) -> bool:
+    """Whether Accept-Encoding allows ``coding`` (explicitly, q > 0)."""
+    for item in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = item.partition(";")
+        if name.strip().lower() == coding:
+            q = params.strip().removeprefix("q=")
+            try:
+                return not q or float(q) > 0
+            except ValueError:
+                return False
+    return False
+
+
+@router.get("", response_model=BackupList)
+async def list_backups(
+    cursor: str | None = None,
+    page_size: int = Query(50, ge=1, le=500),
+    device_id: int | None = None,
+    status_filter: str | None = Query(None, alias="status"),
+    include_total: bool = False,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """List backups newest first using cursor (keyset) pagination."""
+    try:
+        items, next_cursor = await BackupQueryService.list_page_rows(
+            db, page_size, cursor=cursor, device_id=device_id, status=status_filter
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from None
+
+    total = None
+    if include_total:
+        total = await BackupQueryService.estimate_total(db, device_id, status_filter)
+
+    # Plain rows straight to orjson; response_model still documents the shape.
+    return ORJSONResponse(
+        {
+            "items": backup_rows.validate_python(items),
+            "page_size": page_size,
+            "next_cursor": next_cursor,
+            "total": total,
+        }
+    )
+
+
+@router.get("/calendar", response_model=BackupCalendar)
+async def get_backup_calendar(
+    year: int = Query(..., ge=1970, le=9999),
+    month: int = Query(..., ge=1, le=12),
+    tz: str = "UTC",
+    device_id: int | None = None,
+    status_filter: str | None = Query(None, alias="status"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Backup counts per day of a month, with days taken in the caller's time zone."""
+    zone = _zone(tz)
+    last_day = calendar.monthrange(year, month)[1]
+    counts = await BackupQueryService.daily_counts(
+        db,
+        date(year, month, 1),
+        date(year, month, last_day),
+        zone,
+        device_id=device_id,
+        status=status_filter,
+    )
+    return BackupCalendar(
+        days=[BackupCalendarDay(date=day, count=count) for day, count in counts.items()],
+        month=month,
+        year=year,
+    )
+
+
+@router.get("/by-date/{day}", response_model=list[BackupSchema])
+async def get_backups_by_date(
+    day: date,
+    tz: str = "UTC",
+    device_id: int | None = None,
+    status_filter: str | None = Query(None, alias="status"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """List backups created on a given day in the caller's time zone."""
+    items = await BackupQueryService.list_for_day(
+        db, day, _zone(tz), device_id=device_id, status=status_filter
+    )
+    return ORJSONResponse(backup_rows.validate_python(items))
+
+
+@router.post("/prune", response_model=PruneSummary)
+async def prune_backups(
+    dry_run: bool = True,
+    device_id: int | None = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_admin_user),
+):
+    """Apply retention policies now (admin only); dry_run reports what would be freed.
+
+    Returns 409 if another process is already pruning.
+    """
+    session_factory = async_sessionmaker(db.bind, class_=AsyncSession, expire_on_commit=False)
+    try:
+        return await RetentionService.prune(
+            session_factory,
+            dry_run=dry_run,
+            device_ids=[device_id] if device_id is not None else None,
+        )
+    except PruneInProgressError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e)) from None
+
+
+async def _progress_stream(device_id: int | None):
+    """Format hub events as Server-Sent Events until the client goes away."""
+    with get_progress_hub().subscribe() as subscription:
+        yield "retry: 3000\n\n"
+        while True:
+            batch = await subscription.next_batch(settings.progress_keepalive_seconds)
+            if not batch:
+                # Comment line: keeps proxies from closing an idle stream.
+                yield ": keepalive\n\n"
+                continue
+            for event in batch:
+                if isinstance(event, BackupProgress):
+                    if device_id is not None and event.device_id != device_id:
+                        continue
+                    kind = "backup"
+                else:
+                    kind = "run"
+                yield f"event: {kind}\ndata: {event.model_dump_json()}\n\n"
+
+
+@router.post("/events/token", response_model=EventStreamToken)
+async def create_events_token(current_user: User = Depends(get_current_user)):
+    """Issue a short-lived token for opening the event stream from a browser.
+
+    EventSource can't set an Authorization header, so the stream also takes
+    this token as ``?token=``. It is good for nothing else; fetch a new one
+    before reconnecting once it has expired.
+    """
+    return EventStreamToken(
+        token=AuthService.create_event_stream_token(current_user.id),
+        expires_in=settings.events_token_expire_seconds,
+    )
+
+
+@router.get("/events")
+async def backup_events(
+    device_id: int | None = None,
+    current_user: User = Depends(get_event_stream_user),
+):
+    """Stream live backup progress as Server-Sent Events.
+
+    ``backup`` events carry bytes received, throughput and phase for one
+    backup, ending with its final status; ``run`` events carry aggregate
+    counts for fleet runs. A new stream starts with everything in flight.
+    Events come from the in-process progress hub, never from the database.
+    Authenticate with a bearer token or ``?token=`` from POST /events/token.
+    """
+    return StreamingResponse(
+        _progress_stream(device_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/scrub", response_model=ScrubStatus)
+async def get_scrub_status(
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Integrity scrub progress and when each device's backups were last verified."""
+    return await get_scrubber().status(db)
+
+
+@router.post("/scrub", response_model=ScrubStatus, status_code=status.HTTP_202_ACCEPTED)
+async def start_scrub(
+    device_id: int | None = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_admin_user),
+):
+    """Start an integrity scrub in the background (admin only); no-op if one is running."""
+    scrubber = get_scrubber()
+    scrubber.start([device_id] if device_id is not None else None)
+    return await scrubber.status(db)
+
+
+@router.get("/{backup_id}/download")
+async def download_backup(
+    backup_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Download a stored backup file.
+
+    Supports ``Range``/``If-Range`` for resumable transfers and conditional
+    requests via ``If-None-Match``. The file body is never read into Python:
+    when ``backup_accel_redirect_prefix`` is set, nginx serves it with kernel
+    sendfile; otherwise it goes out as a ``FileResponse``, which uses the
+    ASGI ``pathsend`` extension when the server offers it.
+
+    Backups stored zstd-compressed go out as-is with ``Content-Encoding:
+    zstd`` to clients that accept it, and are decompressed on the fly for
+    everyone else; ranges are only offered on the compressed representation.
+    Deduplicated backups are reassembled from the chunk store as they stream
+    out, without range support.
+    """
+    backup = await db.get(Backup, backup_id)
+    if backup is None or backup.status != "completed":
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Backup not found")
+
+    path = _resolve_backup_file(backup)
+    try:
+        stat_result = await anyio.to_thread.run_sync(os.stat, path)
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Backup file not found"
+        ) from None
+
+    chunked = backup.layout == CHUNKED
+    compressed = backup.compression == ZSTD
+    send_encoded = compressed and _accepts_encoding(request, ZSTD)
+    etag = _etag(backup, stat_result)
+    if send_encoded:
+        etag = f'{etag[:-1]}-{ZSTD}"'  # distinct validator per representation
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat_result.st_mtime, usegmt=True),
+        "Accept-Ranges": "none" if chunked or (compressed and not send_encoded) else "bytes",
+        "Cache-Control": "private, no-transform",
+    }
+    if compressed:
+        headers["Vary"] = "Accept-Encoding"
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if chunked or (compressed and not send_encoded):
+        headers["Content-Length"] = str(backup.file_size)
+        headers["Content-Disposition"] = f'attachment; filename="{backup.filename}"'
+        body = (
+            ChunkStore(settings.backup_path).iter_file(path)
+            if chunked
+            else iter_decompressed(path, settings.backup_chunk_size)
+        )
+        return StreamingResponse(
+            body,
+            headers=headers,
+            media_type="application/octet-stream",
+        )
+    if send_encoded:
+        headers["Content-Encoding"] = ZSTD
+
+    # nginx evaluates If-Range against its own validators, not our checksum
+    # ETag, so conditional range requests are answered here directly.
+    if (
+        settings.backup_accel_redirect_prefix
+        and "if-range" not in request.headers
+        and not compressed
+    ):
+        relative = path.relative_to(Path(settings.backup_path).resolve()).as_posix()
+        headers["X-Accel-Redirect"] = (
+            f"{settings.backup_accel_redirect_prefix.rstrip('/')}/{quote(relative)}"
+        )
+        headers["Content-Type"] = "application/octet-stream"
+        headers["Content-Disposition"] = f'attachment; filename="{backup.filename}"'
+        return Response(headers=headers)
+
+    return FileResponse(
+        path,
+        headers=headers,
+        media_type="application/octet-stream",
+        filename=backup.filename,
+        stat_result=stat_result,
+    )
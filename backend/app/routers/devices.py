@@ -0,0 +1,66 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Devices Router
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_db
+from app.dependencies import get_current_user
+from app.models.device import Device
+from app.models.user import User
+from app.schemas.device import DeviceStatus, DeviceWithStatus
+from app.services.device_status import backup_stats, get_status_cache, record_statuses
+
+router = APIRouter(prefix="/devices", tags=["Devices"])
+
+
+@router.get("", response_model=list[DeviceWithStatus])
+async def list_devices(
+    include_status: bool = True,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """List devices, with live status for active ones.
+
+    Statuses are read concurrently and the response waits at most
+    ``device_list_deadline_seconds`` for them; devices whose status hasn't
+    arrived by then are marked pending.
+    """
+    devices = (await db.execute(select(Device).order_by(Device.name, Device.id))).scalars().all()
+    if not include_status:
+        return [DeviceWithStatus.model_validate(device) for device in devices]
+
+    active = [device for device in devices if device.is_active]
+    statuses = await get_status_cache().get_many(active)
+    if await record_statuses(db, active, statuses):
+        await db.commit()
+    stats = await backup_stats(db, [device.id for device in devices])
+
+    result = []
+    for device in devices:
+        live = statuses.get(device.id)
+        if live is not None:
+            count, last_backup = stats[device.id]
+            live = live.model_copy(update={"backup_count": count, "last_backup": last_backup})
+        result.append(DeviceWithStatus.model_validate(device).model_copy(update={"status": live}))
+    return result
+
+
+@router.get("/{device_id}/status", response_model=DeviceStatus)
+async def get_device_status(
+    device_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Live device status, served from cache and refreshed in the background."""
+    device = await db.get(Device, device_id)
+    if device is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Device not found")
+
+    live = await get_status_cache().get(device)
+    if await record_statuses(db, [device], {device.id: live}):
+        await db.commit()
+    count, last_backup = (await backup_stats(db, [device.id]))[device.id]
+    return live.model_copy(update={"backup_count": count, "last_backup": last_backup})
@@ -0,0 +1,29 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Settings Router
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_db, pool_status
+from app.dependencies import get_current_admin_user, get_current_user
+from app.models.user import User
+from app.schemas.settings import PoolStats, StorageStats
+from app.services.storage_service import StorageService
+
+router = APIRouter(prefix="/settings", tags=["Settings"])
+
+
+@router.get("/storage", response_model=StorageStats)
+async def get_storage_stats(
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Get backup storage usage, overall and per device."""
+    return await StorageService.get_stats(db)
+
+
+@router.get("/database/pool", response_model=PoolStats)
+async def get_pool_stats(current_user: User = Depends(get_current_admin_user)):
+    """Get database connection pool usage (admin only)."""
+    return pool_status()
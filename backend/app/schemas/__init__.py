@@ -2,10 +2,16 @@
 # UniFi Backup Manager - Pydantic Schemas
 # -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
 
-from app.schemas.backup import Backup, BackupCreate, BackupList
+from app.schemas.backup import (
+    Backup,
+    BackupCreate,
+    BackupList,
+    BackupRunSummary,
+    PruneSummary,
+)
 from app.schemas.device import Device, DeviceCreate, DeviceUpdate
 from app.schemas.schedule import Schedule, ScheduleCreate, ScheduleUpdate
-from app.schemas.settings import Settings, SettingsUpdate, StorageStats
+from app.schemas.settings import PoolStats, Settings, SettingsUpdate, StorageStats
 from app.schemas.user import Token, TokenRefresh, User, UserCreate, UserLogin, UserUpdate
 
 __all__ = [
@@ -21,10 +27,13 @@ __all__ = [
     "Backup",
     "BackupCreate",
     "BackupList",
+    "BackupRunSummary",
+    "PruneSummary",
     "Schedule",
     "ScheduleCreate",
     "ScheduleUpdate",
     "Settings",
     "SettingsUpdate",
+    "PoolStats",
     "StorageStats",
 ]
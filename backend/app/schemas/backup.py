@@ -4,7 +4,8 @@
 
 from datetime import date, datetime
 
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
+from typing_extensions import TypedDict  # Pydantic needs it over typing's on 3.11
 
 
 class BackupBase(BaseModel):
@@ -28,6 +29,12 @@ class Backup(BaseModel):
     filename: str
     file_path: str
     file_size: int
+    checksum: str | None = None
+    compression: str | None = None
+    compressed_size: int | None = None
+    layout: str | None = None
+    integrity: str | None = None
+    verified_at: datetime | None = None
     backup_type: str
     status: str
     error_message: str | None
@@ -41,14 +48,40 @@ class Backup(BaseModel):
     model_config = {"from_attributes": True}
 
 
+class BackupRow(TypedDict):
+    """The Backup schema as a plain dict, for list endpoints built from Core rows."""
+
+    id: int
+    device_id: int
+    filename: str
+    file_path: str
+    file_size: int
+    checksum: str | None
+    compression: str | None
+    compressed_size: int | None
+    layout: str | None
+    integrity: str | None
+    verified_at: datetime | None
+    backup_type: str
+    status: str
+    error_message: str | None
+    started_at: datetime | None
+    completed_at: datetime | None
+    created_at: datetime
+    device_name: str | None
+
+
+# Built once: checks row dicts against the schema without creating model instances.
+backup_rows = TypeAdapter(list[BackupRow])
+
+
 class BackupList(BaseModel):
-    """Schema for paginated backup list."""
+    """Schema for a keyset-paginated backup list (newest first)."""
 
     items: list[Backup]
-    total: int
-    page: int
     page_size: int
-    pages: int
+    next_cursor: str | None = None  # pass back as ?cursor= to get the next page
+    total: int | None = None  # cached estimate, only when requested
 
 
 class BackupCalendarDay(BaseModel):
@@ -64,3 +97,103 @@ class BackupCalendar(BaseModel):
     days: list[BackupCalendarDay]
     month: int
     year: int
+
+
+class BackupRunResult(BaseModel):
+    """Schema for the outcome of one device in a fleet backup run."""
+
+    device_id: int
+    device_name: str
+    backup_id: int | None = None
+    status: str
+    file_size: int = 0
+    duration_seconds: float
+    error_message: str | None = None
+
+
+class BackupRunSummary(BaseModel):
+    """Schema for an aggregated fleet backup run."""
+
+    started_at: datetime
+    completed_at: datetime
+    duration_seconds: float
+    total: int
+    completed: int
+    failed: int
+    results: list[BackupRunResult]
+
+
+class DevicePruneResult(BaseModel):
+    """Retention pruning outcome for one device."""
+
+    device_id: int
+    deleted: int
+    bytes_freed: int
+
+
+class PruneSummary(BaseModel):
+    """Schema for a retention pruning run."""
+
+    dry_run: bool
+    started_at: datetime
+    duration_seconds: float
+    deleted: int
+    bytes_freed: int
+    files_missing: int = 0
+    devices: list[DevicePruneResult]
+
+
+class ScrubProgress(BaseModel):
+    """Progress of the current or most recent integrity scrub."""
+
+    running: bool
+    started_at: datetime
+    finished_at: datetime | None = None
+    total: int
+    checked: int = 0
+    bytes_read: int = 0
+    corrupt: int = 0
+    missing: int = 0
+
+
+class DeviceScrubStatus(BaseModel):
+    """Integrity state of one device's completed backups."""
+
+    device_id: int
+    last_verified_at: datetime | None = None
+    verified: int
+    unverified: int
+    corrupt: int
+    missing: int
+
+
+class ScrubStatus(BaseModel):
+    """Schema for the integrity scrub status endpoint."""
+
+    progress: ScrubProgress | None = None
+    devices: list[DeviceScrubStatus]
+
+
+class BackupProgress(BaseModel):
+    """Live progress event for one backup."""
+
+    backup_id: int
+    device_id: int
+    phase: str  # pending, requesting, downloading, completed, failed
+    bytes_received: int = 0
+    throughput: float = 0.0  # bytes per second since the download started
+    error_message: str | None = None
+    at: datetime
+
+
+class RunProgress(BaseModel):
+    """Live aggregate progress event for a fleet backup run."""
+
+    run_id: str
+    phase: str  # running, completed
+    total: int
+    running: int = 0
+    completed: int = 0
+    failed: int = 0
+    bytes_stored: int = 0  # plain size of the backups completed so far
+    at: datetime
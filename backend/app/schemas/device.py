@@ -41,6 +41,9 @@ class DeviceStatus(BaseModel):
     mac_address: str | None = None
     last_backup: datetime | None = None
     backup_count: int = 0
+    fetched_at: datetime | None = None  # when the controller last answered
+    stale: bool = False  # cached value that is being (or failed to be) refreshed
+    pending: bool = False  # not available within the request's deadline
 
 
 class Device(DeviceBase):
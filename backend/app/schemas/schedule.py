@@ -4,7 +4,15 @@
 
 from datetime import datetime
 
-from pydantic import BaseModel, Field, model_validator
+from pydantic import BaseModel, Field, field_validator, model_validator
+
+
+def _check_cron(value: str | None) -> str | None:
+    if value:
+        from app.services.schedule_engine import compile_cron
+
+        compile_cron(value)  # ValueError on a bad expression
+    return value
 
 
 class ScheduleBase(BaseModel):
@@ -15,6 +23,11 @@ class ScheduleBase(BaseModel):
     cron_expression: str | None = None
     interval_hours: int | None = Field(None, ge=1, le=720)  # Max 30 days
     retention_days: int = Field(default=30, ge=1, le=365)
+    keep_daily: int = Field(default=0, ge=0, le=366)
+    keep_weekly: int = Field(default=0, ge=0, le=520)
+    keep_monthly: int = Field(default=0, ge=0, le=240)
+
+    _valid_cron = field_validator("cron_expression")(_check_cron)
 
     @model_validator(mode="after")
     def validate_schedule_type(self):
@@ -39,8 +52,13 @@ class ScheduleUpdate(BaseModel):
     cron_expression: str | None = None
     interval_hours: int | None = Field(None, ge=1, le=720)
     retention_days: int | None = Field(None, ge=1, le=365)
+    keep_daily: int | None = Field(None, ge=0, le=366)
+    keep_weekly: int | None = Field(None, ge=0, le=520)
+    keep_monthly: int | None = Field(None, ge=0, le=240)
     is_enabled: bool | None = None
 
+    _valid_cron = field_validator("cron_expression")(_check_cron)
+
 
 class Schedule(BaseModel):
     """Schema for schedule response."""
@@ -51,6 +69,9 @@ class Schedule(BaseModel):
     cron_expression: str | None
     interval_hours: int | None
     retention_days: int
+    keep_daily: int = 0
+    keep_weekly: int = 0
+    keep_monthly: int = 0
     is_enabled: bool
     last_run: datetime | None
     next_run: datetime | None
@@ -38,3 +38,19 @@ class StorageStats(BaseModel):
     usage_percent: float
     total_backups: int
     by_device: list[DeviceStorageStats]
+
+
+class PoolStats(BaseModel):
+    """Schema for database connection pool usage."""
+
+    pool_class: str
+    size: int | None = None
+    checked_out: int | None = None
+    idle: int | None = None
+    overflow: int | None = None
+    max_overflow: int | None = None
+    timeout_seconds: float | None = None
+    checkouts: int | None = None
+    timeouts: int | None = None
+    wait_seconds_total: float | None = None
+    wait_seconds_max: float | None = None
@@ -55,6 +55,13 @@ class Token(BaseModel):
     token_type: str = "bearer"
 
 
+class EventStreamToken(BaseModel):
+    """Schema for a token to pass as ?token= when opening the event stream."""
+
+    token: str
+    expires_in: int
+
+
 class TokenRefresh(BaseModel):
     """Schema for token refresh request."""
 
@@ -1,8 +1,80 @@
 # -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
 # UniFi Backup Manager - Services
 # -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+#
+# Exports are resolved on first access so that importing one service (say,
+# AuthService for every request) doesn't drag in aiohttp and the rest of the
+# backup stack.
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+from importlib import import_module
+from typing import TYPE_CHECKING
+
+_EXPORTS = {
+    "AuthService": "app.services.auth_service",
+    "BackupOrchestrator": "app.services.backup_orchestrator",
+    "BackupQueryService": "app.services.backup_query_service",
+    "BackupService": "app.services.backup_service",
+    "BackupWorker": "app.services.job_queue",
+    "ChunkStore": "app.services.chunk_store",
+    "CryptoService": "app.services.crypto_service",
+    "DeviceStatusCache": "app.services.device_status",
+    "JobQueue": "app.services.job_queue",
+    "KeyRotationService": "app.services.key_rotation_service",
+    "LeaderElector": "app.services.leader_election",
+    "ProgressHub": "app.services.progress",
+    "RetentionService": "app.services.retention_service",
+    "ScheduleEngine": "app.services.schedule_engine",
+    "Scrubber": "app.services.scrub_service",
+    "StorageService": "app.services.storage_service",
+    "UniFiClient": "app.services.unifi_client",
+    "UniFiError": "app.services.unifi_client",
+}
+
+__all__ = [
+    "AuthService",
+    "BackupOrchestrator",
+    "BackupQueryService",
+    "BackupService",
+    "BackupWorker",
+    "ChunkStore",
+    "CryptoService",
+    "DeviceStatusCache",
+    "JobQueue",
+    "KeyRotationService",
+    "LeaderElector",
+    "ProgressHub",
+    "RetentionService",
+    "ScheduleEngine",
+    "Scrubber",
+    "StorageService",
+    "UniFiClient",
+    "UniFiError",
+]
+
+
+def __getattr__(name: str):
+    if name in _EXPORTS:
+        value = getattr(import_module(_EXPORTS[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-from app.services.auth_service import AuthService
-from app.services.crypto_service import CryptoService
 
-__all__ = ["AuthService", "CryptoService"]
+if TYPE_CHECKING:
+    from app.services.auth_service import AuthService
+    from app.services.backup_orchestrator import BackupOrchestrator
+    from app.services.backup_query_service import BackupQueryService
+    from app.services.backup_service import BackupService
+    from app.services.chunk_store import ChunkStore
+    from app.services.crypto_service import CryptoService
+    from app.services.device_status import DeviceStatusCache
+    from app.services.job_queue import BackupWorker, JobQueue
+    from app.services.key_rotation_service import KeyRotationService
+    from app.services.leader_election import LeaderElector
+    from app.services.progress import ProgressHub
+    from app.services.retention_service import RetentionService
+    from app.services.schedule_engine import ScheduleEngine
+    from app.services.scrub_service import Scrubber
+    from app.services.storage_service import StorageService
+    from app.services.unifi_client import UniFiClient, UniFiError
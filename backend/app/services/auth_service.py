@@ -2,18 +2,58 @@
 # UniFi Backup Manager - Authentication Service
 # -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
 
+import asyncio
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import UTC, datetime, timedelta
+from functools import lru_cache
+from typing import TYPE_CHECKING
 
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import get_settings
+from app.metrics import password_hash_duration
 from app.models.user import User
 
+if TYPE_CHECKING:
+    from passlib.context import CryptContext
+
+# passlib and python-jose are imported on first use, not with the app.
 settings = get_settings()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+@lru_cache
+def get_pwd_context() -> "CryptContext":
+    """Get the shared password hashing context, built on first use."""
+    from passlib.context import CryptContext
+
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=settings.bcrypt_rounds,
+        bcrypt__min_rounds=settings.bcrypt_rounds,
+    )
+
+
+# bcrypt releases the GIL, so hashing in threads keeps the event loop free.
+# The pool size is also the cap on concurrent hashes; extra work queues.
+_hash_executor: ThreadPoolExecutor | None = None
+
+
+def _get_hash_executor() -> ThreadPoolExecutor:
+    global _hash_executor
+    if _hash_executor is None:
+        _hash_executor = ThreadPoolExecutor(
+            max_workers=settings.bcrypt_max_concurrency, thread_name_prefix="bcrypt"
+        )
+    return _hash_executor
+
+
+async def _run_hash(func, *args):
+    with password_hash_duration.labels(func.__name__).time():
+        return await asyncio.get_running_loop().run_in_executor(_get_hash_executor(), func, *args)
 
 
 class AuthService:
@@ -22,16 +62,62 @@ class AuthService:
     @staticmethod
     def hash_password(password: str) -> str:
         """Hash a password using bcrypt."""
-        return pwd_context.hash(password)
+        return get_pwd_context().hash(password)
 
     @staticmethod
     def verify_password(plain_password: str, hashed_password: str) -> bool:
         """Verify a password against a hash."""
-        return pwd_context.verify(plain_password, hashed_password)
+        return get_pwd_context().verify(plain_password, hashed_password)
+
+    @staticmethod
+    async def hash_password_async(password: str) -> str:
+        """Hash a password on the bcrypt thread pool."""
+        return await _run_hash(get_pwd_context().hash, password)
+
+    @staticmethod
+    async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+        """Verify a password on the bcrypt thread pool."""
+        return await _run_hash(get_pwd_context().verify, plain_password, hashed_password)
+
+    @staticmethod
+    async def verify_and_update_async(
+        plain_password: str, hashed_password: str
+    ) -> tuple[bool, str | None]:
+        """Verify a password and return a replacement hash if its cost is outdated."""
+        return await _run_hash(get_pwd_context().verify_and_update, plain_password, hashed_password)
+
+    @staticmethod
+    def calibrate_bcrypt(
+        target_ms: float | None = None, min_rounds: int | None = None, max_rounds: int = 16
+    ) -> int:
+        """Pick the bcrypt cost that takes about ``target_ms`` on this machine.
+
+        Times one hash at ``min_rounds`` and extrapolates (each extra round
+        doubles the work), clamped to ``[min_rounds, max_rounds]``. New hashes
+        use the result, and stored hashes below it are upgraded on the next
+        successful login.
+        """
+        target_ms = settings.bcrypt_target_ms if target_ms is None else target_ms
+        min_rounds = min_rounds or settings.bcrypt_min_rounds
+
+        from passlib.hash import bcrypt
+
+        hasher = bcrypt.using(rounds=min_rounds)
+        hasher.hash("calibration")  # warm up the backend
+        start = time.perf_counter()
+        hasher.hash("calibration")
+        elapsed_ms = max((time.perf_counter() - start) * 1000, 0.001)
+
+        rounds = min_rounds + max(0, math.floor(math.log2(target_ms / elapsed_ms)))
+        rounds = min(rounds, max_rounds)
+        get_pwd_context().update(bcrypt__default_rounds=rounds, bcrypt__min_rounds=rounds)
+        return rounds
 
     @staticmethod
     def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
         """Create a JWT access token."""
+        from jose import jwt
+
         to_encode = data.copy()
         expire = datetime.now(UTC) + (
             expires_delta or timedelta(minutes=settings.jwt_access_token_expire_minutes)
@@ -42,14 +128,27 @@ class AuthService:
     @staticmethod
     def create_refresh_token(data: dict) -> str:
         """Create a JWT refresh token."""
+        from jose import jwt
+
         to_encode = data.copy()
         expire = datetime.now(UTC) + timedelta(days=settings.jwt_refresh_token_expire_days)
         to_encode.update({"exp": expire, "type": "refresh"})
         return jwt.encode(to_encode, settings.secret_key, algorithm=settings.jwt_algorithm)
 
+    @staticmethod
+    def create_event_stream_token(user_id: int) -> str:
+        """Create a short-lived JWT accepted only by the progress event stream."""
+        from jose import jwt
+
+        expire = datetime.now(UTC) + timedelta(seconds=settings.events_token_expire_seconds)
+        to_encode = {"sub": str(user_id), "exp": expire, "type": "events"}
+        return jwt.encode(to_encode, settings.secret_key, algorithm=settings.jwt_algorithm)
+
     @staticmethod
     def decode_token(token: str) -> dict | None:
         """Decode and validate a JWT token."""
+        from jose import JWTError, jwt
+
         try:
             payload = jwt.decode(token, settings.secret_key, algorithms=[settings.jwt_algorithm])
             return payload
@@ -64,11 +163,16 @@ class AuthService:
 
         if not user:
             return None
-        if not AuthService.verify_password(password, user.password_hash):
+        valid, new_hash = await AuthService.verify_and_update_async(password, user.password_hash)
+        if not valid:
             return None
         if not user.is_active:
             return None
 
+        # Upgrade hashes made with an outdated cost while we have the plaintext
+        if new_hash is not None:
+            user.password_hash = new_hash
+
         # Update last login
         user.last_login = datetime.now(UTC)
         await db.commit()
@@ -95,7 +199,7 @@ class AuthService:
         user = User(
             username=username,
             email=email,
-            password_hash=AuthService.hash_password(password),
+            password_hash=await AuthService.hash_password_async(password),
             is_admin=is_admin,
         )
         db.add(user)
@@ -0,0 +1,253 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Fleet Backup Orchestrator
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from collections.abc import Iterable
+from datetime import UTC, datetime
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import get_settings
+from app.database import AsyncSessionLocal
+from app.models.backup import Backup
+from app.models.backup_job import BackupJob
+from app.models.device import Device
+from app.schemas.backup import BackupRunResult, BackupRunSummary
+from app.services.backup_service import BackupService
+from app.services.crypto_service import DecryptedKeyCache, get_crypto_service
+from app.services.progress import BackupProgressTracker, RunProgressTracker
+
+logger = logging.getLogger(__name__)
+
+# Backup rows in these states are still owned by a task of this orchestrator.
+_UNFINISHED = ("pending", "running")
+
+
+class BackupOrchestrator:
+    """Runs backups for many devices concurrently with bounded parallelism.
+
+    Two limits apply: a global cap on backups in flight, and a per-host cap
+    so several device rows pointing at the same controller don't pile onto it.
+    Both belong to the orchestrator, so they hold across fleet runs and the
+    single-device backups a queue worker starts with backup_one. Each device
+    runs in its own session because AsyncSession is not safe to share between
+    concurrent tasks.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession] = AsyncSessionLocal,
+        backup_service: BackupService | None = None,
+        max_concurrency: int | None = None,
+        max_per_host: int | None = None,
+    ):
+        settings = get_settings()
+        self.session_factory = session_factory
+        self.backup_service = backup_service or BackupService()
+        self.max_concurrency = max_concurrency or settings.backup_max_concurrency
+        self.max_per_host = max_per_host or settings.backup_max_per_host
+        self._global_limit = asyncio.Semaphore(self.max_concurrency)
+        self._host_limits: defaultdict[str, asyncio.Semaphore] = defaultdict(
+            lambda: asyncio.Semaphore(self.max_per_host)
+        )
+
+    async def run(
+        self, devices: Iterable[Device] | None = None, backup_type: str = "scheduled"
+    ) -> BackupRunSummary:
+        """Back up the given devices (default: all active) and summarize the run."""
+        started_at = datetime.now(UTC)
+        start = time.monotonic()
+
+        async with self.session_factory() as db:
+            if devices is None:
+                result = await db.execute(select(Device).where(Device.is_active == True))  # noqa: E712
+                devices = result.scalars().all()
+            devices = list(devices)
+        # Record every device as pending up front so the whole run is visible.
+        backup_ids = await self._create_pending(devices, backup_type, started_at)
+
+        run_progress = RunProgressTracker(len(devices))
+
+        # Decrypt every key once for the run; plaintexts are dropped when it ends.
+        with DecryptedKeyCache(get_crypto_service()) as keys:
+            keys.prefetch(device.api_key_encrypted for device in devices)
+            try:
+                results = await asyncio.gather(
+                    *(
+                        self._run_limited(device, backup_id, keys, run_progress)
+                        for device, backup_id in zip(devices, backup_ids, strict=True)
+                    )
+                )
+            finally:
+                run_progress.close()
+
+        completed = sum(1 for r in results if r.status == "completed")
+        return BackupRunSummary(
+            started_at=started_at,
+            completed_at=datetime.now(UTC),
+            duration_seconds=time.monotonic() - start,
+            total=len(results),
+            completed=completed,
+            failed=len(results) - completed,
+            results=results,
+        )
+
+    async def backup_one(
+        self, device: Device, backup_type: str = "scheduled", job_id: int | None = None
+    ) -> BackupRunResult:
+        """Back up a single device (one queue job) under the shared limits.
+
+        With ``job_id`` the new Backup row is recorded on that job as it is created.
+        """
+        (backup_id,) = await self._create_pending(
+            [device], backup_type, datetime.now(UTC), job_id=job_id
+        )
+        with DecryptedKeyCache(get_crypto_service()) as keys:
+            return await self._run_limited(device, backup_id, keys)
+
+    async def _create_pending(
+        self,
+        devices: list[Device],
+        backup_type: str,
+        when: datetime,
+        job_id: int | None = None,
+    ) -> list[int]:
+        async with self.session_factory() as db:
+            backups = [
+                Backup(
+                    device_id=device.id,
+                    filename=BackupService.make_filename(device, when),
+                    file_path="",
+                    file_size=0,
+                    backup_type=backup_type,
+                    status="pending",
+                )
+                for device in devices
+            ]
+            db.add_all(backups)
+            if job_id is not None:
+                # Same transaction, so a reclaimed job always knows its lost attempt's row.
+                await db.flush()
+                await db.execute(
+                    update(BackupJob).where(BackupJob.id == job_id).values(backup_id=backups[0].id)
+                )
+            await db.commit()
+            return [backup.id for backup in backups]
+
+    async def _run_limited(
+        self,
+        device: Device,
+        backup_id: int,
+        keys: DecryptedKeyCache,
+        run_progress: RunProgressTracker | None = None,
+    ) -> BackupRunResult:
+        try:
+            # Take the host slot first so a busy controller doesn't hold a global slot.
+            async with self._host_limits[device.ip_address], self._global_limit:
+                if run_progress is not None:
+                    run_progress.started()
+                result = await self._backup_device(
+                    device.id, device.name, backup_id, device.api_key_encrypted, keys
+                )
+                if run_progress is not None:
+                    run_progress.finished(result.status, result.file_size)
+                return result
+        except BaseException:
+            # Cancelled (shutdown, lost job lease): a row left running would
+            # never finish or be pruned. BackupService publishes the progress.
+            await self._mark_failed(backup_id, device.id, "Cancelled", publish=False)
+            raise
+
+    async def _backup_device(
+        self,
+        device_id: int,
+        device_name: str,
+        backup_id: int,
+        api_key_encrypted: str,
+        keys: DecryptedKeyCache,
+    ) -> BackupRunResult:
+        """Back up one device; any error becomes a failed result, never an exception."""
+        start = time.monotonic()
+        try:
+            return await self._run_backup(
+                device_id, device_name, backup_id, api_key_encrypted, keys
+            )
+        except Exception as e:
+            # e.g. the database dropped out between steps; one device must not sink the run.
+            logger.exception("Backup %d of device %d failed", backup_id, device_id)
+            error = str(e) or e.__class__.__name__
+            await self._mark_failed(backup_id, device_id, error)
+            return BackupRunResult(
+                device_id=device_id,
+                device_name=device_name,
+                backup_id=backup_id,
+                status="failed",
+                duration_seconds=time.monotonic() - start,
+                error_message=error,
+            )
+
+    async def _mark_failed(
+        self, backup_id: int, device_id: int, error: str, publish: bool = True
+    ) -> None:
+        """Fail a row left pending or running, in a fresh session; best effort."""
+        try:
+            async with self.session_factory() as db:
+                backup = await db.get(Backup, backup_id)
+                if backup is None or backup.status not in _UNFINISHED:
+                    return
+                backup.status = "failed"
+                backup.error_message = error
+                backup.completed_at = datetime.now(UTC)
+                await db.commit()
+        except Exception:
+            logger.exception("Could not record backup %d as failed", backup_id)
+            return
+        if publish:
+            BackupProgressTracker(backup_id, device_id).finish("failed", error)
+
+    async def _run_backup(
+        self,
+        device_id: int,
+        device_name: str,
+        backup_id: int,
+        api_key_encrypted: str,
+        keys: DecryptedKeyCache,
+    ) -> BackupRunResult:
+        """Move one backup through running -> completed/failed."""
+        start = time.monotonic()
+        async with self.session_factory() as db:
+            device = await db.get(Device, device_id)
+            backup = await db.get(Backup, backup_id)
+            backup.status = "running"
+            backup.started_at = datetime.now(UTC)
+            await db.commit()
+
+            try:
+                api_key = keys.get(api_key_encrypted)
+                await self.backup_service.run_backup(db, device, backup, api_key=api_key)
+            except Exception as e:
+                # BackupService marks the row failed for controller/storage errors;
+                # anything raised before that point still has to be recorded.
+                if backup.status != "failed":
+                    backup.status = "failed"
+                    backup.error_message = str(e) or e.__class__.__name__
+                    backup.completed_at = datetime.now(UTC)
+                    await db.commit()
+                    BackupProgressTracker(backup_id, device_id).finish(
+                        "failed", backup.error_message
+                    )
+
+            return BackupRunResult(
+                device_id=device_id,
+                device_name=device_name,
+                backup_id=backup_id,
+                status=backup.status,
+                file_size=backup.file_size,
+                duration_seconds=time.monotonic() - start,
+                error_message=backup.error_message,
+            )
@@ -0,0 +1,225 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Backup Query Service
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import base64
+from collections import defaultdict
+from datetime import UTC, date, datetime, timedelta
+from datetime import time as dt_time
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import Result, Select, delete, func, select, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.models.backup import Backup
+from app.models.backup_rollup import BackupCountBucket, apply_count_deltas, bucket_for
+from app.models.device import Device
+from app.schemas.backup import BackupRow
+from app.services.ttl_cache import TTLCache
+
+settings = get_settings()
+
+# Everything the Backup schema shows, as plain columns. List endpoints select
+# these as Core rows instead of hydrating ORM instances.
+_ROW_COLUMNS = (
+    *(getattr(Backup, name) for name in BackupRow.__annotations__ if name != "device_name"),
+    Device.name.label("device_name"),
+)
+
+# (device_id, status) -> total. Both come straight from query parameters, so
+# the cache is bounded rather than growing with every value a client sends.
+_TOTAL_CACHE_ENTRIES = 1024
+_total_cache = TTLCache(_TOTAL_CACHE_ENTRIES, settings.backup_count_cache_seconds)
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+def _as_rows(result: Result) -> list[BackupRow]:
+    keys = list(result.keys())
+    return [dict(zip(keys, row, strict=True)) for row in result]
+
+
+class BackupQueryService:
+    """Service for listing backups with keyset pagination."""
+
+    @staticmethod
+    def encode_cursor(created_at: datetime, backup_id: int) -> str:
+        """Encode the (created_at, id) position of the last row on a page."""
+        raw = f"{created_at.isoformat()}|{backup_id}".encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> tuple[datetime, int]:
+        """Decode a cursor produced by encode_cursor."""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+            created_at, backup_id = raw.rsplit("|", 1)
+            return datetime.fromisoformat(created_at), int(backup_id)
+        except ValueError as e:
+            raise InvalidCursorError("Invalid pagination cursor") from e
+
+    @staticmethod
+    def _page_query(
+        query: Select,
+        page_size: int,
+        cursor: str | None,
+        device_id: int | None,
+        status: str | None,
+    ) -> Select:
+        if device_id is not None:
+            query = query.where(Backup.device_id == device_id)
+        if status is not None:
+            query = query.where(Backup.status == status)
+        if cursor is not None:
+            created_at, backup_id = BackupQueryService.decode_cursor(cursor)
+            query = query.where(tuple_(Backup.created_at, Backup.id) < (created_at, backup_id))
+
+        # Fetch one extra row to learn whether another page exists.
+        return query.order_by(Backup.created_at.desc(), Backup.id.desc()).limit(page_size + 1)
+
+    @staticmethod
+    async def list_page_rows(
+        db: AsyncSession,
+        page_size: int,
+        cursor: str | None = None,
+        device_id: int | None = None,
+        status: str | None = None,
+    ) -> tuple[list[BackupRow], str | None]:
+        """Return one page of backups, newest first, and the cursor for the next page.
+
+        Seeks past the previous page with ``(created_at, id) < cursor`` instead
+        of OFFSET, so every page is an index range scan of ``page_size`` rows.
+        Rows are plain dicts with the device name joined in, not ORM instances.
+        """
+        query = BackupQueryService._page_query(
+            select(*_ROW_COLUMNS).outerjoin(Device, Device.id == Backup.device_id),
+            page_size,
+            cursor,
+            device_id,
+            status,
+        )
+        rows = _as_rows(await db.execute(query))
+
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            last = rows[-1]
+            next_cursor = BackupQueryService.encode_cursor(last["created_at"], last["id"])
+        return rows, next_cursor
+
+    @staticmethod
+    async def estimate_total(
+        db: AsyncSession, device_id: int | None = None, status: str | None = None
+    ) -> int:
+        """Approximate row count for a filter, reused for backup_count_cache_seconds.
+
+        Unfiltered totals on PostgreSQL come from the planner statistics in
+        pg_class, which costs nothing regardless of table size.
+        """
+        key = (device_id, status)
+        cached = _total_cache.get(key)
+        if cached is not None:
+            return cached
+
+        total = None
+        if device_id is None and status is None and db.bind.dialect.name == "postgresql":
+            reltuples = (
+                await db.execute(
+                    text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'backups'::regclass")
+                )
+            ).scalar()
+            # reltuples is -1 until the table has been analyzed at least once.
+            if reltuples is not None and reltuples >= 0:
+                total = int(reltuples)
+
+        if total is None:
+            query = select(func.count()).select_from(Backup)
+            if device_id is not None:
+                query = query.where(Backup.device_id == device_id)
+            if status is not None:
+                query = query.where(Backup.status == status)
+            total = (await db.execute(query)).scalar_one()
+
+        _total_cache.put(key, total)
+        return total
+
+    @staticmethod
+    def local_day_bounds(day: date, tz: ZoneInfo) -> tuple[datetime, datetime]:
+        """UTC [start, end) of a calendar day in the given time zone."""
+        start = datetime.combine(day, dt_time.min, tzinfo=tz)
+        end = datetime.combine(day + timedelta(days=1), dt_time.min, tzinfo=tz)
+        return start.astimezone(UTC), end.astimezone(UTC)
+
+    @staticmethod
+    async def daily_counts(
+        db: AsyncSession,
+        start_day: date,
+        end_day: date,
+        tz: ZoneInfo,
+        device_id: int | None = None,
+        status: str | None = None,
+    ) -> dict[date, int]:
+        """Backups per local calendar day in [start_day, end_day], read from the rollup.
+
+        Cost depends on the number of buckets in range, not the number of backups.
+        """
+        start, _ = BackupQueryService.local_day_bounds(start_day, tz)
+        _, end = BackupQueryService.local_day_bounds(end_day, tz)
+
+        query = (
+            select(BackupCountBucket.bucket, func.sum(BackupCountBucket.count))
+            .where(BackupCountBucket.bucket >= start, BackupCountBucket.bucket < end)
+            .group_by(BackupCountBucket.bucket)
+        )
+        if device_id is not None:
+            query = query.where(BackupCountBucket.device_id == device_id)
+        if status is not None:
+            query = query.where(BackupCountBucket.status == status)
+
+        counts: dict[date, int] = defaultdict(int)
+        for bucket, count in (await db.execute(query)).all():
+            if bucket.tzinfo is None:
+                bucket = bucket.replace(tzinfo=UTC)
+            counts[bucket.astimezone(tz).date()] += count
+        return {day: count for day, count in sorted(counts.items()) if count > 0}
+
+    @staticmethod
+    async def list_for_day(
+        db: AsyncSession,
+        day: date,
+        tz: ZoneInfo,
+        device_id: int | None = None,
+        status: str | None = None,
+    ) -> list[BackupRow]:
+        """Backups created on a local calendar day, newest first (created_at index range)."""
+        start, end = BackupQueryService.local_day_bounds(day, tz)
+        query = (
+            select(*_ROW_COLUMNS)
+            .outerjoin(Device, Device.id == Backup.device_id)
+            .where(Backup.created_at >= start, Backup.created_at < end)
+        )
+        if device_id is not None:
+            query = query.where(Backup.device_id == device_id)
+        if status is not None:
+            query = query.where(Backup.status == status)
+        query = query.order_by(Backup.created_at.desc(), Backup.id.desc())
+        return _as_rows(await db.execute(query))
+
+    @staticmethod
+    async def rebuild_counts(db: AsyncSession) -> None:
+        """Recompute the count rollup from scratch (repair after out-of-band edits)."""
+        await db.execute(delete(BackupCountBucket))
+        rows = await db.execute(select(Backup.device_id, Backup.created_at, Backup.status))
+        deltas: dict = defaultdict(int)
+        for device_id, created_at, status in rows.all():
+            deltas[(device_id, bucket_for(created_at), status)] += 1
+        await db.run_sync(apply_count_deltas, deltas)
+        await db.commit()
+
+    @staticmethod
+    def clear_total_cache() -> None:
+        """Drop cached totals (e.g. after bulk deletes)."""
+        _total_cache.clear()
@@ -0,0 +1,271 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Backup Service
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from collections.abc import AsyncIterable
+from datetime import UTC, datetime
+from pathlib import Path
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+from app.config import get_settings
+from app.metrics import backup_bytes_ingested, backup_throughput, backups_in_flight
+from app.models.backup import Backup
+from app.models.device import Device
+from app.services.chunk_store import CHUNKED, MANIFEST_SUFFIX, Chunker, ChunkStore, write_manifest
+from app.services.compression import ZSTD, ZSTD_SUFFIX, open_compressor, run_in_pool
+from app.services.crypto_service import get_crypto_service
+from app.services.progress import BackupProgressTracker
+from app.services.unifi_client import UniFiClient
+
+# Chunks hashed, pinned and written per chunk-store round trip.
+logger = logging.getLogger(__name__)
+
+_DEDUP_BATCH = 32
+
+
+def _write_chunk(fh, digest, chunk: bytes) -> None:
+    """Hash and write one chunk (runs in a worker thread; both release the GIL)."""
+    digest.update(chunk)
+    fh.write(chunk)
+
+
+def _fsync_dir(path: Path) -> None:
+    """Flush a directory entry so a completed rename survives a crash."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class BackupService:
+    """Service for pulling backups from controllers and storing them on disk."""
+
+    def __init__(
+        self,
+        backup_path: str | None = None,
+        chunk_size: int | None = None,
+        compression: str | None = None,
+        dedup: bool | None = None,
+    ):
+        settings = get_settings()
+        self.backup_path = Path(backup_path or settings.backup_path)
+        self.chunk_size = chunk_size or settings.backup_chunk_size
+        compression = compression or settings.backup_compression
+        self.compression = None if compression == "none" else compression
+        self.dedup = settings.backup_dedup if dedup is None else dedup
+
+    @staticmethod
+    def make_filename(device: Device, when: datetime | None = None) -> str:
+        """Build the stored filename for a device backup."""
+        when = when or datetime.now(UTC)
+        return f"backup_{device.id}_{when.strftime('%Y-%m-%d_%H%M%S')}.unf"
+
+    def device_dir(self, device_id: int) -> Path:
+        """Directory holding all backups for a device."""
+        return self.backup_path / str(device_id)
+
+    async def ingest(
+        self,
+        db: AsyncSession,
+        backup: Backup,
+        chunks: AsyncIterable[bytes],
+        progress: BackupProgressTracker | None = None,
+    ) -> Backup:
+        """Stream chunks to disk and record the finished file on the backup row.
+
+        Data is written to a hidden temp file in the device directory, then
+        fsynced and atomically renamed into place, so a crash never leaves a
+        truncated file under the final name. Only one chunk is held in memory
+        at a time regardless of backup size. With compression enabled, chunks
+        are compressed on the compression pool as they arrive; the checksum
+        and file_size still describe the uncompressed backup. With dedup
+        enabled the backup goes to the chunk store instead (see
+        ``_ingest_chunked``). Progress is published to the progress hub as
+        chunks arrive.
+        """
+        progress = progress or BackupProgressTracker(backup.id, backup.device_id)
+        progress.phase("downloading")
+        if self.dedup:
+            return await self._ingest_chunked(db, backup, chunks, progress)
+        target_dir = self.device_dir(backup.device_id)
+        await asyncio.to_thread(target_dir.mkdir, parents=True, exist_ok=True)
+        compressed = self.compression == ZSTD
+        final_path = target_dir / (backup.filename + (ZSTD_SUFFIX if compressed else ""))
+
+        fd, tmp_name = tempfile.mkstemp(
+            prefix=f".{backup.filename}.", suffix=".part", dir=target_dir
+        )
+        digest = hashlib.sha256()
+        size = 0
+        bytes_ingested = backup_bytes_ingested.labels(str(backup.device_id))
+        start = time.monotonic()
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                if compressed:
+                    sink, run = await run_in_pool(open_compressor, fh), run_in_pool
+                else:
+                    sink, run = fh, asyncio.to_thread
+                async for chunk in chunks:
+                    await run(_write_chunk, sink, digest, chunk)
+                    size += len(chunk)
+                    bytes_ingested.inc(len(chunk))
+                    progress.advance(len(chunk))
+                if compressed:
+                    await run_in_pool(sink.close)  # ends the frame; fh stays open
+                stored_size = fh.tell()
+                await asyncio.to_thread(fh.flush)
+                await asyncio.to_thread(os.fsync, fh.fileno())
+            await asyncio.to_thread(os.replace, tmp_name, final_path)
+            await asyncio.to_thread(_fsync_dir, target_dir)
+        except BaseException as e:
+            try:
+                os.unlink(tmp_name)
+            except FileNotFoundError:
+                pass
+            if isinstance(e, Exception):
+                await self._mark_failed(db, backup, e, progress)
+            else:
+                progress.finish("failed", "cancelled")
+            raise
+
+        elapsed = time.monotonic() - start
+        if elapsed > 0:
+            backup_throughput.labels(str(backup.device_id)).set(size / elapsed)
+        backup.file_path = str(final_path)
+        backup.file_size = size
+        backup.checksum = digest.hexdigest()
+        backup.compression = self.compression if compressed else None
+        backup.compressed_size = stored_size if compressed else None
+        backup.status = "completed"
+        backup.error_message = None
+        backup.completed_at = datetime.now(UTC)
+        await db.commit()
+        progress.finish("completed")
+        return backup
+
+    async def _ingest_chunked(
+        self,
+        db: AsyncSession,
+        backup: Backup,
+        chunks: AsyncIterable[bytes],
+        progress: BackupProgressTracker,
+    ) -> Backup:
+        """Split the stream into deduplicated chunks and record their manifest."""
+        settings = get_settings()
+        target_dir = self.device_dir(backup.device_id)
+        await asyncio.to_thread(target_dir.mkdir, parents=True, exist_ok=True)
+        manifest_path = target_dir / (backup.filename + MANIFEST_SUFFIX)
+
+        store = ChunkStore(self.backup_path)
+        chunker = Chunker(settings.dedup_min_chunk_size, settings.dedup_max_chunk_size)
+        digest = hashlib.sha256()
+        size = 0
+        refs: list = []
+        pending: list[bytes] = []
+        bytes_ingested = backup_bytes_ingested.labels(str(backup.device_id))
+        start = time.monotonic()
+        try:
+            async for chunk in chunks:
+                await asyncio.to_thread(digest.update, chunk)
+                pending += await asyncio.to_thread(chunker.feed, chunk)
+                size += len(chunk)
+                bytes_ingested.inc(len(chunk))
+                progress.advance(len(chunk))
+                if len(pending) >= _DEDUP_BATCH:
+                    await store.store(db, pending, refs)
+                    pending = []
+            pending += chunker.finish()
+            if pending:
+                await store.store(db, pending, refs)
+            await asyncio.to_thread(write_manifest, manifest_path, refs)
+            await asyncio.to_thread(_fsync_dir, target_dir)
+        except BaseException as e:
+            if isinstance(e, Exception):
+                await ChunkStore.release(db, refs)
+                await self._mark_failed(db, backup, e, progress)
+            else:
+                # Pins are already committed; without this they would never be freed.
+                await asyncio.shield(self._abandon_chunked(db.bind, backup.id, refs))
+                progress.finish("failed", "cancelled")
+            raise
+
+        elapsed = time.monotonic() - start
+        if elapsed > 0:
+            backup_throughput.labels(str(backup.device_id)).set(size / elapsed)
+        backup.file_path = str(manifest_path)
+        backup.file_size = size
+        backup.checksum = digest.hexdigest()
+        backup.compression = None
+        backup.compressed_size = None
+        backup.layout = CHUNKED
+        backup.status = "completed"
+        backup.error_message = None
+        backup.completed_at = datetime.now(UTC)
+        await db.commit()
+        progress.finish("completed")
+        return backup
+
+    @staticmethod
+    async def _abandon_chunked(target: AsyncEngine, backup_id: int, refs: list) -> None:
+        """Release a cancelled chunked ingest's pins and fail its row, in a fresh session."""
+        session_factory = async_sessionmaker(target, class_=AsyncSession, expire_on_commit=False)
+        try:
+            async with session_factory() as db:
+                await ChunkStore.release(db, refs)
+                backup = await db.get(Backup, backup_id)
+                if backup is not None and backup.status in ("pending", "running"):
+                    backup.status = "failed"
+                    backup.error_message = "Cancelled"
+                    backup.completed_at = datetime.now(UTC)
+                    await db.commit()
+        except Exception:
+            logger.exception("Could not release chunks of cancelled backup %d", backup_id)
+
+    async def run_backup(
+        self, db: AsyncSession, device: Device, backup: Backup, api_key: str | None = None
+    ) -> Backup:
+        """Trigger a backup on the controller and stream it into storage.
+
+        ``api_key`` is the already-decrypted key, if the caller has it.
+        """
+        if api_key is None:
+            api_key = get_crypto_service().decrypt(device.api_key_encrypted)
+        progress = BackupProgressTracker(backup.id, backup.device_id)
+        progress.phase("requesting")
+        try:
+            with backups_in_flight.track_inprogress():
+                async with UniFiClient(device.ip_address, api_key) as client:
+                    try:
+                        url = await client.create_backup()
+                    except Exception as e:
+                        await self._mark_failed(db, backup, e, progress)
+                        raise
+                    return await self.ingest(
+                        db, backup, client.stream_backup(url, self.chunk_size), progress
+                    )
+        except BaseException as e:
+            if not isinstance(e, Exception):
+                progress.finish("failed", "cancelled")
+            raise
+
+    @staticmethod
+    async def _mark_failed(
+        db: AsyncSession,
+        backup: Backup,
+        error: BaseException,
+        progress: BackupProgressTracker | None = None,
+    ) -> None:
+        backup.status = "failed"
+        backup.error_message = str(error) or error.__class__.__name__
+        backup.completed_at = datetime.now(UTC)
+        await db.commit()
+        progress = progress or BackupProgressTracker(backup.id, backup.device_id)
+        progress.finish("failed", backup.error_message)
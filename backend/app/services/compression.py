@@ -0,0 +1,133 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Backup Compression
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+#
+# Optional zstd codec for stored backups (backup_compression = "zstd").
+# Backups are compressed chunk by chunk as they stream in, and
+# decompressed the same way on download, so memory use stays at about one
+# chunk. All zstd work runs on a dedicated thread pool; zstd releases the
+# GIL, so the event loop keeps serving requests.
+#
+# A dictionary trained on existing backups (backup_zstd_dict_path) helps
+# most with many small, similar files. Frames record the dictionary id, and
+# a frame is only decompressed with the dictionary it was written with.
+# Train one with: python -m app.services.compression train OUTPUT [--size N]
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import argparse
+import asyncio
+import sys
+from collections.abc import AsyncIterator
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import IO, Any
+
+from app.config import get_settings
+
+ZSTD = "zstd"
+ZSTD_SUFFIX = ".zst"
+
+_executor: ThreadPoolExecutor | None = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Thread pool all compression and decompression runs on."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=get_settings().backup_compression_threads, thread_name_prefix="zstd"
+        )
+    return _executor
+
+
+async def run_in_pool(func, *args):
+    """Run ``func`` on the compression pool."""
+    return await asyncio.get_running_loop().run_in_executor(get_executor(), func, *args)
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise RuntimeError("backup_compression = 'zstd' requires the zstandard package") from e
+    return zstandard
+
+
+@lru_cache
+def get_dictionary() -> Any | None:
+    """The configured trained dictionary, if any."""
+    path = get_settings().backup_zstd_dict_path
+    if not path:
+        return None
+    zstd = _zstd()
+    return zstd.ZstdCompressionDict(Path(path).read_bytes(), dict_type=zstd.DICT_TYPE_AUTO)
+
+
+def open_compressor(fh: IO[bytes]):
+    """Wrap a binary file so writes are compressed into a single zstd frame."""
+    zstd = _zstd()
+    params = {"level": get_settings().backup_zstd_level, "write_checksum": True}
+    if (dictionary := get_dictionary()) is not None:
+        params["dict_data"] = dictionary
+    return zstd.ZstdCompressor(**params).stream_writer(fh, closefd=False)
+
+
+def open_decompressor(fh: IO[bytes]):
+    """Wrap a binary file holding a zstd frame for reading plain bytes."""
+    zstd = _zstd()
+    frame_dict_id = zstd.get_frame_parameters(fh.read(18)).dict_id
+    fh.seek(0)
+    dictionary = get_dictionary()
+    if frame_dict_id:
+        if dictionary is None or dictionary.dict_id() != frame_dict_id:
+            raise ValueError(f"Backup was compressed with unavailable dictionary {frame_dict_id}")
+        return zstd.ZstdDecompressor(dict_data=dictionary).stream_reader(fh)
+    return zstd.ZstdDecompressor().stream_reader(fh)
+
+
+async def iter_decompressed(path: Path, chunk_size: int) -> AsyncIterator[bytes]:
+    """Yield the plain contents of a compressed backup file."""
+    fh = await run_in_pool(open, path, "rb")
+    try:
+        reader = await run_in_pool(open_decompressor, fh)
+        while chunk := await run_in_pool(reader.read, chunk_size):
+            yield chunk
+    finally:
+        await run_in_pool(fh.close)
+
+
+def train_dictionary(samples: list[bytes], size: int):
+    """Train a dictionary from sample backups."""
+    return _zstd().train_dictionary(size, samples)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.services.compression",
+        description="Train a zstd dictionary on uncompressed backups under backup_path.",
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+    train = sub.add_parser("train")
+    train.add_argument("output")
+    train.add_argument("--size", type=int, default=112_640, help="dictionary size in bytes")
+    train.add_argument("--samples", type=int, default=1000, help="newest files to sample")
+    args = parser.parse_args(argv)
+
+    root = Path(get_settings().backup_path)
+    files = sorted(
+        (p for p in root.glob("*/*.unf") if p.is_file()),
+        key=lambda p: p.stat().st_mtime,
+        reverse=True,
+    )[: args.samples]
+    if not files:
+        print(f"No uncompressed backups under {root}", file=sys.stderr)
+        return 1
+    dictionary = train_dictionary([p.read_bytes() for p in files], args.size)
+    Path(args.output).write_bytes(dictionary.as_bytes())
+    print(f"Trained dictionary {dictionary.dict_id()} from {len(files)} backups -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,17 +2,28 @@
 # UniFi Backup Manager - Cryptography Service
 # -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
 
-from cryptography.fernet import Fernet, InvalidToken
+from collections.abc import Iterable
+from functools import lru_cache
+
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
 
 from app.config import get_settings
 
 
 class CryptoService:
-    """Service for encrypting/decrypting sensitive data."""
+    """Service for encrypting/decrypting sensitive data.
+
+    Encrypts with ``fernet_key`` and decrypts with it or any of
+    ``fernet_previous_keys``, so the key can be rotated without stranding
+    rows that were encrypted under an older one.
+    """
 
-    def __init__(self):
+    def __init__(self, key: str | None = None, previous_keys: Iterable[str] | None = None):
         settings = get_settings()
-        self._fernet = Fernet(settings.fernet_key.encode())
+        key = key or settings.fernet_key
+        previous_keys = settings.fernet_previous_keys if previous_keys is None else previous_keys
+        self._primary = Fernet(key.encode())
+        self._fernet = MultiFernet([self._primary, *(Fernet(k.encode()) for k in previous_keys)])
 
     def encrypt(self, plaintext: str) -> str:
         """Encrypt a string and return base64-encoded ciphertext."""
@@ -25,11 +36,87 @@ class CryptoService:
         except InvalidToken as e:
             raise ValueError("Invalid or corrupted encrypted data") from e
 
+    def decrypt_many(self, ciphertexts: Iterable[str]) -> dict[str, str | ValueError]:
+        """Decrypt many values at once; each distinct ciphertext is decrypted once.
+
+        Failures are returned in place of the plaintext rather than raised, so
+        one bad row doesn't abort a batch.
+        """
+        results: dict[str, str | ValueError] = {}
+        for ciphertext in ciphertexts:
+            if ciphertext in results:
+                continue
+            try:
+                results[ciphertext] = self.decrypt(ciphertext)
+            except ValueError as e:
+                results[ciphertext] = e
+        return results
+
+    def needs_rotation(self, ciphertext: str) -> bool:
+        """True if the value is not encrypted under the current primary key."""
+        try:
+            self._primary.decrypt(ciphertext.encode())
+            return False
+        except InvalidToken:
+            return True
+
+    def rotate(self, ciphertext: str) -> str:
+        """Re-encrypt a value under the current primary key."""
+        try:
+            return self._fernet.rotate(ciphertext.encode()).decode()
+        except InvalidToken as e:
+            raise ValueError("Invalid or corrupted encrypted data") from e
+
     @staticmethod
     def generate_key() -> str:
         """Generate a new Fernet key (for setup)."""
         return Fernet.generate_key().decode()
 
 
-# Singleton instance
-crypto_service = CryptoService()
+class DecryptedKeyCache:
+    """Plaintext API keys for the duration of one backup run.
+
+    Use as a context manager; plaintexts are dropped when the block exits so
+    decrypted keys don't outlive the run that needed them.
+    """
+
+    def __init__(self, crypto: CryptoService):
+        self._crypto = crypto
+        self._plaintexts: dict[str, str | ValueError] = {}
+
+    def __enter__(self) -> "DecryptedKeyCache":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.clear()
+
+    def prefetch(self, ciphertexts: Iterable[str]) -> None:
+        """Decrypt a batch of values up front."""
+        missing = [c for c in ciphertexts if c not in self._plaintexts]
+        self._plaintexts.update(self._crypto.decrypt_many(missing))
+
+    def get(self, ciphertext: str) -> str:
+        """Return the plaintext for a value, decrypting it on first use."""
+        if ciphertext not in self._plaintexts:
+            self.prefetch([ciphertext])
+        result = self._plaintexts[ciphertext]
+        if isinstance(result, ValueError):
+            raise result
+        return result
+
+    def clear(self) -> None:
+        self._plaintexts.clear()
+
+
+@lru_cache
+def get_crypto_service() -> CryptoService:
+    """Get the shared CryptoService, built from settings on first use."""
+    return CryptoService()
+
+
+def __getattr__(name: str):
+    # Module-level ``crypto_service`` is resolved lazily so importing this
+    # module never parses keys (or fails on a bad FERNET_KEY).
+    if name == "crypto_service":
+        return get_crypto_service()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
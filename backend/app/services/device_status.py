@@ -0,0 +1,266 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Device Status Cache
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+#
+# Live status (uptime, firmware, model, MAC) comes from the controller, which
+# may be remote and slow. Rendering the dashboard must not wait on it, so
+# statuses are cached per device with stale-while-revalidate semantics:
+#
+#   - fresh (younger than device_status_ttl_seconds): returned as is;
+#   - expired: the last value is returned at once, flagged stale, and a
+#     refresh starts in the background;
+#   - never fetched: the reader waits up to device_status_wait_seconds for
+#     the refresh, then gets an offline placeholder flagged stale.
+#
+# There is at most one refresh in flight per device; concurrent readers
+# share it. A failed or timed-out refresh keeps the last known values,
+# marked offline and stale, until the TTL allows the next attempt, so an
+# unreachable controller costs one attempt per TTL rather than one per
+# page load. The cache is per process and keyed by device id; changing a
+# device's address or API key invalidates its entry.
+#
+# get_many serves the device list: every device is read concurrently
+# (controller calls capped at device_status_max_concurrency) and whatever
+# has not arrived by the deadline comes back marked pending, its refresh
+# still running for the next load. Fresh values are written back to the
+# devices table in one UPDATE ... FROM (VALUES ...) on PostgreSQL. SQLite
+# can't name a VALUES list's columns, so there it is one executemany UPDATE.
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable, Iterable
+from contextlib import suppress
+from datetime import UTC, datetime
+from functools import lru_cache
+from typing import NamedTuple
+
+from sqlalchemy import DateTime, Integer, String, bindparam, column, func, select, update, values
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.config import get_settings
+from app.models.backup import Backup
+from app.models.device import Device
+from app.models.storage_counter import DeviceStorageCounter
+from app.schemas.device import DeviceStatus
+
+logger = logging.getLogger(__name__)
+
+Fetcher = Callable[[str, str], Awaitable[dict]]
+
+
+async def fetch_device_status(ip_address: str, api_key_encrypted: str) -> dict:
+    """Ask a device's controller for its current status."""
+    from app.services.crypto_service import get_crypto_service
+    from app.services.unifi_client import UniFiClient
+
+    api_key = get_crypto_service().decrypt(api_key_encrypted)
+    async with UniFiClient(ip_address, api_key) as client:
+        return await client.get_device_status()
+
+
+class _Entry(NamedTuple):
+    status: DeviceStatus
+    expires_at: float  # time.monotonic()
+    source: tuple[str, str]  # (ip_address, api_key_encrypted) it was fetched with
+
+
+class DeviceStatusCache:
+    """Per-device live status with a TTL and single-flight background refresh."""
+
+    def __init__(
+        self,
+        fetch: Fetcher | None = None,
+        ttl_seconds: float | None = None,
+        wait_seconds: float | None = None,
+        fetch_timeout_seconds: float | None = None,
+    ):
+        settings = get_settings()
+        self._fetch = fetch or fetch_device_status
+        self.ttl_seconds = ttl_seconds or settings.device_status_ttl_seconds
+        self.wait_seconds = (
+            settings.device_status_wait_seconds if wait_seconds is None else wait_seconds
+        )
+        self.fetch_timeout_seconds = (
+            fetch_timeout_seconds or settings.device_status_fetch_timeout_seconds
+        )
+        self._entries: dict[int, _Entry] = {}
+        self._refreshing: dict[int, asyncio.Task] = {}
+        self._limit = asyncio.Semaphore(settings.device_status_max_concurrency)
+
+    async def get(self, device: Device, wait_seconds: float | None = None) -> DeviceStatus:
+        """Status of ``device``: cached if possible, never blocking longer than the wait."""
+        source = (device.ip_address, device.api_key_encrypted)
+        entry = self._entries.get(device.id)
+        if entry is not None and entry.source != source:
+            entry = None
+        if entry is not None and entry.expires_at > time.monotonic():
+            return entry.status
+
+        refresh = self._refresh(device.id, source)
+        if entry is not None:
+            return entry.status.model_copy(update={"stale": True})
+        wait = self.wait_seconds if wait_seconds is None else wait_seconds
+        try:
+            # Shielded: a reader giving up must not cancel the shared refresh.
+            return await asyncio.wait_for(asyncio.shield(refresh), wait)
+        except TimeoutError:
+            return DeviceStatus(is_online=False, stale=True)
+
+    async def get_many(
+        self, devices: Iterable[Device], deadline_seconds: float | None = None
+    ) -> dict[int, DeviceStatus]:
+        """Statuses of several devices at once, waiting no longer than the deadline."""
+        if deadline_seconds is None:
+            deadline_seconds = get_settings().device_list_deadline_seconds
+        reads = {
+            device.id: asyncio.create_task(self.get(device, wait_seconds=deadline_seconds))
+            for device in devices
+        }
+        if not reads:
+            return {}
+        await asyncio.wait(reads.values(), timeout=deadline_seconds)
+        statuses = {}
+        for device_id, read in reads.items():
+            if read.done():
+                statuses[device_id] = read.result()
+            else:
+                # Only the read is cancelled; the shared refresh carries on.
+                read.cancel()
+                statuses[device_id] = DeviceStatus(is_online=False, stale=True, pending=True)
+        return statuses
+
+    def _refresh(self, device_id: int, source: tuple[str, str]) -> asyncio.Task:
+        task = self._refreshing.get(device_id)
+        if task is None:
+            task = asyncio.create_task(self._load(device_id, source))
+            self._refreshing[device_id] = task
+            task.add_done_callback(lambda _: self._refreshing.pop(device_id, None))
+        return task
+
+    async def _load(self, device_id: int, source: tuple[str, str]) -> DeviceStatus:
+        try:
+            async with self._limit:
+                async with asyncio.timeout(self.fetch_timeout_seconds):
+                    info = await self._fetch(*source)
+            status = DeviceStatus(is_online=True, fetched_at=datetime.now(UTC), **info)
+        except Exception as e:
+            logger.info("Status refresh for device %d failed: %s", device_id, e or type(e).__name__)
+            previous = self._entries.get(device_id)
+            last_known = (
+                previous.status
+                if previous is not None and previous.source == source
+                else DeviceStatus(is_online=False)
+            )
+            status = last_known.model_copy(update={"is_online": False, "stale": True})
+        self._entries[device_id] = _Entry(status, time.monotonic() + self.ttl_seconds, source)
+        return status
+
+    async def close(self) -> None:
+        """Cancel refreshes still in flight."""
+        tasks = list(self._refreshing.values())
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with suppress(asyncio.CancelledError):
+                await task
+
+
+async def backup_stats(
+    db: AsyncSession, device_ids: Iterable[int]
+) -> dict[int, tuple[int, datetime | None]]:
+    """Completed backup count and newest completed backup time per device."""
+    last_backup = (
+        select(func.max(Backup.created_at))
+        .where(Backup.device_id == Device.id, Backup.status == "completed")
+        .scalar_subquery()
+    )
+    rows = await db.execute(
+        select(Device.id, func.coalesce(DeviceStorageCounter.backup_count, 0), last_backup)
+        .outerjoin(DeviceStorageCounter, DeviceStorageCounter.device_id == Device.id)
+        .where(Device.id.in_(list(device_ids)))
+    )
+    return {device_id: (count, last) for device_id, count, last in rows.all()}
+
+
+def _aware(value: datetime | None) -> datetime | None:
+    # SQLite hands back naive datetimes; everything is stored in UTC.
+    return value.replace(tzinfo=UTC) if value is not None and value.tzinfo is None else value
+
+
+async def record_statuses(
+    db: AsyncSession, devices: Iterable[Device], statuses: dict[int, DeviceStatus]
+) -> int:
+    """Write freshly fetched last_seen, firmware and model back in one statement.
+
+    Loaded ``devices`` are updated in place. The caller commits.
+    """
+    changes = []
+    for device in devices:
+        status = statuses.get(device.id)
+        if status is None or status.stale or status.fetched_at is None:
+            continue
+        fields = {
+            "last_seen": status.fetched_at,
+            "firmware_version": status.firmware_version,
+            "model": status.model,
+        }
+        current = {key: getattr(device, key) for key in fields}
+        current["last_seen"] = _aware(current["last_seen"])
+        if current != fields:
+            changes.append((device, fields))
+    if not changes:
+        return 0
+
+    table = Device.__table__
+    if db.bind.dialect.name == "postgresql":
+        seen = values(
+            column("id", Integer),
+            column("last_seen", DateTime(timezone=True)),
+            column("firmware_version", String),
+            column("model", String),
+            name="seen",
+        ).data(
+            [
+                (device.id, row["last_seen"], row["firmware_version"], row["model"])
+                for device, row in changes
+            ]
+        )
+        await db.execute(
+            update(table)
+            .where(table.c.id == seen.c.id)
+            .values(
+                last_seen=seen.c.last_seen,
+                firmware_version=seen.c.firmware_version,
+                model=seen.c.model,
+                # Status polling isn't an edit; keep onupdate from bumping it.
+                updated_at=table.c.updated_at,
+            )
+        )
+    else:
+        await db.execute(
+            update(table)
+            .where(table.c.id == bindparam("b_id"))
+            .values(
+                last_seen=bindparam("b_last_seen"),
+                firmware_version=bindparam("b_firmware_version"),
+                model=bindparam("b_model"),
+                updated_at=table.c.updated_at,
+            ),
+            [
+                {"b_id": device.id, **{f"b_{key}": value for key, value in row.items()}}
+                for device, row in changes
+            ],
+        )
+    for device, row in changes:
+        for key, value in row.items():
+            set_committed_value(device, key, value)
+    return len(changes)
+
+
+@lru_cache
+def get_status_cache() -> DeviceStatusCache:
+    """Process-wide device status cache."""
+    return DeviceStatusCache()
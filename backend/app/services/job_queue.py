@@ -0,0 +1,447 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Backup Job Queue
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+#
+# Workers claim jobs with FOR UPDATE SKIP LOCKED, so any number of backend
+# containers can pull from the same table without blocking each other or
+# claiming the same row; throughput grows with worker_concurrency times the
+# number of containers.
+#
+# A claim is a lease: the worker heartbeats to push locked_until forward,
+# and a job whose lease lapses is claimable again. Failed attempts go back
+# to the queue with exponential backoff until max_attempts is reached.
+# Every state change after the claim is guarded by locked_by, so a worker
+# that lost its lease can't overwrite the new owner's progress.
+#
+# backup_max_per_host holds across workers too: a claim skips jobs whose
+# controller host already has that many leased jobs. On PostgreSQL a claim
+# takes a transaction advisory lock per candidate host (try-lock, so hosts
+# another worker is claiming for are skipped until the next poll) and
+# recounts the host's leases under it, so two workers can't both see a host
+# as free while claims for different hosts still run in parallel.
+#
+# Reclaiming a lapsed lease also fails the Backup row the lost attempt left
+# pending or running; retention never prunes in-progress rows.
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from collections import Counter
+from collections.abc import Iterable
+from contextlib import suppress
+from datetime import UTC, datetime, timedelta
+from typing import TYPE_CHECKING
+
+from sqlalchemy import String, and_, bindparam, func, or_, select, text, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import aliased
+
+from app.config import get_settings
+from app.database import AsyncSessionLocal
+from app.models.backup import Backup
+from app.models.backup_job import ACTIVE_STATUSES, BackupJob
+from app.models.device import Device
+
+if TYPE_CHECKING:
+    from app.services.backup_orchestrator import BackupOrchestrator
+
+logger = logging.getLogger(__name__)
+
+# Backup rows in these states are still owned by the attempt that created them.
+_UNFINISHED = ("pending", "running")
+
+# Of the given hosts, those whose claim lock this transaction now holds.
+_LOCK_HOSTS = text(
+    "SELECT host FROM unnest(:hosts) AS host "
+    "WHERE pg_try_advisory_xact_lock(:lock_id, hashtext(host))"
+).bindparams(bindparam("hosts", type_=ARRAY(String)))
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Backoff before retrying a job that has failed ``attempts`` times."""
+    settings = get_settings()
+    delay = min(
+        settings.job_retry_max_seconds,
+        settings.job_retry_base_seconds * 2 ** max(attempts - 1, 0),
+    )
+    # Jitter so jobs that failed together don't retry together.
+    return timedelta(seconds=delay * random.uniform(0.5, 1.0))
+
+
+class JobQueue:
+    """Service for enqueueing, claiming and settling backup jobs."""
+
+    @staticmethod
+    async def enqueue(
+        db: AsyncSession,
+        device_ids: Iterable[int],
+        backup_type: str = "scheduled",
+        now: datetime | None = None,
+    ) -> list[int]:
+        """Queue a job per device unless one is already active; the caller commits.
+
+        Returns the device ids that were queued.
+        """
+        now = now or datetime.now(UTC)
+        device_ids = set(device_ids)
+        busy = set(
+            (
+                await db.execute(
+                    select(BackupJob.device_id).where(
+                        BackupJob.device_id.in_(device_ids),
+                        BackupJob.status.in_(ACTIVE_STATUSES),
+                    )
+                )
+            ).scalars()
+        )
+        max_attempts = get_settings().job_max_attempts
+
+        queued = []
+        for device_id in sorted(device_ids - busy):
+            try:
+                # Another process may queue the same device between the check and here.
+                async with db.begin_nested():
+                    db.add(
+                        BackupJob(
+                            device_id=device_id,
+                            backup_type=backup_type,
+                            max_attempts=max_attempts,
+                            available_at=now,
+                        )
+                    )
+            except IntegrityError:
+                continue
+            queued.append(device_id)
+        return queued
+
+    @staticmethod
+    async def claim(
+        db: AsyncSession, worker_id: str, limit: int, now: datetime | None = None
+    ) -> list[BackupJob]:
+        """Lease up to ``limit`` runnable jobs to ``worker_id`` and commit.
+
+        Jobs for a controller host that already has backup_max_per_host
+        leased jobs are left queued.
+        """
+        settings = get_settings()
+        now = now or datetime.now(UTC)
+        visibility = timedelta(seconds=settings.job_visibility_timeout_seconds)
+
+        leased, leased_device = aliased(BackupJob), aliased(Device)
+        host_busy = (
+            select(func.count())
+            .select_from(leased)
+            .join(leased_device, leased_device.id == leased.device_id)
+            .where(
+                leased.status == "running",
+                leased.locked_until >= now,
+                leased_device.ip_address == Device.ip_address,
+            )
+            .scalar_subquery()
+        )
+        result = await db.execute(
+            select(BackupJob, Device.ip_address)
+            .join(Device, Device.id == BackupJob.device_id)
+            .where(
+                or_(
+                    and_(BackupJob.status == "queued", BackupJob.available_at <= now),
+                    # Lease lapsed: the worker died or stopped heartbeating.
+                    and_(BackupJob.status == "running", BackupJob.locked_until < now),
+                ),
+                # Cheap prefilter; the count that decides is taken under the host lock.
+                host_busy < settings.backup_max_per_host,
+            )
+            .order_by(BackupJob.available_at, BackupJob.id)
+            .limit(limit)
+            .with_for_update(of=BackupJob, skip_locked=True)
+        )
+        candidates = result.all()
+        busy = await JobQueue._lock_hosts(db, {host for _, host in candidates}, now)
+
+        claimed = []
+        lapsed_backup_ids = []
+        for job, host in candidates:
+            if job.status == "running" and job.backup_id is not None:
+                lapsed_backup_ids.append(job.backup_id)
+            if job.attempts >= job.max_attempts:
+                job.status = "failed"
+                job.last_error = job.last_error or "Lease expired"
+                job.locked_by = job.locked_until = None
+                continue
+            if host not in busy or busy[host] >= settings.backup_max_per_host:
+                continue  # another worker is claiming for the host, or it is full
+            busy[host] += 1
+            job.status = "running"
+            job.attempts += 1
+            job.locked_by = worker_id
+            job.locked_until = now + visibility
+            claimed.append(job)
+        if lapsed_backup_ids:
+            await JobQueue._fail_abandoned(db, lapsed_backup_ids, now)
+        await db.commit()
+        return claimed
+
+    @staticmethod
+    async def _lock_hosts(db: AsyncSession, hosts: set[str], now: datetime) -> Counter[str]:
+        """Take the claim lock of each host that is free and count its live leases.
+
+        Hosts another transaction holds the lock for are left out.
+        """
+        if not hosts:
+            return Counter()
+        if db.bind.dialect.name == "postgresql":
+            result = await db.execute(
+                _LOCK_HOSTS, {"hosts": sorted(hosts), "lock_id": get_settings().job_claim_lock_id}
+            )
+            hosts = set(result.scalars())
+        # A fresh statement, so leases committed by the lock's previous holder are seen.
+        result = await db.execute(
+            select(Device.ip_address, func.count())
+            .select_from(BackupJob)
+            .join(Device, Device.id == BackupJob.device_id)
+            .where(
+                BackupJob.status == "running",
+                BackupJob.locked_until >= now,
+                Device.ip_address.in_(hosts),
+            )
+            .group_by(Device.ip_address)
+        )
+        busy = Counter(dict.fromkeys(hosts, 0))
+        busy.update(dict(result.all()))
+        return busy
+
+    @staticmethod
+    async def _fail_abandoned(db: AsyncSession, backup_ids: list[int], now: datetime) -> None:
+        """Fail the Backup rows of attempts whose lease lapsed; the caller commits."""
+        result = await db.execute(
+            select(Backup).where(Backup.id.in_(backup_ids), Backup.status.in_(_UNFINISHED))
+        )
+        for backup in result.scalars():
+            backup.status = "failed"
+            backup.error_message = "Lease expired"
+            backup.completed_at = now
+
+    @staticmethod
+    async def _settle(db: AsyncSession, job_id: int, worker_id: str, **values) -> bool:
+        result = await db.execute(
+            update(BackupJob)
+            .where(
+                BackupJob.id == job_id,
+                BackupJob.locked_by == worker_id,
+                BackupJob.status == "running",
+            )
+            .values(**values)
+        )
+        await db.commit()
+        return result.rowcount == 1
+
+    @staticmethod
+    async def heartbeat(
+        db: AsyncSession, job_id: int, worker_id: str, now: datetime | None = None
+    ) -> bool:
+        """Extend the lease; False if the job is no longer ours."""
+        now = now or datetime.now(UTC)
+        visibility = timedelta(seconds=get_settings().job_visibility_timeout_seconds)
+        return await JobQueue._settle(db, job_id, worker_id, locked_until=now + visibility)
+
+    @staticmethod
+    async def complete(
+        db: AsyncSession, job_id: int, worker_id: str, backup_id: int | None
+    ) -> bool:
+        """Mark a job done."""
+        return await JobQueue._settle(
+            db,
+            job_id,
+            worker_id,
+            status="completed",
+            backup_id=backup_id,
+            locked_by=None,
+            locked_until=None,
+        )
+
+    @staticmethod
+    async def fail(
+        db: AsyncSession,
+        job: BackupJob,
+        worker_id: str,
+        error: str,
+        backup_id: int | None = None,
+        now: datetime | None = None,
+    ) -> bool:
+        """Requeue with backoff, or fail for good once attempts run out."""
+        now = now or datetime.now(UTC)
+        values = {
+            "last_error": error,
+            "backup_id": backup_id,
+            "locked_by": None,
+            "locked_until": None,
+        }
+        if job.attempts < job.max_attempts:
+            values.update(status="queued", available_at=now + retry_delay(job.attempts))
+        else:
+            values.update(status="failed")
+        return await JobQueue._settle(db, job.id, worker_id, **values)
+
+    @staticmethod
+    async def release(db: AsyncSession, job_ids: Iterable[int], worker_id: str) -> None:
+        """Hand unfinished jobs back to the queue (used on shutdown)."""
+        await db.execute(
+            update(BackupJob)
+            .where(
+                BackupJob.id.in_(list(job_ids)),
+                BackupJob.locked_by == worker_id,
+                BackupJob.status == "running",
+            )
+            .values(
+                status="queued",
+                attempts=BackupJob.attempts - 1,
+                available_at=datetime.now(UTC),
+                locked_by=None,
+                locked_until=None,
+            )
+        )
+        await db.commit()
+
+
+class BackupWorker:
+    """Pulls jobs from the queue and runs them through the orchestrator."""
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession] = AsyncSessionLocal,
+        orchestrator: "BackupOrchestrator | None" = None,
+        worker_id: str | None = None,
+        concurrency: int | None = None,
+        poll_seconds: float | None = None,
+    ):
+        settings = get_settings()
+        self.session_factory = session_factory
+        self._orchestrator = orchestrator
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.concurrency = concurrency or settings.worker_concurrency
+        self.poll_seconds = poll_seconds or settings.worker_poll_seconds
+        self.heartbeat_seconds = settings.job_heartbeat_seconds
+        self._active: dict[asyncio.Task, int] = {}
+
+    @property
+    def orchestrator(self) -> "BackupOrchestrator":
+        if self._orchestrator is None:
+            from app.services.backup_orchestrator import BackupOrchestrator
+
+            self._orchestrator = BackupOrchestrator(self.session_factory)
+        return self._orchestrator
+
+    async def poll(self) -> int:
+        """Claim jobs for any free slots and start them; returns how many started."""
+        free = self.concurrency - len(self._active)
+        if free <= 0:
+            return 0
+        async with self.session_factory() as db:
+            jobs = await JobQueue.claim(db, self.worker_id, free)
+        for job in jobs:
+            task = asyncio.create_task(self._execute(job))
+            self._active[task] = job.id
+            task.add_done_callback(self._active.pop)
+        return len(jobs)
+
+    async def run(self) -> None:
+        """Work the queue forever (run as a background task)."""
+        try:
+            while True:
+                try:
+                    started = await self.poll()
+                except Exception:
+                    logger.exception("Claiming backup jobs failed")
+                    started = 0
+                if started and len(self._active) < self.concurrency:
+                    continue  # there may be more waiting
+                if self._active:
+                    await asyncio.wait(
+                        self._active, timeout=self.poll_seconds, return_when=asyncio.FIRST_COMPLETED
+                    )
+                else:
+                    await asyncio.sleep(self.poll_seconds)
+        finally:
+            await self._shutdown()
+
+    async def _shutdown(self) -> None:
+        job_ids = list(self._active.values())
+        tasks = list(self._active)
+        for task in tasks:
+            task.cancel()
+        # Let cancelled backups record themselves as failed before the jobs go back.
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if job_ids:
+            with suppress(Exception):
+                async with self.session_factory() as db:
+                    await JobQueue.release(db, job_ids, self.worker_id)
+
+    async def _execute(self, job: BackupJob) -> None:
+        work = asyncio.create_task(self._run_job(job))
+        beat = asyncio.create_task(self._heartbeat(job.id, work))
+        try:
+            # wait() rather than await: cancelling us must not skip work's cleanup.
+            await asyncio.wait({work})
+        except asyncio.CancelledError:
+            work.cancel()
+            await asyncio.wait({work})
+            raise
+        finally:
+            beat.cancel()
+        if not work.cancelled():
+            work.result()
+
+    async def _heartbeat(self, job_id: int, work: asyncio.Task) -> None:
+        visibility = get_settings().job_visibility_timeout_seconds
+        lease_ends = time.monotonic() + visibility
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            try:
+                async with self.session_factory() as db:
+                    ours = await JobQueue.heartbeat(db, job_id, self.worker_id)
+            except Exception:
+                logger.exception("Heartbeat for job %d failed", job_id)
+                if time.monotonic() + self.heartbeat_seconds >= lease_ends:
+                    # The lease will lapse before the next attempt and another
+                    # worker may reclaim the job; stop rather than back up twice.
+                    logger.warning("Cannot renew lease on job %d; abandoning it", job_id)
+                    work.cancel()
+                    return
+                continue
+            if not ours:
+                # Someone else owns the job now; stop rather than back up twice.
+                logger.warning("Lost lease on job %d; abandoning it", job_id)
+                work.cancel()
+                return
+            lease_ends = time.monotonic() + visibility
+
+    async def _run_job(self, job: BackupJob) -> None:
+        async with self.session_factory() as db:
+            device = await db.get(Device, job.device_id)
+        if device is None:
+            async with self.session_factory() as db:
+                await JobQueue.fail(db, job, self.worker_id, "Device no longer exists")
+            return
+
+        try:
+            result = await self.orchestrator.backup_one(
+                device, backup_type=job.backup_type, job_id=job.id
+            )
+            error, backup_id = result.error_message, result.backup_id
+            ok = result.status == "completed"
+        except Exception as e:
+            logger.exception("Backup job %d failed", job.id)
+            error, backup_id, ok = str(e) or e.__class__.__name__, None, False
+
+        async with self.session_factory() as db:
+            if ok:
+                await JobQueue.complete(db, job.id, self.worker_id, backup_id)
+            else:
+                await JobQueue.fail(db, job, self.worker_id, error or "Backup failed", backup_id)
@@ -0,0 +1,96 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Key Rotation Service
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+#
+# After fernet_key changes (with the old key moved to fernet_previous_keys),
+# device API keys still decrypt but remain under the old key until rewritten.
+# This job walks the devices table in primary-key order and re-encrypts it in
+# small batches, one short transaction per batch, so it never holds more than
+# a batch of row locks and never blocks the table.
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import logging
+
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import get_settings
+from app.database import AsyncSessionLocal
+from app.models.device import Device
+from app.services.crypto_service import CryptoService, get_crypto_service
+
+logger = logging.getLogger(__name__)
+
+
+class KeyRotationService:
+    """Re-encrypts stored device API keys under the current Fernet key."""
+
+    @staticmethod
+    async def reencrypt_batch(
+        db: AsyncSession,
+        after_id: int,
+        batch_size: int,
+        crypto: CryptoService | None = None,
+    ) -> tuple[int | None, int]:
+        """Rotate one batch of devices with id > after_id.
+
+        Returns the last id seen (None when there are no more rows) and how many
+        rows were rewritten. A row whose ciphertext changed since it was read is
+        left alone; it was written under the current key by whoever changed it.
+        """
+        crypto = crypto or get_crypto_service()
+        rows = (
+            await db.execute(
+                select(Device.id, Device.api_key_encrypted)
+                .where(Device.id > after_id)
+                .order_by(Device.id)
+                .limit(batch_size)
+            )
+        ).all()
+        if not rows:
+            return None, 0
+
+        params = []
+        for device_id, ciphertext in rows:
+            if not crypto.needs_rotation(ciphertext):
+                continue
+            try:
+                rotated = crypto.rotate(ciphertext)
+            except ValueError:
+                logger.error("Device %d API key cannot be decrypted with any known key", device_id)
+                continue
+            params.append({"b_id": device_id, "b_old": ciphertext, "b_new": rotated})
+
+        if params:
+            table = Device.__table__
+            await db.execute(
+                update(table)
+                .where(table.c.id == bindparam("b_id"))
+                .where(table.c.api_key_encrypted == bindparam("b_old"))
+                .values(api_key_encrypted=bindparam("b_new")),
+                params,
+            )
+        await db.commit()
+        return rows[-1][0], len(params)
+
+    @staticmethod
+    async def reencrypt_all(
+        session_factory: async_sessionmaker[AsyncSession] = AsyncSessionLocal,
+        batch_size: int | None = None,
+        crypto: CryptoService | None = None,
+    ) -> int:
+        """Rotate every device row in batches; returns how many were rewritten."""
+        batch_size = batch_size or get_settings().key_rotation_batch_size
+        crypto = crypto or get_crypto_service()
+        after_id, total = 0, 0
+        while True:
+            async with session_factory() as db:
+                after_id, rotated = await KeyRotationService.reencrypt_batch(
+                    db, after_id, batch_size, crypto
+                )
+            if after_id is None:
+                break
+            total += rotated
+        if total:
+            logger.info("Re-encrypted %d device API key(s) under the current key", total)
+        return total
@@ -0,0 +1,178 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Leader Election
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+#
+# Elects one process, across all uvicorn workers and replicas, to run
+# singleton duties such as the schedule engine. Every other process keeps
+# serving the API as a follower.
+#
+# The leader holds a session-level pg_try_advisory_lock on a dedicated
+# connection and pings it every leader_check_seconds. If the leader dies,
+# Postgres drops the lock with its connection, and a follower wins it on its
+# next attempt (every leader_retry_seconds). A leader whose connection fails
+# stops its duties before anyone else can take over.
+#
+# Other databases have no advisory locks; there the process assumes it is
+# alone and always leads.
+#
+# advisory_lock() holds the same kind of lock for one block of work, for
+# jobs that any process may start but only one may run at a time (manual
+# prune and scrub runs, startup schema and admin setup).
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import asyncio
+import logging
+import os
+import socket
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager, suppress
+from datetime import UTC, datetime
+from functools import lru_cache
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app.config import get_settings
+from app.database import engine
+
+logger = logging.getLogger(__name__)
+
+
+async def _try_lock(conn: AsyncConnection, lock_id: int) -> bool:
+    acquired = await conn.scalar(
+        text("SELECT pg_try_advisory_lock(:lock_id)"), {"lock_id": lock_id}
+    )
+    # Session-level locks outlive the transaction; don't sit idle in one.
+    await conn.commit()
+    return bool(acquired)
+
+
+async def _unlock(conn: AsyncConnection, lock_id: int) -> None:
+    try:
+        await conn.execute(text("SELECT pg_advisory_unlock(:lock_id)"), {"lock_id": lock_id})
+        await conn.commit()
+    except Exception:
+        # Never pool a connection that may still hold the lock.
+        await conn.invalidate()
+
+
+@asynccontextmanager
+async def advisory_lock(
+    target: AsyncEngine, lock_id: int, wait: bool = False
+) -> AsyncIterator[bool]:
+    """Hold ``lock_id`` for the block; yields False if another process holds it.
+
+    With ``wait``, blocks until the lock is free instead and always yields True.
+    """
+    if target.dialect.name != "postgresql":
+        yield True
+        return
+    async with target.connect() as conn:
+        if wait:
+            await conn.execute(text("SELECT pg_advisory_lock(:lock_id)"), {"lock_id": lock_id})
+            await conn.commit()
+        elif not await _try_lock(conn, lock_id):
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            await _unlock(conn, lock_id)
+
+
+class LeaderElector:
+    """Runs duties only while this process holds the leader lock."""
+
+    def __init__(
+        self,
+        target: AsyncEngine = engine,
+        lock_id: int | None = None,
+        retry_seconds: float | None = None,
+        check_seconds: float | None = None,
+        node_id: str | None = None,
+    ):
+        settings = get_settings()
+        self.target = target
+        self.lock_id = lock_id if lock_id is not None else settings.scheduler_lock_id
+        self.retry_seconds = retry_seconds or settings.leader_retry_seconds
+        self.check_seconds = check_seconds or settings.leader_check_seconds
+        self.node_id = node_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.role = "inactive"  # until run() starts
+        self.since = datetime.now(UTC)
+        self.elections = 0
+
+    @property
+    def uses_advisory_lock(self) -> bool:
+        return self.target.dialect.name == "postgresql"
+
+    def status(self) -> dict:
+        """Role of this process, for the health endpoint."""
+        return {
+            "role": self.role,
+            "node": self.node_id,
+            "since": self.since.isoformat(),
+            "elections": self.elections,
+        }
+
+    def _set_role(self, role: str) -> None:
+        if role != self.role:
+            logger.info("Scheduler %s is now %s", self.node_id, role)
+            self.role = role
+            self.since = datetime.now(UTC)
+
+    async def try_acquire(self, conn: AsyncConnection) -> bool:
+        """Take the leader lock on ``conn`` if nobody holds it."""
+        if not self.uses_advisory_lock:
+            return True
+        return await _try_lock(conn, self.lock_id)
+
+    async def check(self, conn: AsyncConnection) -> None:
+        """Raise if the lock connection is gone."""
+        await conn.execute(text("SELECT 1"))
+        await conn.commit()
+
+    async def release(self, conn: AsyncConnection) -> None:
+        """Drop the lock before the connection goes back to the pool."""
+        if not self.uses_advisory_lock:
+            return
+        await _unlock(conn, self.lock_id)
+
+    async def run(self, duties: Callable[[], Awaitable[None]]) -> None:
+        """Compete for leadership forever, running ``duties`` while leader."""
+        self._set_role("follower")
+        try:
+            while True:
+                try:
+                    async with self.target.connect() as conn:
+                        if await self.try_acquire(conn):
+                            try:
+                                await self._lead(conn, duties)
+                            finally:
+                                await self.release(conn)
+                except Exception:
+                    logger.exception("Leader duties or lock connection failed")
+                self._set_role("follower")
+                await asyncio.sleep(self.retry_seconds)
+        finally:
+            self._set_role("inactive")
+
+    async def _lead(self, conn: AsyncConnection, duties: Callable[[], Awaitable[None]]) -> None:
+        self.elections += 1
+        self._set_role("leader")
+        task = asyncio.ensure_future(duties())
+        try:
+            while not task.done():
+                await asyncio.wait({task}, timeout=self.check_seconds)
+                if not task.done():
+                    await self.check(conn)
+            task.result()
+        finally:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+
+
+@lru_cache
+def get_leader_elector() -> LeaderElector:
+    """Process-wide elector (built on first use)."""
+    return LeaderElector()
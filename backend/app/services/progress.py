@@ -0,0 +1,187 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Backup Progress Hub
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+#
+# In-process publish/subscribe for live backup progress. The ingest path and
+# the fleet orchestrator publish; the /api/backups/events SSE stream
+# subscribes. Nothing here touches the database, so a thousand dashboards
+# watching a fleet run cost no queries.
+#
+# Publishing never blocks. Each subscriber keeps only the latest event per
+# backup (and per run), so a slow client skips intermediate progress rather
+# than buffering it, yet always sees every final state. New subscribers
+# start from a snapshot of what is in flight.
+#
+# Events reach subscribers in the process that ran the backup; with the
+# queue worker in the API process (worker_enabled, the default) that is
+# every backup this replica runs.
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import asyncio
+import time
+import uuid
+from datetime import UTC, datetime
+from functools import lru_cache
+
+from app.config import get_settings
+from app.schemas.backup import BackupProgress, RunProgress
+
+ProgressEvent = BackupProgress | RunProgress
+
+# Phases after which nothing more is published for a backup or run.
+FINAL_PHASES = ("completed", "failed")
+
+
+def _key(event: ProgressEvent) -> tuple[str, int | str]:
+    if isinstance(event, BackupProgress):
+        return "backup", event.backup_id
+    return "run", event.run_id
+
+
+class Subscription:
+    """One subscriber's coalesced view of the event stream."""
+
+    def __init__(self, hub: "ProgressHub"):
+        self._hub = hub
+        self._pending: dict[tuple[str, int | str], ProgressEvent] = {}
+        self._ready = asyncio.Event()
+
+    def _offer(self, event: ProgressEvent) -> None:
+        key = _key(event)
+        self._pending.pop(key, None)  # re-insert so delivery follows publish order
+        self._pending[key] = event
+        self._ready.set()
+
+    async def next_batch(self, timeout: float | None = None) -> list[ProgressEvent]:
+        """Events published since the last call; empty if ``timeout`` passes first."""
+        if not self._pending:
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except TimeoutError:
+                return []
+        batch = list(self._pending.values())
+        self._pending.clear()
+        self._ready.clear()
+        return batch
+
+    def close(self) -> None:
+        self._hub._subscribers.discard(self)
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class ProgressHub:
+    """Fans progress events out to subscribers and remembers what is in flight."""
+
+    def __init__(self):
+        self._subscribers: set[Subscription] = set()
+        self._active: dict[tuple[str, int | str], ProgressEvent] = {}
+
+    def publish(self, event: ProgressEvent) -> None:
+        key = _key(event)
+        if event.phase in FINAL_PHASES:
+            self._active.pop(key, None)
+        else:
+            self._active[key] = event
+        for subscription in self._subscribers:
+            subscription._offer(event)
+
+    def subscribe(self) -> Subscription:
+        """Start receiving events, beginning with everything currently in flight."""
+        subscription = Subscription(self)
+        for event in self._active.values():
+            subscription._offer(event)
+        self._subscribers.add(subscription)
+        return subscription
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+
+class BackupProgressTracker:
+    """Publishes one backup's progress, rate-limited to progress_interval_seconds."""
+
+    def __init__(self, backup_id: int, device_id: int, hub: ProgressHub | None = None):
+        self.backup_id = backup_id
+        self.device_id = device_id
+        self.hub = hub or get_progress_hub()
+        self.interval = get_settings().progress_interval_seconds
+        self.bytes_received = 0
+        self._started = time.monotonic()
+        self._last_publish = 0.0
+        self._phase = "pending"
+
+    def phase(self, phase: str) -> None:
+        """Enter a new phase; "downloading" restarts the throughput clock."""
+        self._phase = phase
+        if phase == "downloading":
+            self._started = time.monotonic()
+        self._publish()
+
+    def advance(self, nbytes: int) -> None:
+        self.bytes_received += nbytes
+        if time.monotonic() - self._last_publish >= self.interval:
+            self._publish()
+
+    def finish(self, status: str, error_message: str | None = None) -> None:
+        if self._phase in FINAL_PHASES:
+            return  # already reported, e.g. by ingest before run_backup saw it
+        self._phase = status
+        self._publish(error_message)
+
+    def _publish(self, error_message: str | None = None) -> None:
+        now = time.monotonic()
+        self._last_publish = now
+        elapsed = now - self._started
+        self.hub.publish(
+            BackupProgress(
+                backup_id=self.backup_id,
+                device_id=self.device_id,
+                phase=self._phase,
+                bytes_received=self.bytes_received,
+                throughput=self.bytes_received / elapsed if elapsed > 0 else 0.0,
+                error_message=error_message,
+                at=datetime.now(UTC),
+            )
+        )
+
+
+class RunProgressTracker:
+    """Publishes aggregate progress for a fleet run as its backups start and finish."""
+
+    def __init__(self, total: int, hub: ProgressHub | None = None):
+        self.hub = hub or get_progress_hub()
+        self.event = RunProgress(
+            run_id=uuid.uuid4().hex, phase="running", total=total, at=datetime.now(UTC)
+        )
+        self.hub.publish(self.event)
+
+    def started(self) -> None:
+        self._publish(running=self.event.running + 1)
+
+    def finished(self, status: str, file_size: int = 0) -> None:
+        completed = status == "completed"
+        self._publish(
+            running=self.event.running - 1,
+            completed=self.event.completed + completed,
+            failed=self.event.failed + (not completed),
+            bytes_stored=self.event.bytes_stored + (file_size if completed else 0),
+        )
+
+    def close(self) -> None:
+        self._publish(phase="completed")
+
+    def _publish(self, **changes) -> None:
+        self.event = self.event.model_copy(update={**changes, "at": datetime.now(UTC)})
+        self.hub.publish(self.event)
+
+
+@lru_cache
+def get_progress_hub() -> ProgressHub:
+    """Process-wide progress hub."""
+    return ProgressHub()
@@ -0,0 +1,353 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Retention Service
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+#
+# Enforces schedule retention. A backup is kept if it is newer than
+# retention_days, or if it is the newest completed backup of one of the
+# keep_daily most recent days, keep_weekly ISO weeks or keep_monthly months
+# (grandfather-father-son). The newest completed backup of a device is never
+# pruned. Pending and running backups are never touched.
+#
+# Each device is walked newest first along ix_backups_device_id_created_at in
+# keyset batches. Expired rows in a batch are deleted with DELETE ... RETURNING
+# and committed before the next batch, keeping transactions short. Only the
+# rows the DELETE returned are counted, released and unlinked, so a row that
+# an overlapping run (or a manual delete) removed first is never freed twice;
+# the calendar rollup and storage counters are adjusted from the same rows in
+# the same transaction. Files are unlinked after the commit with bounded
+# parallelism; a crash in between leaves an orphan file, never a row pointing
+# at a missing file.
+#
+# A run that deletes holds the retention_lock_id advisory lock, so the
+# leader's periodic run and a manual prune on any replica never overlap.
+#
+# Deduplicated backups free nothing by themselves: their chunk references
+# are released after the commit, and a garbage collection pass at the end of
+# the run deletes chunks no manifest uses any more. Their space shows up in
+# the run's bytes_freed, not a device's.
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import asyncio
+import logging
+import os
+import time
+from collections import Counter
+from collections.abc import Iterable
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+from typing import NamedTuple
+
+from sqlalchemy import delete, func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import get_settings
+from app.database import AsyncSessionLocal
+from app.models.backup import Backup
+from app.models.backup_rollup import apply_count_deltas, bucket_for
+from app.models.device import Device
+from app.models.schedule import Schedule
+from app.models.storage_counter import apply_storage_deltas
+from app.schemas.backup import DevicePruneResult, PruneSummary
+from app.services.chunk_store import CHUNKED, ChunkStore, read_manifest
+from app.services.leader_election import advisory_lock
+
+logger = logging.getLogger(__name__)
+
+# Never pruned: work in progress.
+_IN_PROGRESS = ("pending", "running")
+
+
+class PruneInProgressError(RuntimeError):
+    """Raised when another process is already pruning."""
+
+
+class RetentionPolicy(NamedTuple):
+    days: int
+    keep_daily: int = 0
+    keep_weekly: int = 0
+    keep_monthly: int = 0
+
+
+# Columns read into a BackupRef, sized by bytes on disk.
+_REF_COLUMNS = (
+    Backup.id,
+    Backup.created_at,
+    Backup.status,
+    Backup.file_path,
+    func.coalesce(Backup.compressed_size, Backup.file_size),
+    Backup.layout,
+)
+
+
+class BackupRef(NamedTuple):
+    id: int
+    created_at: datetime
+    status: str
+    file_path: str
+    file_size: int  # bytes on disk
+    layout: str | None = None
+
+
+class _GFSState:
+    """Periods already represented by a kept backup, newest first."""
+
+    def __init__(self, policy: RetentionPolicy, now: datetime):
+        self.policy = policy
+        self.cutoff = now - timedelta(days=policy.days)
+        self.days: set = set()
+        self.weeks: set = set()
+        self.months: set = set()
+        self.kept_completed = False
+
+    def keep(self, backup: BackupRef) -> bool:
+        created_at = _aware(backup.created_at)
+        if backup.status in _IN_PROGRESS:
+            return True
+        if backup.status != "completed":
+            # Failed backups only follow the age limit and never fill a GFS slot.
+            return created_at >= self.cutoff
+
+        keep = created_at >= self.cutoff or not self.kept_completed
+        self.kept_completed = True
+        for seen, key, limit in (
+            (self.days, created_at.date(), self.policy.keep_daily),
+            (self.weeks, created_at.isocalendar()[:2], self.policy.keep_weekly),
+            (self.months, (created_at.year, created_at.month), self.policy.keep_monthly),
+        ):
+            if key not in seen and len(seen) < limit:
+                seen.add(key)
+                keep = True
+        return keep
+
+
+def _aware(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes; everything is stored in UTC.
+    return value if value.tzinfo else value.replace(tzinfo=UTC)
+
+
+def select_expired(
+    backups: Iterable[BackupRef], policy: RetentionPolicy, now: datetime
+) -> list[BackupRef]:
+    """Backups (given newest first) that the policy no longer keeps."""
+    state = _GFSState(policy, now)
+    return [backup for backup in backups if not state.keep(backup)]
+
+
+class RetentionService:
+    """Service for pruning backups that fall outside their retention policy."""
+
+    @staticmethod
+    async def policies(db: AsyncSession) -> dict[int, RetentionPolicy]:
+        """Effective policy per device: the most generous of its enabled schedules."""
+        rows = await db.execute(
+            select(
+                Schedule.device_id,
+                func.max(Schedule.retention_days),
+                func.max(Schedule.keep_daily),
+                func.max(Schedule.keep_weekly),
+                func.max(Schedule.keep_monthly),
+            )
+            .where(Schedule.is_enabled == True)  # noqa: E712
+            .group_by(Schedule.device_id)
+        )
+        policies = {row[0]: RetentionPolicy(*row[1:]) for row in rows.all()}
+
+        default_days = get_settings().retention_default_days
+        if default_days > 0:
+            device_ids = (await db.execute(select(Device.id))).scalars()
+            for device_id in device_ids:
+                policies.setdefault(device_id, RetentionPolicy(default_days))
+        return policies
+
+    @staticmethod
+    async def prune(
+        session_factory: async_sessionmaker[AsyncSession] = AsyncSessionLocal,
+        dry_run: bool = False,
+        device_ids: Iterable[int] | None = None,
+        now: datetime | None = None,
+        batch_size: int | None = None,
+    ) -> PruneSummary:
+        """Prune every device with a policy (or just ``device_ids``).
+
+        Raises PruneInProgressError if another process is pruning (not for dry runs).
+        """
+        if dry_run:
+            return await RetentionService._prune(session_factory, True, device_ids, now, batch_size)
+        target = session_factory.kw["bind"]
+        async with advisory_lock(target, get_settings().retention_lock_id) as acquired:
+            if not acquired:
+                raise PruneInProgressError("Another process is already pruning backups")
+            return await RetentionService._prune(
+                session_factory, False, device_ids, now, batch_size
+            )
+
+    @staticmethod
+    async def _prune(
+        session_factory: async_sessionmaker[AsyncSession],
+        dry_run: bool,
+        device_ids: Iterable[int] | None,
+        now: datetime | None,
+        batch_size: int | None,
+    ) -> PruneSummary:
+        settings = get_settings()
+        now = now or datetime.now(UTC)
+        batch_size = batch_size or settings.retention_batch_size
+        started_at = datetime.now(UTC)
+        start = time.monotonic()
+
+        async with session_factory() as db:
+            policies = await RetentionService.policies(db)
+        if device_ids is not None:
+            wanted = set(device_ids)
+            policies = {d: p for d, p in policies.items() if d in wanted}
+
+        unlinker = _Unlinker(settings.backup_path, settings.retention_unlink_concurrency)
+        results = []
+        chunk_bytes_freed = 0
+        for device_id, policy in sorted(policies.items()):
+            deleted, freed = await RetentionService._prune_device(
+                session_factory, device_id, policy, now, batch_size, dry_run, unlinker
+            )
+            if deleted:
+                results.append(
+                    DevicePruneResult(device_id=device_id, deleted=deleted, bytes_freed=freed)
+                )
+        if results and not dry_run:
+            _, chunk_bytes_freed = await ChunkStore(settings.backup_path).collect_garbage(
+                session_factory
+            )
+
+        summary = PruneSummary(
+            dry_run=dry_run,
+            started_at=started_at,
+            duration_seconds=time.monotonic() - start,
+            deleted=sum(r.deleted for r in results),
+            bytes_freed=sum(r.bytes_freed for r in results) + chunk_bytes_freed,
+            files_missing=unlinker.missing,
+            devices=results,
+        )
+        if summary.deleted and not dry_run:
+            logger.info("Pruned %d backup(s), freed %d bytes", summary.deleted, summary.bytes_freed)
+        return summary
+
+    @staticmethod
+    async def _prune_device(
+        session_factory: async_sessionmaker[AsyncSession],
+        device_id: int,
+        policy: RetentionPolicy,
+        now: datetime,
+        batch_size: int,
+        dry_run: bool,
+        unlinker: "_Unlinker",
+    ) -> tuple[int, int]:
+        state = _GFSState(policy, now)
+        deleted = freed = 0
+        after: tuple[datetime, int] | None = None
+
+        while True:
+            async with session_factory() as db:
+                query = (
+                    select(*_REF_COLUMNS)
+                    .where(Backup.device_id == device_id)
+                    .order_by(Backup.created_at.desc(), Backup.id.desc())
+                    .limit(batch_size)
+                )
+                if after is not None:
+                    query = query.where(tuple_(Backup.created_at, Backup.id) < after)
+                batch = [BackupRef(*row) for row in (await db.execute(query)).all()]
+                if not batch:
+                    break
+                after = (batch[-1].created_at, batch[-1].id)
+
+                expired = [backup for backup in batch if not state.keep(backup)]
+                if expired and not dry_run:
+                    expired = await RetentionService._delete(db, device_id, expired)
+                    await db.commit()
+
+            deleted += len(expired)
+            freed += sum(
+                b.file_size for b in expired if b.status == "completed" and b.layout != CHUNKED
+            )
+            if expired and not dry_run:
+                chunked = [b.file_path for b in expired if b.layout == CHUNKED and b.file_path]
+                if chunked:
+                    await RetentionService._release_chunks(session_factory, chunked)
+                await unlinker.unlink_all(b.file_path for b in expired if b.file_path)
+            if len(batch) < batch_size:
+                break
+
+        return deleted, freed
+
+    @staticmethod
+    async def _delete(
+        db: AsyncSession, device_id: int, expired: list[BackupRef]
+    ) -> list[BackupRef]:
+        """Delete ``expired`` rows; returns only the ones this statement removed."""
+        result = await db.execute(
+            delete(Backup)
+            .where(Backup.id.in_([b.id for b in expired]), Backup.status.notin_(_IN_PROGRESS))
+            .returning(*_REF_COLUMNS)
+            .execution_options(synchronize_session=False)
+        )
+        deleted = [BackupRef(*row) for row in result.all()]
+
+        # A bulk DELETE skips the after_flush hooks; apply their deltas here.
+        counts = Counter((device_id, bucket_for(b.created_at), b.status) for b in deleted)
+        completed = [b for b in deleted if b.status == "completed"]
+        await db.run_sync(apply_count_deltas, {key: -n for key, n in counts.items()})
+        if completed:
+            stored = -len(completed), -sum(b.file_size or 0 for b in completed)
+            await db.run_sync(apply_storage_deltas, {device_id: stored})
+        return deleted
+
+    @staticmethod
+    async def _release_chunks(
+        session_factory: async_sessionmaker[AsyncSession], manifest_paths: list[str]
+    ) -> None:
+        refs = []
+        for path in manifest_paths:
+            try:
+                refs += await asyncio.to_thread(read_manifest, path)
+            except FileNotFoundError:
+                logger.warning("Manifest %s is missing; its chunks stay referenced", path)
+        async with session_factory() as db:
+            await ChunkStore.release(db, refs)
+
+    @staticmethod
+    async def run_pruner(
+        session_factory: async_sessionmaker[AsyncSession] = AsyncSessionLocal,
+        interval_seconds: float | None = None,
+    ) -> None:
+        """Prune forever at a fixed interval (run as a background task)."""
+        interval = interval_seconds or get_settings().retention_interval_minutes * 60
+        while True:
+            try:
+                await RetentionService.prune(session_factory)
+            except PruneInProgressError:
+                logger.info("Skipping retention run: another process is pruning")
+            except Exception:
+                logger.exception("Retention pruning failed")
+            await asyncio.sleep(interval)
+
+
+class _Unlinker:
+    """Deletes backup files with a cap on concurrent unlinks."""
+
+    def __init__(self, backup_path: str, concurrency: int):
+        self.root = Path(backup_path).resolve()
+        self.limit = asyncio.Semaphore(concurrency)
+        self.missing = 0
+
+    async def unlink_all(self, paths: Iterable[str]) -> None:
+        await asyncio.gather(*(self._unlink(path) for path in paths))
+
+    async def _unlink(self, file_path: str) -> None:
+        path = Path(file_path).resolve()
+        if not path.is_relative_to(self.root):
+            logger.warning("Not deleting %s: outside backup_path", file_path)
+            return
+        async with self.limit:
+            try:
+                await asyncio.to_thread(os.unlink, path)
+            except FileNotFoundError:
+                self.missing += 1
@@ -0,0 +1,349 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Schedule Engine
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+#
+# Runs Schedule rows. Due times live in a min-heap keyed on next_run, and
+# the engine sleeps until the earliest one instead of polling the table.
+# Cron expressions are compiled once per distinct expression. A due
+# schedule becomes a queued BackupJob; workers run it (see job_queue).
+#
+# Every device gets a fixed offset inside scheduler_jitter_seconds, derived
+# from a hash of its id, so 500 schedules on "0 2 * * *" are spread over the
+# window rather than all starting at 02:00:00, and each device still runs at
+# the same time every night.
+#
+# Committed schedule edits are picked up through Session hooks (like the
+# user cache): the engine re-reads the changed rows and re-keys them. Stale
+# heap entries are invalidated in place, so a re-key costs one O(log n) push.
+# The hooks only see this process, and the engine runs on the leader, so
+# every scheduler_resync_seconds it also compares max(updated_at) and the
+# row count of schedules against what it last saw; when either moved, the
+# rows updated since (and any it holds that are gone) are re-read the same
+# way. That also bounds the sleep when no schedule is due.
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import asyncio
+import hashlib
+import heapq
+import logging
+import time
+import weakref
+from collections.abc import Iterable
+from datetime import UTC, datetime, timedelta
+from functools import lru_cache
+from typing import TYPE_CHECKING, NamedTuple
+
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session, selectinload
+
+from app.config import get_settings
+from app.database import AsyncSessionLocal
+from app.models.schedule import Schedule
+from app.services.job_queue import JobQueue
+
+if TYPE_CHECKING:
+    from apscheduler.triggers.cron import CronTrigger
+
+logger = logging.getLogger(__name__)
+
+# Pause before reloading every schedule after a database error.
+_RETRY_SECONDS = 5.0
+
+
+@lru_cache(maxsize=1024)
+def compile_cron(expression: str, timezone: str = "UTC") -> "CronTrigger":
+    """Parse a crontab expression once; raises ValueError if it is invalid."""
+    from apscheduler.triggers.cron import CronTrigger
+
+    return CronTrigger.from_crontab(expression, timezone=timezone)
+
+
+def device_jitter(device_id: int, window_seconds: float) -> timedelta:
+    """Stable per-device offset in [0, window_seconds), same in every process."""
+    if window_seconds <= 0:
+        return timedelta(0)
+    digest = hashlib.blake2b(str(device_id).encode(), digest_size=8).digest()
+    window_ms = int(window_seconds * 1000)
+    return timedelta(milliseconds=int.from_bytes(digest, "big") % window_ms)
+
+
+def _aware(value: datetime | None) -> datetime | None:
+    # SQLite hands back naive datetimes; everything is stored in UTC.
+    if value is None or value.tzinfo is not None:
+        return value
+    return value.replace(tzinfo=UTC)
+
+
+class SchedulePlan(NamedTuple):
+    """Everything needed to compute a schedule's next run."""
+
+    device_id: int
+    jitter: timedelta
+    cron: "CronTrigger | None" = None
+    interval: timedelta | None = None
+
+    def next_run(self, after: datetime, last_run: datetime | None = None) -> datetime:
+        """First run strictly after ``after``."""
+        if self.cron is not None:
+            # Find the first unjittered fire time whose jittered time is after `after`.
+            base = self.cron.get_next_fire_time(
+                None, after - self.jitter + timedelta(microseconds=1)
+            )
+            return base + self.jitter
+        if last_run is not None and last_run + self.interval > after:
+            return last_run + self.interval
+        return after + min(self.jitter, self.interval)
+
+
+class ScheduleHeap:
+    """Min-heap of (due, schedule_id) supporting O(log n) re-keying."""
+
+    def __init__(self):
+        self._heap: list[list] = []
+        self._entries: dict[int, list] = {}
+
+    def push(self, schedule_id: int, due: datetime) -> None:
+        """Add a schedule or move it to a new due time."""
+        self.remove(schedule_id)
+        entry = [due, schedule_id, True]
+        self._entries[schedule_id] = entry
+        heapq.heappush(self._heap, entry)
+
+    def remove(self, schedule_id: int) -> None:
+        entry = self._entries.pop(schedule_id, None)
+        if entry is not None:
+            entry[2] = False  # skipped when it reaches the top
+
+    def peek(self) -> tuple[datetime, int] | None:
+        """Earliest (due, schedule_id), or None when empty."""
+        while self._heap and not self._heap[0][2]:
+            heapq.heappop(self._heap)
+        return (self._heap[0][0], self._heap[0][1]) if self._heap else None
+
+    def pop_due(self, now: datetime) -> list[int]:
+        """Remove and return every schedule due at or before ``now``."""
+        due = []
+        while (top := self.peek()) is not None and top[0] <= now:
+            heapq.heappop(self._heap)
+            del self._entries[top[1]]
+            due.append(top[1])
+        return due
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, schedule_id: int) -> bool:
+        return schedule_id in self._entries
+
+
+# Running engines, told about committed schedule edits by the session hooks.
+_engines: "weakref.WeakSet[ScheduleEngine]" = weakref.WeakSet()
+
+
+class ScheduleEngine:
+    """Queues backup jobs for schedules as they come due."""
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession] = AsyncSessionLocal,
+        jitter_seconds: float | None = None,
+        timezone: str | None = None,
+        resync_seconds: float | None = None,
+    ):
+        settings = get_settings()
+        self.session_factory = session_factory
+        self.jitter_seconds = (
+            settings.scheduler_jitter_seconds if jitter_seconds is None else jitter_seconds
+        )
+        self.timezone = timezone or settings.scheduler_timezone
+        self.resync_seconds = resync_seconds or settings.scheduler_resync_seconds
+        self._seen: tuple[datetime | None, int] | None = None  # (max updated_at, count)
+        self.heap = ScheduleHeap()
+        self.plans: dict[int, SchedulePlan] = {}
+        self._dirty: set[int] = set()
+        self._wakeup = asyncio.Event()
+
+    def plan(self, schedule: Schedule) -> SchedulePlan:
+        """Compile a schedule row."""
+        jitter = device_jitter(schedule.device_id, self.jitter_seconds)
+        if schedule.cron_expression:
+            return SchedulePlan(
+                schedule.device_id,
+                jitter,
+                cron=compile_cron(schedule.cron_expression, self.timezone),
+            )
+        return SchedulePlan(
+            schedule.device_id, jitter, interval=timedelta(hours=schedule.interval_hours or 24)
+        )
+
+    def notify(self, schedule_ids: Iterable[int]) -> None:
+        """Re-read these schedules before the next deadline."""
+        self._dirty.update(schedule_ids)
+        self._wakeup.set()
+
+    async def load(self, schedule_ids: Iterable[int] | None = None) -> None:
+        """(Re)key schedules from the database: all of them, or just ``schedule_ids``."""
+        now = datetime.now(UTC)
+        async with self.session_factory() as db:
+            db.info["schedule_engine"] = True
+            query = select(Schedule)
+            if schedule_ids is not None:
+                schedule_ids = set(schedule_ids)
+                query = query.where(Schedule.id.in_(schedule_ids))
+            schedules = (await db.execute(query)).scalars().all()
+            if schedule_ids is None:
+                self._seen = await self._fingerprint(db)
+
+            for schedule in schedules:
+                if not schedule.is_enabled:
+                    self._forget(schedule.id)
+                    continue
+                try:
+                    plan = self.plan(schedule)
+                except ValueError as e:
+                    logger.error("Schedule %d has an invalid cron expression: %s", schedule.id, e)
+                    self._forget(schedule.id)
+                    continue
+
+                stored = _aware(schedule.next_run)
+                # An edit changes the plan, so a stored next_run may be stale.
+                if stored is None or (
+                    schedule_ids is not None and plan != self.plans.get(schedule.id)
+                ):
+                    stored = plan.next_run(now, _aware(schedule.last_run))
+                    schedule.next_run = stored
+                self.plans[schedule.id] = plan
+                self.heap.push(schedule.id, stored)
+            await db.commit()
+
+        if schedule_ids is not None:
+            for missing in schedule_ids - {s.id for s in schedules}:
+                self._forget(missing)
+
+    async def resync(self) -> None:
+        """Queue a re-read of schedules changed by other processes since the last look."""
+        async with self.session_factory() as db:
+            seen = await self._fingerprint(db)
+            if seen == self._seen:
+                return
+            watermark = self._seen[0] if self._seen is not None else None
+            rows = (await db.execute(select(Schedule.id, Schedule.updated_at))).all()
+        self._seen = seen
+
+        existing = {schedule_id for schedule_id, _ in rows}
+        changed = {
+            schedule_id
+            for schedule_id, updated_at in rows
+            if watermark is None or updated_at >= watermark
+        }
+        changed |= set(self.plans) - existing
+        if changed:
+            self.notify(changed)
+
+    @staticmethod
+    async def _fingerprint(db: AsyncSession) -> tuple[datetime | None, int]:
+        return tuple((await db.execute(select(func.max(Schedule.updated_at), func.count()))).one())
+
+    def _forget(self, schedule_id: int) -> None:
+        self.heap.remove(schedule_id)
+        self.plans.pop(schedule_id, None)
+
+    async def fire(self, schedule_ids: list[int], now: datetime) -> None:
+        """Advance due schedules and queue backups for their devices."""
+        async with self.session_factory() as db:
+            db.info["schedule_engine"] = True
+            schedules = (
+                (
+                    await db.execute(
+                        select(Schedule)
+                        .where(Schedule.id.in_(schedule_ids))
+                        .options(selectinload(Schedule.device))
+                    )
+                )
+                .scalars()
+                .all()
+            )
+            device_ids = set()
+            advanced = []
+            for schedule in schedules:
+                plan = self.plans.get(schedule.id)
+                if plan is None or not schedule.is_enabled:
+                    continue
+                schedule.last_run = now
+                schedule.next_run = plan.next_run(now, now)
+                advanced.append((schedule.id, schedule.next_run))
+                if schedule.device.is_active:
+                    device_ids.add(schedule.device_id)
+
+            # Same transaction as the next_run advance: a run is queued exactly once.
+            queued = await JobQueue.enqueue(db, device_ids, "scheduled", now)
+            await db.commit()
+
+        for schedule_id, next_run in advanced:
+            self.heap.push(schedule_id, next_run)
+
+        for device_id in device_ids.difference(queued):
+            logger.warning("Device %d still has a backup queued or running; skipping", device_id)
+
+    async def run(self) -> None:
+        """Fire schedules forever (run as a background task)."""
+        _engines.add(self)
+        try:
+            await self.load()
+            next_resync = time.monotonic() + self.resync_seconds
+            while True:
+                self._wakeup.clear()
+                now = datetime.now(UTC)
+                try:
+                    if time.monotonic() >= next_resync:
+                        next_resync = time.monotonic() + self.resync_seconds
+                        await self.resync()
+                    if self._dirty:
+                        dirty, self._dirty = self._dirty, set()
+                        await self.load(dirty)
+                    top = self.heap.peek()
+                    if top is not None and top[0] <= now:
+                        await self.fire(self.heap.pop_due(now), now)
+                        continue
+                except Exception:
+                    logger.exception("Schedule engine failed; reloading")
+                    await asyncio.sleep(_RETRY_SECONDS)
+                    self._dirty.update(self.plans)
+                    continue
+
+                timeout = next_resync - time.monotonic()
+                if top is not None:
+                    timeout = min(timeout, (top[0] - now).total_seconds())
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except TimeoutError:
+                    pass
+        finally:
+            _engines.discard(self)
+
+
+_PENDING_KEY = "schedule_engine_changes"
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_schedule_changes(session: Session, flush_context) -> None:
+    if session.info.get("schedule_engine") or not _engines:
+        return
+    changed = session.info.setdefault(_PENDING_KEY, set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Schedule):
+            changed.add(obj.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_engines(session: Session) -> None:
+    changed = session.info.pop(_PENDING_KEY, None)
+    if changed:
+        for engine in list(_engines):
+            engine.notify(changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
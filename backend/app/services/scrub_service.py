@@ -0,0 +1,385 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Integrity Scrubber
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+#
+# Re-reads completed backups and checks them against the sha256 and size
+# recorded at ingest. Compressed backups are decompressed and chunked ones
+# reassembled from the chunk store, so every layout is checked end to end.
+# Each backup's outcome goes to backups.integrity ("ok", "corrupt",
+# "missing") and verified_at.
+#
+# A run visits backups not verified within scrub_max_age_days, in id order,
+# batch by batch; stopping early (scrub_max_runtime_minutes, shutdown) loses
+# nothing, the next run picks up the rest. With the defaults the leader
+# starts a run every night and a multi-TB archive is covered within the
+# week.
+#
+# One run at a time: the nightly run (a leader duty) and manual runs both go
+# through start(), and a run holds the scrub_lock_id advisory lock, so a
+# manual run requested on another replica is skipped while one is going.
+#
+# Hashing runs in a process pool so a slow disk or a large file never
+# touches the event loop. To stay out of the way of live ingest the workers
+# run at a raised nice value, share scrub_bandwidth_bytes between them, and
+# drop what they read from the page cache.
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import suppress
+from datetime import UTC, datetime, timedelta
+from functools import lru_cache
+from pathlib import Path
+
+from sqlalchemy import bindparam, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import get_settings
+from app.database import AsyncSessionLocal
+from app.metrics import scrub_bytes_read, scrub_results
+from app.models.backup import Backup
+from app.schemas.backup import DeviceScrubStatus, ScrubProgress, ScrubStatus
+from app.services.chunk_store import CHUNKED, ChunkStore, read_manifest
+from app.services.compression import ZSTD, open_decompressor
+from app.services.leader_election import advisory_lock
+
+logger = logging.getLogger(__name__)
+
+OK = "ok"
+CORRUPT = "corrupt"
+MISSING = "missing"
+
+_READ_SIZE = 1024 * 1024
+
+# Per worker process, set up by _init_worker.
+_meter: "_Meter | None" = None
+
+
+class _Meter:
+    """Caps one process's read rate and counts the bytes it read."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.start = time.monotonic()
+        self.total = 0
+
+    def consume(self, n: int) -> None:
+        self.total += n
+        if self.rate > 0:
+            ahead = self.total / self.rate - (time.monotonic() - self.start)
+            if ahead > 0:
+                time.sleep(ahead)
+
+
+class _MeteredFile:
+    """Read-only file wrapper that throttles reads and skips the page cache."""
+
+    def __init__(self, path: str | Path):
+        self._fh = open(path, "rb")
+        self._dropped = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._fh.read(size)
+        _meter.consume(len(data))
+        position = self._fh.tell()
+        if hasattr(os, "posix_fadvise") and position - self._dropped >= _READ_SIZE:
+            os.posix_fadvise(self._fh.fileno(), 0, position, os.POSIX_FADV_DONTNEED)
+            self._dropped = position
+        return data
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self._fh.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._fh.tell()
+
+    def close(self) -> None:
+        self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _init_worker(rate: float, niceness: int) -> None:
+    global _meter
+    _meter = _Meter(rate)
+    if niceness:
+        os.nice(niceness)
+
+
+def _blocks(path: str | Path):
+    with _MeteredFile(path) as fh:
+        while block := fh.read(_READ_SIZE):
+            yield block
+
+
+def _plain_blocks(path: str, layout: str | None, compression: str | None, backup_path: str):
+    if layout == CHUNKED:
+        store = ChunkStore(backup_path)
+        for digest, _ in read_manifest(path):
+            yield from _blocks(store.path_for(digest))
+    elif compression == ZSTD:
+        with _MeteredFile(path) as fh:
+            reader = open_decompressor(fh)
+            while block := reader.read(_READ_SIZE):
+                yield block
+    else:
+        yield from _blocks(path)
+
+
+def verify_backup(
+    path: str,
+    layout: str | None,
+    compression: str | None,
+    checksum: str,
+    size: int,
+    backup_path: str,
+) -> tuple[str, int]:
+    """Check one stored backup (runs in a worker process); returns (result, bytes read)."""
+    read_before = _meter.total
+    digest = hashlib.sha256()
+    plain_size = 0
+    try:
+        for block in _plain_blocks(path, layout, compression, backup_path):
+            digest.update(block)
+            plain_size += len(block)
+    except FileNotFoundError:
+        return MISSING, _meter.total - read_before
+    except Exception:
+        # Undecodable zstd frames, mangled manifests and the like.
+        return CORRUPT, _meter.total - read_before
+    matches = plain_size == size and digest.hexdigest() == checksum
+    return (OK if matches else CORRUPT), _meter.total - read_before
+
+
+class Scrubber:
+    """Verifies stored backups in the background and tracks progress."""
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession] = AsyncSessionLocal,
+        workers: int | None = None,
+        bandwidth: int | None = None,
+        batch_size: int | None = None,
+    ):
+        settings = get_settings()
+        self.session_factory = session_factory
+        self.workers = workers or settings.scrub_workers
+        self.bandwidth = settings.scrub_bandwidth_bytes if bandwidth is None else bandwidth
+        self.batch_size = batch_size or settings.scrub_batch_size
+        self.progress: ScrubProgress | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, device_ids: list[int] | None = None) -> ScrubProgress | None:
+        """Start a run in the background unless one is already going."""
+        if not self.running:
+            self._task = asyncio.create_task(self.run(device_ids))
+            self.progress = None
+        return self.progress
+
+    async def stop(self) -> None:
+        """Cancel a run started with ``start``."""
+        if self.running:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+
+    async def run(
+        self,
+        device_ids: list[int] | None = None,
+        now: datetime | None = None,
+        max_age: timedelta | None = None,
+        deadline: float | None = None,
+    ) -> ScrubProgress | None:
+        """Verify every due backup (or those of ``device_ids``) until done or ``deadline``.
+
+        Returns None without scrubbing if another process is running a scrub.
+        """
+        target = self.session_factory.kw["bind"]
+        async with advisory_lock(target, get_settings().scrub_lock_id) as acquired:
+            if not acquired:
+                logger.info("Another process is scrubbing; skipping this run")
+                return None
+            return await self._scrub(device_ids, now, max_age, deadline)
+
+    async def _scrub(
+        self,
+        device_ids: list[int] | None,
+        now: datetime | None,
+        max_age: timedelta | None,
+        deadline: float | None,
+    ) -> ScrubProgress:
+        settings = get_settings()
+        now = now or datetime.now(UTC)
+        if max_age is None:
+            max_age = timedelta(days=settings.scrub_max_age_days)
+        if deadline is None:
+            deadline = time.monotonic() + settings.scrub_max_runtime_minutes * 60
+        due = [
+            Backup.status == "completed",
+            Backup.checksum.is_not(None),
+            or_(Backup.verified_at.is_(None), Backup.verified_at < now - max_age),
+        ]
+        if device_ids is not None:
+            due.append(Backup.device_id.in_(device_ids))
+
+        async with self.session_factory() as db:
+            total = (await db.execute(select(func.count()).where(*due))).scalar()
+        progress = self.progress = ScrubProgress(running=True, started_at=now, total=total)
+
+        pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.bandwidth / self.workers, settings.scrub_niceness),
+        )
+        try:
+            after = 0
+            while time.monotonic() < deadline:
+                async with self.session_factory() as db:
+                    rows = (
+                        await db.execute(
+                            select(
+                                Backup.id,
+                                Backup.file_path,
+                                Backup.layout,
+                                Backup.compression,
+                                Backup.checksum,
+                                Backup.file_size,
+                            )
+                            .where(*due, Backup.id > after)
+                            .order_by(Backup.id)
+                            .limit(self.batch_size)
+                        )
+                    ).all()
+                if not rows:
+                    break
+                after = rows[-1].id
+                results = await self._verify_batch(pool, rows, settings.backup_path, progress)
+                await self._record(results)
+                if len(rows) < self.batch_size:
+                    break
+        finally:
+            # Workers finish the file in hand and exit; queued files are dropped.
+            pool.shutdown(wait=False, cancel_futures=True)
+            progress.running = False
+            progress.finished_at = datetime.now(UTC)
+
+        if progress.corrupt or progress.missing:
+            logger.warning(
+                "Scrub found %d corrupt and %d missing backup(s)",
+                progress.corrupt,
+                progress.missing,
+            )
+        return progress
+
+    async def _verify_batch(self, pool, rows, backup_path: str, progress: ScrubProgress):
+        loop = asyncio.get_running_loop()
+
+        async def verify(row):
+            result, read = await loop.run_in_executor(
+                pool,
+                verify_backup,
+                row.file_path,
+                row.layout,
+                row.compression,
+                row.checksum,
+                row.file_size,
+                backup_path,
+            )
+            progress.checked += 1
+            progress.bytes_read += read
+            if result == CORRUPT:
+                progress.corrupt += 1
+            elif result == MISSING:
+                progress.missing += 1
+            scrub_bytes_read.inc(read)
+            scrub_results.labels(result).inc()
+            return row.id, result, datetime.now(UTC)
+
+        return await asyncio.gather(*(verify(row) for row in rows))
+
+    async def _record(self, results) -> None:
+        # Core executemany: integrity isn't tracked by the storage counters.
+        table = Backup.__table__
+        async with self.session_factory() as db:
+            await db.execute(
+                update(table)
+                .where(table.c.id == bindparam("b_id"))
+                .values(integrity=bindparam("b_integrity"), verified_at=bindparam("b_at")),
+                [{"b_id": i, "b_integrity": r, "b_at": at} for i, r, at in results],
+            )
+            await db.commit()
+
+    async def run_forever(self) -> None:
+        """Start a run at every scrub_cron fire time (run as a background task)."""
+        from app.services.schedule_engine import compile_cron
+
+        settings = get_settings()
+        try:
+            trigger = compile_cron(settings.scrub_cron, settings.scheduler_timezone)
+        except ValueError:
+            # Don't take the other leader duties down with a bad setting.
+            logger.exception("Invalid scrub_cron %r; scrubbing disabled", settings.scrub_cron)
+            return
+        while True:
+            now = datetime.now(UTC)
+            fire_at = trigger.get_next_fire_time(None, now)
+            await asyncio.sleep(max((fire_at - now).total_seconds(), 0))
+            try:
+                # Through start(), so a manual run already going is joined, not doubled.
+                self.start()
+                await self._task
+            except Exception:
+                logger.exception("Integrity scrub failed")
+
+    @staticmethod
+    async def device_status(db: AsyncSession) -> list[DeviceScrubStatus]:
+        """Per-device last scrub time and outcome counts over completed backups."""
+        verified = func.count(Backup.verified_at)
+        rows = await db.execute(
+            select(
+                Backup.device_id,
+                func.max(Backup.verified_at),
+                verified,
+                func.count() - verified,
+                func.count().filter(Backup.integrity == CORRUPT),
+                func.count().filter(Backup.integrity == MISSING),
+            )
+            .where(Backup.status == "completed")
+            .group_by(Backup.device_id)
+            .order_by(Backup.device_id)
+        )
+        return [
+            DeviceScrubStatus(
+                device_id=device_id,
+                last_verified_at=last,
+                verified=n_verified,
+                unverified=n_unverified,
+                corrupt=n_corrupt,
+                missing=n_missing,
+            )
+            for device_id, last, n_verified, n_unverified, n_corrupt, n_missing in rows.all()
+        ]
+
+    async def status(self, db: AsyncSession) -> ScrubStatus:
+        """Current progress plus the per-device summary."""
+        return ScrubStatus(progress=self.progress, devices=await self.device_status(db))
+
+
+@lru_cache
+def get_scrubber() -> Scrubber:
+    """Process-wide scrubber (shared by the leader's schedule and the API)."""
+    return Scrubber()
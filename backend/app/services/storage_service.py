@@ -0,0 +1,172 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Storage Service
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import asyncio
+import logging
+import os
+import time
+from typing import NamedTuple
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import get_settings
+from app.database import AsyncSessionLocal
+from app.models.backup import Backup
+from app.models.device import Device
+from app.models.storage_counter import DeviceStorageCounter
+from app.schemas.settings import DeviceStorageStats, StorageStats
+
+logger = logging.getLogger(__name__)
+
+
+class DiskUsage(NamedTuple):
+    total: int
+    used: int
+    free: int
+
+
+# path -> (expires_at, usage)
+_disk_usage_cache: dict[str, tuple[float, DiskUsage]] = {}
+
+
+class StorageService:
+    """Service for backup storage statistics."""
+
+    @staticmethod
+    async def disk_usage(path: str) -> DiskUsage:
+        """statvfs for the backup volume, cached for storage_statvfs_cache_seconds."""
+        now = time.monotonic()
+        cached = _disk_usage_cache.get(path)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+
+        st = await asyncio.to_thread(os.statvfs, path)
+        total = st.f_blocks * st.f_frsize
+        free = st.f_bavail * st.f_frsize
+        usage = DiskUsage(total=total, used=total - st.f_bfree * st.f_frsize, free=free)
+        _disk_usage_cache[path] = (now + get_settings().storage_statvfs_cache_seconds, usage)
+        return usage
+
+    @staticmethod
+    async def get_stats(db: AsyncSession) -> StorageStats:
+        """Storage stats from per-device counters; one small query regardless of archive size."""
+        backup_path = get_settings().backup_path
+        usage = await StorageService.disk_usage(backup_path)
+
+        rows = await db.execute(
+            select(
+                DeviceStorageCounter.device_id,
+                Device.name,
+                DeviceStorageCounter.backup_count,
+                DeviceStorageCounter.total_size,
+            )
+            .join(Device, Device.id == DeviceStorageCounter.device_id)
+            .order_by(Device.name)
+        )
+        by_device = [
+            DeviceStorageStats(
+                device_id=device_id,
+                device_name=name,
+                backup_count=backup_count,
+                total_size=total_size,
+            )
+            for device_id, name, backup_count, total_size in rows.all()
+        ]
+
+        return StorageStats(
+            backup_path=backup_path,
+            total_space=usage.total,
+            used_space=usage.used,
+            free_space=usage.free,
+            usage_percent=round(usage.used / usage.total * 100, 2) if usage.total else 0.0,
+            total_backups=sum(d.backup_count for d in by_device),
+            by_device=by_device,
+        )
+
+    @staticmethod
+    async def reconcile(db: AsyncSession) -> int:
+        """Rewrite counters from the backups table; returns how many devices had drifted."""
+        # Lock the counters first: an ingest that commits while we aggregate
+        # then applies its delta on top of our corrected value, not before it.
+        counters = {
+            counter.device_id: counter
+            for counter in (
+                await db.execute(
+                    select(DeviceStorageCounter)
+                    .with_for_update()
+                    .execution_options(populate_existing=True)
+                )
+            ).scalars()
+        }
+        actual = {
+            device_id: (count, size)
+            for device_id, count, size in (
+                await db.execute(
+                    select(
+                        Backup.device_id,
+                        func.count(),
+                        func.coalesce(
+                            func.sum(func.coalesce(Backup.compressed_size, Backup.file_size)), 0
+                        ),
+                    )
+                    .where(Backup.status == "completed")
+                    .group_by(Backup.device_id)
+                )
+            ).all()
+        }
+
+        drifted = 0
+        missing = []
+        for device_id in actual.keys() | counters.keys():
+            count, size = actual.get(device_id, (0, 0))
+            counter = counters.get(device_id)
+            if counter is None:
+                missing.append({"device_id": device_id, "backup_count": count, "total_size": size})
+                drifted += 1
+            elif (counter.backup_count, counter.total_size) != (count, size):
+                counter.backup_count = count
+                counter.total_size = size
+                drifted += 1
+
+        if missing:
+            # An ingest's hook may create the row after our SELECT; upsert as it
+            # does rather than fail the pass. Any delta lost that way is drift
+            # the next pass repairs, with the row then locked.
+            table = DeviceStorageCounter.__table__
+            insert = pg_insert if db.bind.dialect.name == "postgresql" else sqlite_insert
+            stmt = insert(table)
+            await db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=["device_id"],
+                    set_={
+                        "backup_count": stmt.excluded.backup_count,
+                        "total_size": stmt.excluded.total_size,
+                        "updated_at": func.now(),
+                    },
+                ),
+                missing,
+            )
+
+        await db.commit()
+        return drifted
+
+    @staticmethod
+    async def run_reconciler(
+        session_factory: async_sessionmaker[AsyncSession] = AsyncSessionLocal,
+        interval_seconds: float | None = None,
+    ) -> None:
+        """Reconcile counters forever at a fixed interval (run as a background task)."""
+        interval = interval_seconds or get_settings().storage_reconcile_interval_minutes * 60
+        while True:
+            try:
+                async with session_factory() as db:
+                    drifted = await StorageService.reconcile(db)
+                if drifted:
+                    logger.warning("Storage counters repaired for %d device(s)", drifted)
+            except Exception:
+                logger.exception("Storage counter reconcile failed")
+            await asyncio.sleep(interval)
@@ -0,0 +1,115 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - UniFi API Client
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+from collections.abc import AsyncIterator
+
+import aiohttp
+
+from app.config import get_settings
+from app.metrics import controller_request_duration
+
+# Device types that are the console itself rather than an adopted AP/switch.
+_GATEWAY_TYPES = ("udm", "ugw", "uxg")
+
+
+class UniFiError(Exception):
+    """Raised when the UniFi controller returns an error or unexpected payload."""
+
+
+class UniFiClient:
+    """Async client for the UniFi Network controller API (API key auth)."""
+
+    def __init__(
+        self,
+        host: str,
+        api_key: str,
+        site: str | None = None,
+        api_prefix: str = "/proxy/network",
+    ):
+        settings = get_settings()
+        self.base_url = host.rstrip("/") if "://" in host else f"https://{host}"
+        self.site = site or settings.unifi_site
+        self.api_prefix = api_prefix
+        self._api_key = api_key
+        self._verify_ssl = settings.unifi_verify_ssl
+        self._timeout = settings.unifi_timeout_seconds
+        self._session: aiohttp.ClientSession | None = None
+
+    async def __aenter__(self) -> "UniFiClient":
+        # No total timeout: backup downloads can legitimately take minutes.
+        # Connect and per-read timeouts still catch a stalled controller.
+        self._session = aiohttp.ClientSession(
+            base_url=self.base_url,
+            headers={"X-API-KEY": self._api_key, "Accept": "application/json"},
+            connector=aiohttp.TCPConnector(ssl=None if self._verify_ssl else False),
+            timeout=aiohttp.ClientTimeout(
+                total=None, sock_connect=self._timeout, sock_read=self._timeout
+            ),
+        )
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            raise RuntimeError("UniFiClient must be used as an async context manager")
+        return self._session
+
+    def _url(self, path: str) -> str:
+        """Prefix a controller path with the UniFi OS network application proxy."""
+        return f"{self.api_prefix}{path}"
+
+    async def create_backup(self) -> str:
+        """Ask the controller to generate a backup and return its download URL."""
+        with controller_request_duration.labels("create_backup").time():
+            async with self.session.post(
+                self._url(f"/api/s/{self.site}/cmd/backup"), json={"cmd": "backup"}
+            ) as resp:
+                if resp.status != 200:
+                    raise UniFiError(f"Backup request failed with HTTP {resp.status}")
+                payload = await resp.json()
+
+        try:
+            return payload["data"][0]["url"]
+        except (KeyError, IndexError, TypeError) as e:
+            raise UniFiError("Controller response did not include a backup URL") from e
+
+    async def get_device_status(self) -> dict:
+        """Uptime, firmware, model and MAC of the console behind ``host``.
+
+        The controller lists every adopted device; the console is the one
+        whose IP is the host we connect to, otherwise the first gateway.
+        """
+        with controller_request_duration.labels("device_status").time():
+            async with self.session.get(self._url(f"/api/s/{self.site}/stat/device")) as resp:
+                if resp.status != 200:
+                    raise UniFiError(f"Device status request failed with HTTP {resp.status}")
+                payload = await resp.json()
+
+        devices = payload.get("data") if isinstance(payload, dict) else None
+        if not devices:
+            raise UniFiError("Controller response did not include any devices")
+        host = self.base_url.split("://", 1)[1].split(":", 1)[0]
+        console = next(
+            (d for d in devices if d.get("ip") == host),
+            next((d for d in devices if d.get("type") in _GATEWAY_TYPES), devices[0]),
+        )
+        return {
+            "uptime": console.get("uptime"),
+            "firmware_version": console.get("version"),
+            "model": console.get("model"),
+            "mac_address": console.get("mac"),
+        }
+
+    async def stream_backup(self, url: str, chunk_size: int) -> AsyncIterator[bytes]:
+        """Stream a generated backup file in chunks of at most ``chunk_size`` bytes."""
+        async with self.session.get(self._url(url)) as resp:
+            if resp.status != 200:
+                raise UniFiError(f"Backup download failed with HTTP {resp.status}")
+            async for chunk in resp.content.iter_chunked(chunk_size):
+                yield chunk
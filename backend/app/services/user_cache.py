@@ -0,0 +1,103 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Authenticated User Cache
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+#
+# Short-lived, bounded, in-process cache used by get_current_user so that
+# authenticated requests don't decode the JWT and hit Postgres every time.
+#
+# Entries for a user are dropped when a transaction that changed their
+# password, active flag or admin flag commits. Other worker processes keep
+# their copy until it expires, which bounds staleness to the TTL.
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import time
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from app.config import get_settings
+from app.metrics import UserCacheCollector, registry
+from app.models.user import User
+from app.services.ttl_cache import TTLCache
+
+# Changing any of these must take effect on the next request.
+SECURITY_ATTRIBUTES = ("password_hash", "is_active", "is_admin")
+
+
+class UserCache:
+    """Caches verified token payloads and detached user snapshots."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.tokens = TTLCache(max_entries, ttl_seconds)
+        self.users = TTLCache(max_entries, ttl_seconds)
+
+    def get_payload(self, token: str) -> dict | None:
+        return self.tokens.get(token)
+
+    def put_payload(self, token: str, payload: dict) -> None:
+        """Cache a decoded payload, never beyond the token's own expiry."""
+        exp = payload.get("exp")
+        remaining = exp - time.time() if isinstance(exp, int | float) else None
+        self.tokens.put(token, payload, remaining)
+
+    def get_user(self, user_id: int) -> User | None:
+        return self.users.get(user_id)
+
+    def put_user(self, user: User) -> None:
+        """Store a detached copy of a loaded user."""
+        columns = {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+        snapshot = User(**columns)
+        make_transient_to_detached(snapshot)
+        self.users.put(user.id, snapshot)
+
+    def invalidate_user(self, user_id: int) -> None:
+        self.users.pop(user_id)
+
+    def clear(self) -> None:
+        self.tokens.clear()
+        self.users.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "token_hits": self.tokens.hits,
+            "token_misses": self.tokens.misses,
+            "token_entries": len(self.tokens),
+            "user_hits": self.users.hits,
+            "user_misses": self.users.misses,
+            "user_entries": len(self.users),
+        }
+
+
+_settings = get_settings()
+user_cache = UserCache(
+    max_entries=_settings.auth_cache_max_entries,
+    ttl_seconds=_settings.auth_cache_ttl_seconds,
+)
+if _settings.metrics_enabled:
+    registry.register(UserCacheCollector(user_cache))
+
+_PENDING_KEY = "user_cache_invalidate"
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_user_changes(session: Session, flush_context) -> None:
+    changed = session.info.setdefault(_PENDING_KEY, set())
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            changed.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            state = inspect(obj)
+            if any(state.attrs[key].history.has_changes() for key in SECURITY_ATTRIBUTES):
+                changed.add(obj.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session) -> None:
+    for user_id in session.info.pop(_PENDING_KEY, ()):
+        user_cache.invalidate_user(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
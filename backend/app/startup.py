@@ -0,0 +1,199 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Startup Routine
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+#
+# Everything the API needs before serving, run once inside the application
+# process: wait for the database, create tables only when the models have
+# changed since the last boot, and bootstrap the admin user.
+#
+# Every uvicorn worker and replica runs this at the same time, so the schema
+# and admin steps run under a blocking advisory lock (startup_lock_id): the
+# first process does the work, the others wait and then find it done.
+#
+# The schema version is a fingerprint of the model metadata stored in the
+# settings table, so any model change triggers create_all on the next boot
+# and unchanged restarts issue a single SELECT instead of reflecting every
+# table.
+#
+# create_all only creates missing tables. When the fingerprint changes, the
+# existing tables are also compared with the models: missing columns are
+# added (ADD COLUMN IF NOT EXISTS on Postgres) and missing indexes created.
+# A missing NOT NULL column without a server default cannot be added to a
+# table that has rows, so startup refuses and names it instead.
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+
+from sqlalchemy import Column, Connection, inspect, select, text
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy.schema import CreateColumn
+
+from app import models  # noqa: F401  (registers every table on Base.metadata)
+from app.config import get_settings
+from app.database import AsyncSessionLocal, Base, engine
+from app.init_admin import ensure_admin
+from app.models.settings import SystemSettings
+from app.services.leader_election import advisory_lock
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION_KEY = "schema_version"
+
+
+def schema_fingerprint() -> str:
+    """Stable hash of every table, column, index and foreign key in the models."""
+    tables = []
+    for table in sorted(Base.metadata.tables.values(), key=lambda t: t.name):
+        tables.append(
+            [
+                table.name,
+                [[col.name, str(col.type), col.nullable, col.primary_key] for col in table.columns],
+                sorted(
+                    [idx.name, [col.name for col in idx.columns], bool(idx.unique)]
+                    for idx in table.indexes
+                ),
+                sorted(fk.target_fullname for fk in table.foreign_keys),
+            ]
+        )
+    return hashlib.sha256(json.dumps(tables).encode()).hexdigest()[:16]
+
+
+async def wait_for_db(
+    target: AsyncEngine = engine,
+    timeout_seconds: float | None = None,
+    initial_delay: float = 0.05,
+    max_delay: float = 2.0,
+) -> None:
+    """Retry SELECT 1 with exponential backoff until the database answers."""
+    timeout_seconds = timeout_seconds or get_settings().db_startup_timeout_seconds
+    deadline = time.monotonic() + timeout_seconds
+    delay = initial_delay
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            async with target.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+            if attempt > 1:
+                logger.info("Database ready after %d attempts", attempt)
+            return
+        except (DBAPIError, OSError) as e:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(
+                    f"Database not reachable after {timeout_seconds:.0f}s: {e}"
+                ) from e
+            logger.info("Database not ready (attempt %d), retrying in %.2fs", attempt, delay)
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, max_delay)
+
+
+async def _stored_schema_version(target: AsyncEngine) -> str | None:
+    try:
+        async with target.connect() as conn:
+            result = await conn.execute(
+                select(SystemSettings.value).where(SystemSettings.key == SCHEMA_VERSION_KEY)
+            )
+            value = result.scalar_one_or_none()
+    except DBAPIError:
+        # Settings table doesn't exist yet: fresh database.
+        return None
+    return json.loads(value) if value is not None else None
+
+
+def _missing_columns(conn: Connection) -> list[Column]:
+    """Model columns absent from the tables that exist in the database."""
+    inspector = inspect(conn)
+    existing = set(inspector.get_table_names())
+    missing = []
+    for table in Base.metadata.sorted_tables:
+        if table.name in existing:
+            present = {column["name"] for column in inspector.get_columns(table.name)}
+            missing += [column for column in table.columns if column.name not in present]
+    return missing
+
+
+def _upgrade_tables(conn: Connection) -> None:
+    Base.metadata.create_all(conn)
+
+    missing = _missing_columns(conn)
+    required = [c for c in missing if not c.nullable and c.server_default is None]
+    if required:
+        names = ", ".join(f"{c.table.name}.{c.name}" for c in required)
+        raise RuntimeError(
+            f"Database is missing NOT NULL column(s) without a default: {names}; "
+            "add them manually before starting"
+        )
+    if_not_exists = "IF NOT EXISTS " if conn.dialect.name == "postgresql" else ""
+    preparer = conn.dialect.identifier_preparer
+    for column in missing:
+        definition = CreateColumn(column).compile(dialect=conn.dialect)
+        conn.execute(
+            text(
+                f"ALTER TABLE {preparer.format_table(column.table)} "
+                f"ADD COLUMN {if_not_exists}{definition}"
+            )
+        )
+        logger.info("Added column %s.%s", column.table.name, column.name)
+
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+async def ensure_schema(target: AsyncEngine = engine) -> bool:
+    """Create or extend tables if the models changed since the last boot; True if DDL ran."""
+    version = schema_fingerprint()
+    if await _stored_schema_version(target) == version:
+        return False
+
+    async with target.begin() as conn:
+        await conn.run_sync(_upgrade_tables)
+
+    session_factory = async_sessionmaker(target, class_=AsyncSession, expire_on_commit=False)
+    async with session_factory() as db:
+        row = (
+            await db.execute(select(SystemSettings).where(SystemSettings.key == SCHEMA_VERSION_KEY))
+        ).scalar_one_or_none()
+        if row is None:
+            db.add(SystemSettings(key=SCHEMA_VERSION_KEY, value=json.dumps(version)))
+        else:
+            row.value = json.dumps(version)
+        await db.commit()
+    logger.info("Database schema updated to version %s", version)
+    return True
+
+
+async def bootstrap_admin(
+    session_factory: async_sessionmaker[AsyncSession] = AsyncSessionLocal,
+) -> None:
+    """Create the initial admin from ADMIN_* settings; never fails startup."""
+    settings = get_settings()
+    if not settings.admin_password:
+        return
+    try:
+        async with session_factory() as db:
+            message = await ensure_admin(
+                db, settings.admin_username, settings.admin_email, settings.admin_password
+            )
+        logger.info(message)
+    except IntegrityError:
+        # Another process created it between our check and insert.
+        logger.info("Admin user already exists")
+    except ValueError as e:
+        logger.error("Admin bootstrap skipped: %s", e)
+
+
+async def startup(target: AsyncEngine = engine) -> None:
+    """Prepare the database before the API starts serving."""
+    start = time.monotonic()
+    await wait_for_db(target)
+    async with advisory_lock(target, get_settings().startup_lock_id, wait=True):
+        await ensure_schema(target)
+        await bootstrap_admin()
+    logger.info("Database ready in %.2fs", time.monotonic() - start)
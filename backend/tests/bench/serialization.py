@@ -0,0 +1,128 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - List Serialization Benchmark
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+#
+# Compares the two ways of producing a backup list response body:
+#
+#   orm:  select(Backup) -> ORM instances -> BackupList model -> JSON
+#   rows: Core rows -> dicts checked by backup_rows -> orjson
+#
+# against a throwaway in-memory SQLite database (needs aiosqlite).
+# Run from backend/ with: python -m tests.bench.serialization [--rows N] [--repeat R]
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import argparse
+import asyncio
+import time
+from datetime import UTC, datetime, timedelta
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import joinedload
+
+from app.database import Base
+from app.models import Backup, Device
+from app.responses import ORJSONResponse
+from app.schemas.backup import BackupList, backup_rows
+from app.services.backup_query_service import BackupQueryService
+
+
+async def _seed(session_factory: async_sessionmaker[AsyncSession], rows: int) -> None:
+    now = datetime.now(UTC)
+    async with session_factory() as db:
+        await db.execute(
+            insert(Device),
+            [
+                {
+                    "id": i + 1,
+                    "name": f"site-{i}",
+                    "ip_address": f"10.0.0.{i}",
+                    "api_key_encrypted": "k",
+                    "device_type": "UDM-Pro",
+                }
+                for i in range(10)
+            ],
+        )
+        await db.execute(
+            insert(Backup),
+            [
+                {
+                    "device_id": i % 10 + 1,
+                    "filename": f"backup_{i}.unf",
+                    "file_path": f"/backups/backup_{i}.unf",
+                    "file_size": 40_000_000 + i,
+                    "checksum": f"{i:064x}",
+                    "backup_type": "scheduled",
+                    "status": "completed",
+                    "started_at": now - timedelta(minutes=i),
+                    "completed_at": now - timedelta(minutes=i),
+                    "created_at": now - timedelta(minutes=i),
+                }
+                for i in range(rows)
+            ],
+        )
+        await db.commit()
+
+
+async def _orm_body(db: AsyncSession, rows: int) -> bytes:
+    items = (
+        await db.execute(
+            select(Backup)
+            .options(joinedload(Backup.device).load_only(Device.name))
+            .order_by(Backup.created_at.desc(), Backup.id.desc())
+            .limit(rows)
+        )
+    ).scalars()
+    body = BackupList(items=list(items), page_size=rows)
+    return body.model_dump_json().encode()
+
+
+async def _rows_body(db: AsyncSession, rows: int) -> bytes:
+    items, next_cursor = await BackupQueryService.list_page_rows(db, rows)
+    content = {
+        "items": backup_rows.validate_python(items),
+        "page_size": rows,
+        "next_cursor": next_cursor,
+        "total": None,
+    }
+    return ORJSONResponse(content).body
+
+
+async def run_benchmark(rows: int = 5000, repeat: int = 5) -> dict[str, float]:
+    """Rows per second for each path, best of ``repeat`` runs."""
+    engine = create_async_engine("sqlite+aiosqlite://")
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        await _seed(session_factory, rows)
+
+        rates = {}
+        for name, body in (("orm", _orm_body), ("rows", _rows_body)):
+            best = float("inf")
+            for _ in range(repeat):
+                async with session_factory() as db:
+                    start = time.perf_counter()
+                    await body(db, rows)
+                    elapsed = time.perf_counter() - start
+                best = min(best, elapsed)
+            rates[name] = rows / best
+        return rates
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark backup list serialization.")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rates = asyncio.run(run_benchmark(args.rows, args.repeat))
+    for name, rate in rates.items():
+        print(f"  {name:5} {rate:12,.0f} rows/s")
+    print(f"  speedup {rates['rows'] / rates['orm']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,15 +3,20 @@
 # -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
 
 import os
+from contextlib import contextmanager
 
 import pytest
 from httpx import ASGITransport, AsyncClient
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
 from app.database import Base, get_db
 from app.main import app
+from app.models.device import Device
 from app.models.user import User
 from app.services.auth_service import AuthService
+from app.services.crypto_service import crypto_service
+from app.services.user_cache import user_cache
 
 
 # Use DATABASE_URL from environment (set in CI with PostgreSQL)
@@ -21,6 +26,14 @@ TEST_DATABASE_URL = os.environ.get(
 )
 
 
+@pytest.fixture(autouse=True)
+def clear_user_cache():
+    """Start every test with an empty authenticated-user cache."""
+    user_cache.clear()
+    yield
+    user_cache.clear()
+
+
 @pytest.fixture
 async def test_engine():
     """Create a test database engine using PostgreSQL."""
@@ -54,6 +67,43 @@ async def test_db(test_engine):
         yield session
 
 
+@pytest.fixture
+def session_factory(test_engine):
+    """Session factory bound to the test engine, for services that open their own sessions."""
+    return async_sessionmaker(
+        test_engine,
+        class_=AsyncSession,
+        expire_on_commit=False,
+    )
+
+
+@pytest.fixture
+def assert_queries(test_engine):
+    """Context manager asserting how many SQL statements a block runs.
+
+    ``with assert_queries(1) as statements:`` fails after the block unless
+    exactly one statement reached the database; the list holds their SQL.
+    """
+
+    @contextmanager
+    def check(expected: int):
+        statements: list[str] = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(test_engine.sync_engine, "before_cursor_execute", record)
+        try:
+            yield statements
+        finally:
+            event.remove(test_engine.sync_engine, "before_cursor_execute", record)
+        assert len(statements) == expected, (
+            f"expected {expected} queries, got {len(statements)}:\n" + "\n".join(statements)
+        )
+
+    return check
+
+
 @pytest.fixture
 async def async_client(test_engine):
     """Create an async test client with test database."""
@@ -108,6 +158,22 @@ async def test_admin(test_db):
     return admin
 
 
+@pytest.fixture
+async def test_device(test_db):
+    """Create a test UniFi device."""
+    device = Device(
+        name="Test UDM",
+        ip_address="192.168.1.1",
+        api_key_encrypted=crypto_service.encrypt("test-api-key"),
+        device_type="UDM-Pro",
+        is_active=True,
+    )
+    test_db.add(device)
+    await test_db.commit()
+    await test_db.refresh(device)
+    return device
+
+
 @pytest.fixture
 def auth_headers(test_user):
     """Get auth headers for test user."""
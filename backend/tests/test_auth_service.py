@@ -5,8 +5,10 @@
 from datetime import UTC, datetime, timedelta
 
 import pytest
+from passlib.hash import bcrypt
 
-from app.services.auth_service import AuthService
+from app.models.user import User
+from app.services.auth_service import AuthService, get_pwd_context, settings
 
 
 class TestPasswordHashing:
@@ -141,3 +143,62 @@ class TestJWTTokens:
         refresh_token = AuthService.create_refresh_token(data)
 
         assert access_token != refresh_token
+
+
+class TestAsyncPasswordHashing:
+    """Tests for thread-pool password hashing and cost management."""
+
+    @pytest.fixture
+    def restore_bcrypt_rounds(self):
+        """Undo calibration changes to the shared CryptContext."""
+        yield
+        rounds = settings.bcrypt_rounds
+        get_pwd_context().update(bcrypt__default_rounds=rounds, bcrypt__min_rounds=rounds)
+
+    @pytest.mark.asyncio
+    async def test_async_hash_and_verify(self):
+        """Async variants should round-trip like the sync ones."""
+        hashed = await AuthService.hash_password_async("testpassword123")
+
+        assert await AuthService.verify_password_async("testpassword123", hashed) is True
+        assert await AuthService.verify_password_async("wrong", hashed) is False
+        assert AuthService.verify_password("testpassword123", hashed) is True
+
+    def test_calibrate_applies_rounds(self, restore_bcrypt_rounds):
+        """Calibration should set the cost used for new hashes."""
+        rounds = AuthService.calibrate_bcrypt(target_ms=0.001, min_rounds=4)
+
+        assert rounds == 4
+        assert AuthService.hash_password("pw").startswith("$2b$04$")
+
+    def test_calibrate_respects_max_rounds(self, restore_bcrypt_rounds):
+        """Calibration never exceeds max_rounds."""
+        rounds = AuthService.calibrate_bcrypt(target_ms=10_000_000, min_rounds=4, max_rounds=6)
+
+        assert rounds == 6
+
+    @pytest.mark.asyncio
+    async def test_outdated_hash_upgraded_on_login(self, test_db):
+        """A successful login rehashes a password stored with a lower cost."""
+        user = User(
+            username="legacy",
+            email="legacy@example.com",
+            password_hash=bcrypt.using(rounds=4).hash("legacypassword"),
+        )
+        test_db.add(user)
+        await test_db.commit()
+
+        authenticated = await AuthService.authenticate_user(test_db, "legacy", "legacypassword")
+
+        assert authenticated is not None
+        assert authenticated.password_hash.startswith(f"$2b${settings.bcrypt_rounds:02d}$")
+        assert AuthService.verify_password("legacypassword", authenticated.password_hash)
+
+    @pytest.mark.asyncio
+    async def test_current_hash_not_rewritten(self, test_db, test_user):
+        """Hashes already at the current cost are left alone."""
+        original = test_user.password_hash
+
+        await AuthService.authenticate_user(test_db, "testuser", "testpassword123")
+
+        assert test_user.password_hash == original
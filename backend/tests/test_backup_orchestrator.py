@@ -0,0 +1,200 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Backup Orchestrator Tests
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import asyncio
+from collections import Counter
+
+import pytest
+from sqlalchemy import select
+
+from app.models.backup import Backup
+from app.models.device import Device
+from app.services.backup_orchestrator import BackupOrchestrator
+from app.services.backup_service import BackupService
+from app.services.crypto_service import crypto_service
+
+
+async def _chunks(parts):
+    for part in parts:
+        yield part
+
+
+class FakeBackupService(BackupService):
+    """Backup service that fakes the controller and tracks concurrency."""
+
+    def __init__(self, backup_path, fail_hosts=(), delay=0.02):
+        super().__init__(backup_path=backup_path)
+        self.fail_hosts = set(fail_hosts)
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.host_in_flight = Counter()
+        self.max_host_in_flight = Counter()
+        self.api_keys = []
+
+    async def run_backup(self, db, device, backup, api_key=None):
+        host = device.ip_address
+        self.api_keys.append(api_key)
+        self.in_flight += 1
+        self.host_in_flight[host] += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        self.max_host_in_flight[host] = max(
+            self.max_host_in_flight[host], self.host_in_flight[host]
+        )
+        try:
+            await asyncio.sleep(self.delay)
+            if host in self.fail_hosts:
+                raise ConnectionError(f"{host} unreachable")
+            return await self.ingest(db, backup, _chunks([b"x" * 10]))
+        finally:
+            self.in_flight -= 1
+            self.host_in_flight[host] -= 1
+
+
+async def _add_devices(db, hosts, is_active=True):
+    devices = [
+        Device(
+            name=f"device-{i}",
+            ip_address=host,
+            api_key_encrypted=crypto_service.encrypt("key"),
+            device_type="UDM-Pro",
+            is_active=is_active,
+        )
+        for i, host in enumerate(hosts)
+    ]
+    db.add_all(devices)
+    await db.commit()
+    return devices
+
+
+class TestBackupOrchestrator:
+    """Tests for fleet-wide concurrent backups."""
+
+    @pytest.mark.asyncio
+    async def test_runs_all_active_devices(self, test_db, session_factory, tmp_path):
+        """Without an explicit device list, every active device is backed up."""
+        await _add_devices(test_db, ["10.0.0.1", "10.0.0.2", "10.0.0.3"])
+        await _add_devices(test_db, ["10.0.0.9"], is_active=False)
+        service = FakeBackupService(str(tmp_path))
+        orchestrator = BackupOrchestrator(session_factory, service)
+
+        summary = await orchestrator.run()
+
+        assert summary.total == 3
+        assert summary.completed == 3
+        assert summary.failed == 0
+        assert all(r.duration_seconds > 0 for r in summary.results)
+        rows = (await test_db.execute(select(Backup))).scalars().all()
+        assert {row.status for row in rows} == {"completed"}
+        assert all(row.started_at is not None for row in rows)
+
+    @pytest.mark.asyncio
+    async def test_respects_global_limit(self, test_db, session_factory, tmp_path):
+        """No more than max_concurrency backups run at once."""
+        devices = await _add_devices(test_db, [f"10.0.1.{i}" for i in range(8)])
+        service = FakeBackupService(str(tmp_path))
+        orchestrator = BackupOrchestrator(session_factory, service, max_concurrency=3)
+
+        await orchestrator.run(devices)
+
+        assert service.max_in_flight == 3
+
+    @pytest.mark.asyncio
+    async def test_respects_per_host_limit(self, test_db, session_factory, tmp_path):
+        """Devices sharing a controller host are backed up one at a time."""
+        devices = await _add_devices(test_db, ["10.0.2.1"] * 4 + ["10.0.2.2"] * 4)
+        service = FakeBackupService(str(tmp_path))
+        orchestrator = BackupOrchestrator(
+            session_factory, service, max_concurrency=8, max_per_host=1
+        )
+
+        await orchestrator.run(devices)
+
+        assert service.max_host_in_flight["10.0.2.1"] == 1
+        assert service.max_host_in_flight["10.0.2.2"] == 1
+        assert service.max_in_flight == 2
+
+    @pytest.mark.asyncio
+    async def test_single_backups_share_limits(self, test_db, session_factory, tmp_path):
+        """backup_one calls (one per queue job) share the per-host and global limits."""
+        devices = await _add_devices(test_db, ["10.0.6.1"] * 3 + ["10.0.6.2"] * 3)
+        service = FakeBackupService(str(tmp_path))
+        orchestrator = BackupOrchestrator(
+            session_factory, service, max_concurrency=8, max_per_host=1
+        )
+
+        results = await asyncio.gather(*(orchestrator.backup_one(d) for d in devices))
+
+        assert {r.status for r in results} == {"completed"}
+        assert service.max_host_in_flight["10.0.6.1"] == 1
+        assert service.max_in_flight == 2
+
+    @pytest.mark.asyncio
+    async def test_failures_are_recorded(self, test_db, session_factory, tmp_path):
+        """A failing device is reported without affecting the others."""
+        devices = await _add_devices(test_db, ["10.0.3.1", "10.0.3.2"])
+        service = FakeBackupService(str(tmp_path), fail_hosts={"10.0.3.2"})
+        orchestrator = BackupOrchestrator(session_factory, service)
+
+        summary = await orchestrator.run(devices, backup_type="manual")
+
+        assert summary.completed == 1
+        assert summary.failed == 1
+        failed = next(r for r in summary.results if r.status == "failed")
+        assert "unreachable" in failed.error_message
+        row = await test_db.get(Backup, failed.backup_id)
+        await test_db.refresh(row)
+        assert row.status == "failed"
+        assert row.backup_type == "manual"
+
+    @pytest.mark.asyncio
+    async def test_passes_decrypted_keys(self, test_db, session_factory, tmp_path):
+        """Keys are decrypted for the run; an undecryptable key fails only its device."""
+        devices = await _add_devices(test_db, ["10.0.4.1", "10.0.4.2"])
+        devices[1].api_key_encrypted = "not-a-fernet-token"
+        await test_db.commit()
+        service = FakeBackupService(str(tmp_path))
+        orchestrator = BackupOrchestrator(session_factory, service)
+
+        summary = await orchestrator.run(devices)
+
+        assert service.api_keys == ["key"]
+        failed = next(r for r in summary.results if r.status == "failed")
+        assert failed.device_id == devices[1].id
+        assert "Invalid or corrupted" in failed.error_message
+
+    @pytest.mark.asyncio
+    async def test_empty_run(self, session_factory, tmp_path):
+        """Running with no devices returns an empty summary."""
+        orchestrator = BackupOrchestrator(session_factory, FakeBackupService(str(tmp_path)))
+
+        summary = await orchestrator.run([])
+
+        assert summary.total == 0
+        assert summary.results == []
+
+    @pytest.mark.asyncio
+    async def test_unexpected_error_fails_only_its_device(
+        self, test_db, session_factory, tmp_path, monkeypatch
+    ):
+        """An error outside the backup service (e.g. a DB blip) still yields a summary."""
+        devices = await _add_devices(test_db, ["10.0.5.1", "10.0.5.2"])
+        orchestrator = BackupOrchestrator(session_factory, FakeBackupService(str(tmp_path)))
+        run_backup = orchestrator._run_backup
+
+        async def flaky(device_id, *args):
+            if device_id == devices[1].id:
+                raise ConnectionResetError("connection to database lost")
+            return await run_backup(device_id, *args)
+
+        monkeypatch.setattr(orchestrator, "_run_backup", flaky)
+
+        summary = await orchestrator.run(devices)
+
+        assert (summary.completed, summary.failed) == (1, 1)
+        failed = next(r for r in summary.results if r.status == "failed")
+        assert failed.error_message == "connection to database lost"
+        row = await test_db.get(Backup, failed.backup_id)
+        await test_db.refresh(row)
+        assert (row.status, row.error_message) == ("failed", "connection to database lost")
@@ -0,0 +1,152 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Backup Count Rollup Tests
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+from datetime import UTC, date, datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+from sqlalchemy import select
+
+from app.models.backup import Backup
+from app.models.backup_rollup import BackupCountBucket, bucket_for
+from app.models.device import Device
+from app.services.backup_query_service import BackupQueryService
+
+
+def _backup(device_id, created_at, status="completed"):
+    return Backup(
+        device_id=device_id,
+        filename="b.unf",
+        file_path="",
+        file_size=0,
+        backup_type="scheduled",
+        status=status,
+        created_at=created_at,
+    )
+
+
+async def _rollup(db):
+    rows = (await db.execute(select(BackupCountBucket))).scalars().all()
+    return {(r.device_id, bucket_for(r.bucket), r.status): r.count for r in rows}
+
+
+class TestBucketFor:
+    """Tests for rollup bucket calculation."""
+
+    def test_floors_to_quarter_hour(self):
+        """Timestamps are floored to their 15-minute UTC bucket."""
+        when = datetime(2024, 3, 1, 10, 44, 59, 999, tzinfo=UTC)
+        assert bucket_for(when) == datetime(2024, 3, 1, 10, 30, tzinfo=UTC)
+
+    def test_converts_to_utc(self):
+        """Aware timestamps in other zones land in the matching UTC bucket."""
+        when = datetime(2024, 3, 1, 5, 50, tzinfo=ZoneInfo("America/New_York"))
+        assert bucket_for(when) == datetime(2024, 3, 1, 10, 45, tzinfo=UTC)
+
+
+class TestRollupMaintenance:
+    """Tests that the rollup follows Backup inserts, updates and deletes."""
+
+    @pytest.mark.asyncio
+    async def test_insert_increments(self, test_db, test_device: Device):
+        """Inserting backups adds to their bucket."""
+        when = datetime(2024, 3, 1, 10, 5, tzinfo=UTC)
+        test_db.add_all([_backup(test_device.id, when), _backup(test_device.id, when)])
+        await test_db.commit()
+
+        assert await _rollup(test_db) == {(test_device.id, bucket_for(when), "completed"): 2}
+
+    @pytest.mark.asyncio
+    async def test_insert_with_server_default_created_at(self, test_db, test_device: Device):
+        """Rows relying on the server-side created_at are still counted."""
+        backup = _backup(test_device.id, None)
+        test_db.add(backup)
+        await test_db.commit()
+
+        assert await _rollup(test_db) == {
+            (test_device.id, bucket_for(backup.created_at), "completed"): 1
+        }
+
+    @pytest.mark.asyncio
+    async def test_status_change_moves_count(self, test_db, test_device: Device):
+        """A status transition moves the row between status buckets."""
+        when = datetime(2024, 3, 1, 10, 5, tzinfo=UTC)
+        backup = _backup(test_device.id, when, status="running")
+        test_db.add(backup)
+        await test_db.commit()
+
+        backup.status = "failed"
+        await test_db.commit()
+
+        assert await _rollup(test_db) == {(test_device.id, bucket_for(when), "failed"): 1}
+
+    @pytest.mark.asyncio
+    async def test_delete_decrements(self, test_db, test_device: Device):
+        """Deleting the last backup in a bucket removes the bucket row."""
+        when = datetime(2024, 3, 1, 10, 5, tzinfo=UTC)
+        keep, drop = _backup(test_device.id, when), _backup(test_device.id, when)
+        test_db.add_all([keep, drop])
+        await test_db.commit()
+
+        await test_db.delete(drop)
+        await test_db.commit()
+        assert await _rollup(test_db) == {(test_device.id, bucket_for(when), "completed"): 1}
+
+        await test_db.delete(keep)
+        await test_db.commit()
+        assert await _rollup(test_db) == {}
+
+    @pytest.mark.asyncio
+    async def test_rollback_discards_changes(self, test_db, test_device: Device):
+        """Rollup updates share the transaction of the backup change."""
+        test_db.add(_backup(test_device.id, datetime(2024, 3, 1, tzinfo=UTC)))
+        await test_db.flush()
+        await test_db.rollback()
+
+        assert await _rollup(test_db) == {}
+
+    @pytest.mark.asyncio
+    async def test_rebuild_matches_incremental(self, test_db, test_device: Device):
+        """A full rebuild produces the same counts as incremental maintenance."""
+        test_db.add_all(
+            [
+                _backup(test_device.id, datetime(2024, 3, 1, 1, tzinfo=UTC)),
+                _backup(test_device.id, datetime(2024, 3, 2, 1, tzinfo=UTC), status="failed"),
+            ]
+        )
+        await test_db.commit()
+        before = await _rollup(test_db)
+
+        await BackupQueryService.rebuild_counts(test_db)
+
+        assert await _rollup(test_db) == before
+
+
+class TestDailyCounts:
+    """Tests for reading per-day counts from the rollup."""
+
+    @pytest.mark.asyncio
+    async def test_days_follow_requested_time_zone(self, test_db, test_device: Device):
+        """The same backups fall on different local days in different zones."""
+        test_db.add_all(
+            [
+                _backup(test_device.id, datetime(2024, 3, 1, 23, 30, tzinfo=UTC)),
+                _backup(test_device.id, datetime(2024, 3, 2, 3, 0, tzinfo=UTC)),
+            ]
+        )
+        await test_db.commit()
+
+        utc = await BackupQueryService.daily_counts(
+            test_db, date(2024, 3, 1), date(2024, 3, 31), ZoneInfo("UTC")
+        )
+        new_york = await BackupQueryService.daily_counts(
+            test_db, date(2024, 3, 1), date(2024, 3, 31), ZoneInfo("America/New_York")
+        )
+        kolkata = await BackupQueryService.daily_counts(
+            test_db, date(2024, 3, 1), date(2024, 3, 31), ZoneInfo("Asia/Kolkata")
+        )
+
+        assert utc == {date(2024, 3, 1): 1, date(2024, 3, 2): 1}
+        assert new_york == {date(2024, 3, 1): 2}
+        assert kolkata == {date(2024, 3, 2): 2}
@@ -0,0 +1,114 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Backup Service Tests
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import hashlib
+
+import pytest
+
+from app.models.backup import Backup
+from app.models.device import Device
+from app.services.backup_service import BackupService
+
+
+async def _chunks(parts):
+    for part in parts:
+        yield part
+
+
+async def _failing_chunks():
+    yield b"partial"
+    raise ConnectionError("controller went away")
+
+
+@pytest.fixture
+async def pending_backup(test_db, test_device: Device):
+    """Create a pending backup row for the test device."""
+    backup = Backup(
+        device_id=test_device.id,
+        filename=BackupService.make_filename(test_device),
+        file_path="",
+        file_size=0,
+        backup_type="manual",
+        status="running",
+    )
+    test_db.add(backup)
+    await test_db.commit()
+    await test_db.refresh(backup)
+    return backup
+
+
+class TestIngest:
+    """Tests for streaming ingest of backup payloads."""
+
+    @pytest.mark.asyncio
+    async def test_ingest_writes_file_and_updates_row(self, test_db, pending_backup, tmp_path):
+        """Ingest should store the payload and record size and checksum."""
+        parts = [b"a" * 1000, b"b" * 1000, b"c" * 17]
+        service = BackupService(backup_path=str(tmp_path))
+
+        backup = await service.ingest(test_db, pending_backup, _chunks(parts))
+
+        payload = b"".join(parts)
+        assert backup.status == "completed"
+        assert backup.file_size == len(payload)
+        assert backup.checksum == hashlib.sha256(payload).hexdigest()
+        assert backup.completed_at is not None
+        with open(backup.file_path, "rb") as fh:
+            assert fh.read() == payload
+
+    @pytest.mark.asyncio
+    async def test_ingest_stores_under_device_dir(self, test_db, pending_backup, tmp_path):
+        """Backups should be grouped by device id under backup_path."""
+        service = BackupService(backup_path=str(tmp_path))
+
+        backup = await service.ingest(test_db, pending_backup, _chunks([b"data"]))
+
+        assert backup.file_path == str(tmp_path / str(backup.device_id) / backup.filename)
+
+    @pytest.mark.asyncio
+    async def test_ingest_leaves_no_temp_files(self, test_db, pending_backup, tmp_path):
+        """Only the final file should remain after a successful ingest."""
+        service = BackupService(backup_path=str(tmp_path))
+
+        backup = await service.ingest(test_db, pending_backup, _chunks([b"data"]))
+
+        files = list(service.device_dir(backup.device_id).iterdir())
+        assert [f.name for f in files] == [backup.filename]
+
+    @pytest.mark.asyncio
+    async def test_ingest_failure_cleans_up_and_marks_failed(
+        self, test_db, pending_backup, tmp_path
+    ):
+        """A broken stream should remove the partial file and fail the row."""
+        service = BackupService(backup_path=str(tmp_path))
+
+        with pytest.raises(ConnectionError):
+            await service.ingest(test_db, pending_backup, _failing_chunks())
+
+        assert pending_backup.status == "failed"
+        assert "controller went away" in pending_backup.error_message
+        assert list(service.device_dir(pending_backup.device_id).iterdir()) == []
+
+    @pytest.mark.asyncio
+    async def test_ingest_empty_stream(self, test_db, pending_backup, tmp_path):
+        """An empty stream should still produce a completed zero-byte file."""
+        service = BackupService(backup_path=str(tmp_path))
+
+        backup = await service.ingest(test_db, pending_backup, _chunks([]))
+
+        assert backup.file_size == 0
+        assert backup.checksum == hashlib.sha256(b"").hexdigest()
+
+
+class TestFilenames:
+    """Tests for backup filename generation."""
+
+    def test_make_filename_has_unf_extension(self):
+        """Generated filenames should carry the device id and .unf extension."""
+        device = Device(id=7, name="x", ip_address="1.1.1.1", api_key_encrypted="", device_type="")
+
+        filename = BackupService.make_filename(device)
+
+        assert filename.startswith("backup_7_")
+        assert filename.endswith(".unf")
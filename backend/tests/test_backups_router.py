@@ -0,0 +1,368 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Backups Router Tests
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import hashlib
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from httpx import AsyncClient
+
+from app.models.backup import Backup
+from app.models.device import Device
+from app.routers import backups as backups_module
+from app.services import backup_query_service
+from app.services.backup_query_service import BackupQueryService
+
+PAYLOAD = bytes(range(256)) * 40  # 10 KiB
+
+
+@pytest.fixture
+def backup_root(tmp_path, monkeypatch):
+    """Point backup storage at a temp directory."""
+    monkeypatch.setattr(backups_module.settings, "backup_path", str(tmp_path))
+    monkeypatch.setattr(backups_module.settings, "backup_accel_redirect_prefix", "")
+    return tmp_path
+
+
+@pytest.fixture
+async def stored_backup(test_db, test_device: Device, backup_root):
+    """Create a completed backup with a file on disk."""
+    device_dir = backup_root / str(test_device.id)
+    device_dir.mkdir()
+    file_path = device_dir / "backup_1.unf"
+    file_path.write_bytes(PAYLOAD)
+
+    backup = Backup(
+        device_id=test_device.id,
+        filename="backup_1.unf",
+        file_path=str(file_path),
+        file_size=len(PAYLOAD),
+        checksum=hashlib.sha256(PAYLOAD).hexdigest(),
+        backup_type="manual",
+        status="completed",
+    )
+    test_db.add(backup)
+    await test_db.commit()
+    await test_db.refresh(backup)
+    return backup
+
+
+class TestDownloadEndpoint:
+    """Tests for GET /api/backups/{id}/download endpoint."""
+
+    @pytest.mark.asyncio
+    async def test_download_full_file(
+        self, async_client: AsyncClient, stored_backup: Backup, auth_headers: dict
+    ):
+        """A plain GET should return the whole file with a checksum ETag."""
+        response = await async_client.get(
+            f"/api/backups/{stored_backup.id}/download", headers=auth_headers
+        )
+
+        assert response.status_code == 200
+        assert response.content == PAYLOAD
+        assert response.headers["etag"] == f'"{stored_backup.checksum}"'
+        assert response.headers["accept-ranges"] == "bytes"
+        assert "backup_1.unf" in response.headers["content-disposition"]
+
+    @pytest.mark.asyncio
+    async def test_download_range(
+        self, async_client: AsyncClient, stored_backup: Backup, auth_headers: dict
+    ):
+        """A Range request should return only the requested bytes."""
+        response = await async_client.get(
+            f"/api/backups/{stored_backup.id}/download",
+            headers={**auth_headers, "Range": "bytes=100-199"},
+        )
+
+        assert response.status_code == 206
+        assert response.content == PAYLOAD[100:200]
+        assert response.headers["content-range"] == f"bytes 100-199/{len(PAYLOAD)}"
+
+    @pytest.mark.asyncio
+    async def test_download_if_range_match_resumes(
+        self, async_client: AsyncClient, stored_backup: Backup, auth_headers: dict
+    ):
+        """If-Range with the current ETag should honor the range."""
+        response = await async_client.get(
+            f"/api/backups/{stored_backup.id}/download",
+            headers={
+                **auth_headers,
+                "Range": "bytes=5000-",
+                "If-Range": f'"{stored_backup.checksum}"',
+            },
+        )
+
+        assert response.status_code == 206
+        assert response.content == PAYLOAD[5000:]
+
+    @pytest.mark.asyncio
+    async def test_download_if_range_mismatch_sends_full_file(
+        self, async_client: AsyncClient, stored_backup: Backup, auth_headers: dict
+    ):
+        """If-Range with a stale ETag should fall back to the full file."""
+        response = await async_client.get(
+            f"/api/backups/{stored_backup.id}/download",
+            headers={**auth_headers, "Range": "bytes=5000-", "If-Range": '"stale"'},
+        )
+
+        assert response.status_code == 200
+        assert response.content == PAYLOAD
+
+    @pytest.mark.asyncio
+    async def test_download_if_none_match(
+        self, async_client: AsyncClient, stored_backup: Backup, auth_headers: dict
+    ):
+        """A matching If-None-Match should return 304 without a body."""
+        response = await async_client.get(
+            f"/api/backups/{stored_backup.id}/download",
+            headers={**auth_headers, "If-None-Match": f'"{stored_backup.checksum}"'},
+        )
+
+        assert response.status_code == 304
+        assert response.content == b""
+
+    @pytest.mark.asyncio
+    async def test_download_accel_redirect(
+        self,
+        async_client: AsyncClient,
+        stored_backup: Backup,
+        auth_headers: dict,
+        monkeypatch,
+    ):
+        """With an accel prefix configured, nginx is told to serve the file."""
+        monkeypatch.setattr(
+            backups_module.settings, "backup_accel_redirect_prefix", "/protected-backups"
+        )
+
+        response = await async_client.get(
+            f"/api/backups/{stored_backup.id}/download", headers=auth_headers
+        )
+
+        assert response.status_code == 200
+        assert response.content == b""
+        assert response.headers["x-accel-redirect"] == (
+            f"/protected-backups/{stored_backup.device_id}/backup_1.unf"
+        )
+
+    @pytest.mark.asyncio
+    async def test_download_outside_backup_path(
+        self, async_client: AsyncClient, stored_backup: Backup, auth_headers: dict, test_db
+    ):
+        """Paths outside backup_path should never be served."""
+        stored_backup.file_path = "/etc/passwd"
+        await test_db.commit()
+
+        response = await async_client.get(
+            f"/api/backups/{stored_backup.id}/download", headers=auth_headers
+        )
+
+        assert response.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_download_missing_backup(self, async_client: AsyncClient, auth_headers: dict):
+        """Unknown backup ids should return 404."""
+        response = await async_client.get("/api/backups/9999/download", headers=auth_headers)
+
+        assert response.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_download_unauthenticated(self, async_client: AsyncClient, stored_backup: Backup):
+        """Unauthenticated downloads should return 401."""
+        response = await async_client.get(f"/api/backups/{stored_backup.id}/download")
+
+        assert response.status_code == 401
+
+
+async def _add_backups(db, device_id, count, status="completed"):
+    base = datetime(2024, 1, 1, tzinfo=UTC)
+    backups = [
+        Backup(
+            device_id=device_id,
+            filename=f"backup_{i}.unf",
+            file_path="",
+            file_size=i,
+            backup_type="scheduled",
+            status=status,
+            # Pairs of rows share a timestamp to exercise the id tie-breaker.
+            created_at=base + timedelta(minutes=i // 2),
+        )
+        for i in range(count)
+    ]
+    db.add_all(backups)
+    await db.commit()
+    return backups
+
+
+class TestListEndpoint:
+    """Tests for GET /api/backups endpoint."""
+
+    @pytest.fixture(autouse=True)
+    def _clear_total_cache(self):
+        BackupQueryService.clear_total_cache()
+
+    @pytest.mark.asyncio
+    async def test_list_walks_all_pages(
+        self, async_client: AsyncClient, test_db, test_device: Device, auth_headers: dict
+    ):
+        """Following next_cursor should visit every backup exactly once, newest first."""
+        backups = await _add_backups(test_db, test_device.id, 12)
+
+        seen = []
+        cursor = None
+        for _ in range(10):
+            params = {"page_size": 5}
+            if cursor:
+                params["cursor"] = cursor
+            response = await async_client.get("/api/backups", params=params, headers=auth_headers)
+            assert response.status_code == 200
+            data = response.json()
+            assert len(data["items"]) <= 5
+            seen.extend(item["id"] for item in data["items"])
+            cursor = data["next_cursor"]
+            if cursor is None:
+                break
+
+        assert sorted(seen) == sorted(b.id for b in backups)
+        assert len(seen) == len(set(seen))
+        # Rows sharing a created_at fall back to id ordering.
+        assert seen == sorted(seen, reverse=True)
+
+    @pytest.mark.asyncio
+    async def test_list_last_page_has_no_cursor(
+        self, async_client: AsyncClient, test_db, test_device: Device, auth_headers: dict
+    ):
+        """A page that holds the remaining rows should not return a cursor."""
+        await _add_backups(test_db, test_device.id, 3)
+
+        response = await async_client.get(
+            "/api/backups", params={"page_size": 3}, headers=auth_headers
+        )
+
+        data = response.json()
+        assert len(data["items"]) == 3
+        assert data["next_cursor"] is None
+        assert data["total"] is None
+
+    @pytest.mark.asyncio
+    async def test_total_cache_is_bounded(
+        self, async_client: AsyncClient, auth_headers: dict, monkeypatch
+    ):
+        """Arbitrary status filters don't grow the totals cache without limit."""
+        monkeypatch.setattr(backup_query_service._total_cache, "max_entries", 3)
+
+        for i in range(5):
+            response = await async_client.get(
+                "/api/backups",
+                params={"status": f"bogus-{i}", "include_total": "true"},
+                headers=auth_headers,
+            )
+            assert response.json()["total"] == 0
+
+        assert len(backup_query_service._total_cache) == 3
+
+    @pytest.mark.asyncio
+    async def test_list_filters_by_device_and_status(
+        self, async_client: AsyncClient, test_db, test_device: Device, auth_headers: dict
+    ):
+        """device_id and status filters should narrow the listing."""
+        other = Device(
+            name="Other",
+            ip_address="10.0.0.2",
+            api_key_encrypted="x",
+            device_type="USG",
+        )
+        test_db.add(other)
+        await test_db.commit()
+        await _add_backups(test_db, test_device.id, 2)
+        await _add_backups(test_db, test_device.id, 1, status="failed")
+        await _add_backups(test_db, other.id, 4)
+
+        response = await async_client.get(
+            "/api/backups",
+            params={"device_id": test_device.id, "status": "completed", "include_total": True},
+            headers=auth_headers,
+        )
+
+        data = response.json()
+        assert len(data["items"]) == 2
+        assert {item["device_id"] for item in data["items"]} == {test_device.id}
+        assert data["total"] == 2
+
+    @pytest.mark.asyncio
+    async def test_list_invalid_cursor(self, async_client: AsyncClient, auth_headers: dict):
+        """A garbage cursor should return 400."""
+        response = await async_client.get(
+            "/api/backups", params={"cursor": "not-a-cursor"}, headers=auth_headers
+        )
+
+        assert response.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_list_unauthenticated(self, async_client: AsyncClient):
+        """Unauthenticated requests should return 401."""
+        response = await async_client.get("/api/backups")
+
+        assert response.status_code == 401
+
+
+class TestCalendarEndpoints:
+    """Tests for GET /api/backups/calendar and /api/backups/by-date endpoints."""
+
+    @pytest.mark.asyncio
+    async def test_calendar_counts_per_day(
+        self, async_client: AsyncClient, test_db, test_device: Device, auth_headers: dict
+    ):
+        """The calendar should report one entry per day that has backups."""
+        await _add_backups(test_db, test_device.id, 4)
+
+        response = await async_client.get(
+            "/api/backups/calendar", params={"year": 2024, "month": 1}, headers=auth_headers
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["year"] == 2024
+        assert data["month"] == 1
+        assert data["days"] == [{"date": "2024-01-01", "count": 4}]
+
+    @pytest.mark.asyncio
+    async def test_calendar_uses_time_zone(
+        self, async_client: AsyncClient, test_db, test_device: Device, auth_headers: dict
+    ):
+        """Backups just after midnight UTC belong to the previous day further west."""
+        await _add_backups(test_db, test_device.id, 2)
+
+        response = await async_client.get(
+            "/api/backups/calendar",
+            params={"year": 2023, "month": 12, "tz": "America/Los_Angeles"},
+            headers=auth_headers,
+        )
+
+        assert response.json()["days"] == [{"date": "2023-12-31", "count": 2}]
+
+    @pytest.mark.asyncio
+    async def test_calendar_unknown_time_zone(self, async_client: AsyncClient, auth_headers: dict):
+        """An unknown time zone should return 400."""
+        response = await async_client.get(
+            "/api/backups/calendar",
+            params={"year": 2024, "month": 1, "tz": "Mars/Olympus"},
+            headers=auth_headers,
+        )
+
+        assert response.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_by_date_lists_backups(
+        self, async_client: AsyncClient, test_db, test_device: Device, auth_headers: dict
+    ):
+        """by-date should return the backups created on that day."""
+        await _add_backups(test_db, test_device.id, 3)
+
+        response = await async_client.get("/api/backups/by-date/2024-01-01", headers=auth_headers)
+        empty = await async_client.get("/api/backups/by-date/2024-01-02", headers=auth_headers)
+
+        assert response.status_code == 200
+        assert len(response.json()) == 3
+        assert empty.json() == []
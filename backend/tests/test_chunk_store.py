@@ -0,0 +1,240 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Chunk Store Tests
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import asyncio
+import hashlib
+import random
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+
+from app.config import get_settings
+from app.models.backup import Backup
+from app.models.backup_chunk import BackupChunk
+from app.models.schedule import Schedule
+from app.routers import backups as backups_module
+from app.services.backup_service import BackupService
+from app.services.chunk_store import (
+    _ANCHOR_SET,
+    Chunker,
+    ChunkStore,
+    read_manifest,
+)
+from app.services.retention_service import RetentionService
+
+MIN_SIZE, MAX_SIZE = 256, 4096
+
+
+def _content(seed: int, size: int) -> bytes:
+    """Pseudo-random bytes with an anchor run every few hundred bytes."""
+    rng = random.Random(seed)
+    alphabet = list(_ANCHOR_SET) + [b for b in range(256) if b not in _ANCHOR_SET][:48]
+    return bytes(rng.choice(alphabet) for _ in range(size))
+
+
+BASE = _content(1, 200_000)
+# The same file with a small edit near the start.
+EDITED = BASE[:1000] + b"changed-setting" + BASE[1000:]
+
+
+async def _chunks(data, size=3000):
+    for i in range(0, len(data), size):
+        yield data[i : i + size]
+
+
+def _split(data, read_size):
+    chunker = Chunker(MIN_SIZE, MAX_SIZE)
+    chunks = []
+    for i in range(0, len(data), read_size):
+        chunks += chunker.feed(data[i : i + read_size])
+    return chunks + chunker.finish()
+
+
+class TestChunker:
+    """Tests for content-defined chunk boundaries."""
+
+    def test_boundaries_ignore_read_sizes(self):
+        """The same bytes split identically however they arrive."""
+        assert _split(BASE, 1000) == _split(BASE, 7777) == _split(BASE, len(BASE))
+
+    def test_chunk_sizes_within_bounds(self):
+        """Chunks reassemble the input and only the last may be short."""
+        chunks = _split(BASE, 4096)
+
+        assert b"".join(chunks) == BASE
+        assert all(MIN_SIZE <= len(c) <= MAX_SIZE for c in chunks[:-1])
+
+    def test_edit_only_changes_nearby_chunks(self):
+        """An insertion early in the file leaves later chunks intact."""
+        before, after = _split(BASE, 4096), _split(EDITED, 4096)
+
+        changed = set(after) - set(before)
+        assert 0 < len(changed) <= 3
+        assert len(after) - len(changed) >= len(before) - 3
+
+
+@pytest.fixture
+def dedup_settings(tmp_path, monkeypatch):
+    """Small chunk bounds and the router pointed at tmp_path."""
+    settings = get_settings()
+    monkeypatch.setattr(settings, "dedup_min_chunk_size", MIN_SIZE)
+    monkeypatch.setattr(settings, "dedup_max_chunk_size", MAX_SIZE)
+    monkeypatch.setattr(settings, "backup_path", str(tmp_path))
+    monkeypatch.setattr(backups_module.settings, "backup_path", str(tmp_path))
+    monkeypatch.setattr(backups_module.settings, "backup_accel_redirect_prefix", "")
+    return tmp_path
+
+
+async def _ingest(db, device, data, root, created_at=None):
+    backup = Backup(
+        device_id=device.id,
+        filename=BackupService.make_filename(device, created_at),
+        file_path="",
+        file_size=0,
+        backup_type="scheduled",
+        status="running",
+        created_at=created_at or datetime.now(UTC),
+    )
+    db.add(backup)
+    await db.commit()
+    service = BackupService(backup_path=str(root), dedup=True)
+    return await service.ingest(db, backup, _chunks(data))
+
+
+async def _chunk_rows(db):
+    rows = await db.execute(select(BackupChunk.digest, BackupChunk.refcount))
+    return dict(rows.all())
+
+
+class TestDedupIngest:
+    """Tests for storing backups as deduplicated chunks."""
+
+    @pytest.mark.asyncio
+    async def test_similar_backups_share_chunks(self, test_db, test_device, dedup_settings):
+        """A second, slightly edited backup only adds the chunks around the edit."""
+        yesterday = datetime.now(UTC) - timedelta(days=1)
+        first = await _ingest(test_db, test_device, BASE, dedup_settings, yesterday)
+        stored = await ChunkStore.stored_bytes(test_db)
+        second = await _ingest(test_db, test_device, EDITED, dedup_settings)
+
+        assert first.layout == second.layout == "chunked"
+        assert second.file_size == len(EDITED)
+        assert second.checksum == hashlib.sha256(EDITED).hexdigest()
+        assert stored == len(BASE)
+        assert await ChunkStore.stored_bytes(test_db) - stored < 3 * MAX_SIZE + 100
+
+        refcounts = await _chunk_rows(test_db)
+        shared = {d for d, _ in read_manifest(first.file_path)} & {
+            d for d, _ in read_manifest(second.file_path)
+        }
+        assert shared and all(refcounts[d] >= 2 for d in shared)
+
+    @pytest.mark.asyncio
+    async def test_failed_ingest_releases_chunks(self, test_db, test_device, dedup_settings):
+        """Chunks pinned by an ingest that fails are released again."""
+        backup = Backup(
+            device_id=test_device.id,
+            filename="broken.unf",
+            file_path="",
+            file_size=0,
+            backup_type="manual",
+            status="running",
+        )
+        test_db.add(backup)
+        await test_db.commit()
+
+        async def broken_stream():
+            yield BASE[:150_000]
+            raise ConnectionError("controller went away")
+
+        service = BackupService(backup_path=str(dedup_settings), dedup=True)
+        with pytest.raises(ConnectionError):
+            await service.ingest(test_db, backup, broken_stream())
+
+        assert backup.status == "failed"
+        refcounts = await _chunk_rows(test_db)
+        assert refcounts and set(refcounts.values()) == {0}
+
+    @pytest.mark.asyncio
+    async def test_cancelled_ingest_releases_chunks(self, test_db, test_device, dedup_settings):
+        """Chunks pinned before a cancellation are released and the backup fails."""
+        backup = Backup(
+            device_id=test_device.id,
+            filename="cancelled.unf",
+            file_path="",
+            file_size=0,
+            backup_type="manual",
+            status="running",
+        )
+        test_db.add(backup)
+        await test_db.commit()
+        backup_id = backup.id
+        pinned = asyncio.Event()
+
+        async def stalled_stream():
+            yield BASE[:150_000]
+            yield BASE[150_000:]  # the first batch is pinned while this is consumed
+            pinned.set()
+            await asyncio.sleep(3600)
+            yield b""
+
+        service = BackupService(backup_path=str(dedup_settings), dedup=True)
+        task = asyncio.create_task(service.ingest(test_db, backup, stalled_stream()))
+        await pinned.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        refcounts = await _chunk_rows(test_db)
+        assert refcounts and set(refcounts.values()) == {0}
+        status = await test_db.scalar(select(Backup.status).where(Backup.id == backup_id))
+        assert status == "failed"
+
+    @pytest.mark.asyncio
+    async def test_download_reassembles_file(
+        self, test_db, test_device, dedup_settings, async_client: AsyncClient, auth_headers
+    ):
+        """Downloading a chunked backup returns the original bytes."""
+        backup = await _ingest(test_db, test_device, EDITED, dedup_settings)
+
+        response = await async_client.get(
+            f"/api/backups/{backup.id}/download", headers=auth_headers
+        )
+
+        assert response.status_code == 200
+        assert response.headers["accept-ranges"] == "none"
+        assert response.headers["content-length"] == str(len(EDITED))
+        assert response.content == EDITED
+
+
+class TestChunkGarbageCollection:
+    """Tests for freeing chunks when backups are pruned."""
+
+    @pytest.mark.asyncio
+    async def test_prune_frees_only_unshared_chunks(
+        self, test_db, session_factory, test_device, dedup_settings
+    ):
+        """Pruning the old backup frees its unique chunks and keeps the shared ones."""
+        now = datetime.now(UTC)
+        old = await _ingest(test_db, test_device, BASE, dedup_settings, now - timedelta(days=30))
+        new = await _ingest(test_db, test_device, EDITED, dedup_settings, now)
+        test_db.add(
+            Schedule(device_id=test_device.id, name="nightly", interval_hours=24, retention_days=7)
+        )
+        await test_db.commit()
+        old_chunks = dict(read_manifest(old.file_path))
+        new_digests = {d for d, _ in read_manifest(new.file_path)}
+        store = ChunkStore(dedup_settings)
+
+        summary = await RetentionService.prune(session_factory, now=now)
+
+        assert summary.deleted == 1
+        freed = old_chunks.keys() - new_digests
+        assert freed
+        assert summary.bytes_freed == sum(old_chunks[d] for d in freed)
+        assert not any(store.path_for(d).exists() for d in freed)
+        assert all(store.path_for(d).exists() for d in new_digests)
+        assert set(await _chunk_rows(test_db)) == new_digests
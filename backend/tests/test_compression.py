@@ -0,0 +1,168 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Backup Compression Tests
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import hashlib
+import json
+import random
+
+import pytest
+import zstandard
+from httpx import AsyncClient
+
+from app.config import get_settings
+from app.models.backup import Backup
+from app.models.device import Device
+from app.models.storage_counter import DeviceStorageCounter
+from app.routers import backups as backups_module
+from app.services import compression
+from app.services.backup_service import BackupService
+
+PAYLOAD = b"".join(
+    json.dumps({"site": "default", "device": i, "config": "x" * 50}).encode() for i in range(400)
+)
+
+
+async def _chunks(data, size=4096):
+    for i in range(0, len(data), size):
+        yield data[i : i + size]
+
+
+@pytest.fixture
+async def running_backup(test_db, test_device: Device):
+    """A backup row waiting for its payload."""
+    backup = Backup(
+        device_id=test_device.id,
+        filename=BackupService.make_filename(test_device),
+        file_path="",
+        file_size=0,
+        backup_type="manual",
+        status="running",
+    )
+    test_db.add(backup)
+    await test_db.commit()
+    return backup
+
+
+@pytest.fixture
+def zstd_dictionary(tmp_path, monkeypatch):
+    """Configure a dictionary trained on backup-like samples."""
+    rng = random.Random(0)
+    samples = [
+        json.dumps({"site": "default", "device": rng.randrange(10**6), "port": i % 48}).encode()
+        * 20
+        for i in range(300)
+    ]
+    path = tmp_path / "backups.dict"
+    path.write_bytes(compression.train_dictionary(samples, 4096).as_bytes())
+    monkeypatch.setattr(get_settings(), "backup_zstd_dict_path", str(path))
+    compression.get_dictionary.cache_clear()
+    yield path
+    compression.get_dictionary.cache_clear()
+
+
+class TestCompressedIngest:
+    """Tests for compressing backups as they stream in."""
+
+    @pytest.mark.asyncio
+    async def test_stores_zstd_frame(self, test_db, running_backup, tmp_path):
+        """The file on disk is compressed; size and checksum describe the plain data."""
+        service = BackupService(backup_path=str(tmp_path), compression="zstd")
+
+        backup = await service.ingest(test_db, running_backup, _chunks(PAYLOAD))
+
+        assert backup.file_path.endswith(".unf.zst")
+        assert backup.compression == "zstd"
+        assert backup.file_size == len(PAYLOAD)
+        assert backup.checksum == hashlib.sha256(PAYLOAD).hexdigest()
+        with open(backup.file_path, "rb") as fh:
+            stored = fh.read()
+        assert backup.compressed_size == len(stored) < len(PAYLOAD)
+        assert zstandard.ZstdDecompressor().decompressobj().decompress(stored) == PAYLOAD
+
+    @pytest.mark.asyncio
+    async def test_counters_track_bytes_on_disk(
+        self, test_db, running_backup, test_device, tmp_path
+    ):
+        """Storage counters add the compressed size."""
+        service = BackupService(backup_path=str(tmp_path), compression="zstd")
+
+        backup = await service.ingest(test_db, running_backup, _chunks(PAYLOAD))
+
+        counter = await test_db.get(DeviceStorageCounter, test_device.id)
+        await test_db.refresh(counter)
+        assert counter.total_size == backup.compressed_size
+
+    @pytest.mark.asyncio
+    async def test_dictionary_round_trip(self, test_db, running_backup, tmp_path, zstd_dictionary):
+        """Dictionary-compressed backups decompress with the same dictionary only."""
+        service = BackupService(backup_path=str(tmp_path), compression="zstd")
+        backup = await service.ingest(test_db, running_backup, _chunks(PAYLOAD))
+
+        restored = b"".join(
+            [c async for c in compression.iter_decompressed(backup.file_path, 1000)]
+        )
+        assert restored == PAYLOAD
+
+        get_settings().backup_zstd_dict_path = ""
+        compression.get_dictionary.cache_clear()
+        with pytest.raises(ValueError, match="unavailable dictionary"):
+            async for _ in compression.iter_decompressed(backup.file_path, 1000):
+                pass
+
+
+@pytest.fixture
+async def compressed_backup(test_db, running_backup, tmp_path, monkeypatch):
+    """A completed zstd backup under the router's backup_path."""
+    monkeypatch.setattr(backups_module.settings, "backup_path", str(tmp_path))
+    monkeypatch.setattr(backups_module.settings, "backup_accel_redirect_prefix", "")
+    service = BackupService(backup_path=str(tmp_path), compression="zstd")
+    return await service.ingest(test_db, running_backup, _chunks(PAYLOAD))
+
+
+class TestCompressedDownload:
+    """Tests for downloading compressed backups."""
+
+    @pytest.mark.asyncio
+    async def test_decompresses_for_plain_clients(
+        self, async_client: AsyncClient, compressed_backup, auth_headers
+    ):
+        """Clients that don't accept zstd get the original bytes."""
+        response = await async_client.get(
+            f"/api/backups/{compressed_backup.id}/download",
+            headers={**auth_headers, "Accept-Encoding": "identity"},
+        )
+
+        assert response.status_code == 200
+        assert "content-encoding" not in response.headers
+        assert response.headers["content-length"] == str(len(PAYLOAD))
+        assert "Accept-Encoding" in response.headers["vary"]
+        assert response.content == PAYLOAD
+
+    @pytest.mark.asyncio
+    async def test_passes_through_to_zstd_clients(
+        self, async_client: AsyncClient, compressed_backup, auth_headers
+    ):
+        """Clients accepting zstd get the stored frame untouched."""
+        url = f"/api/backups/{compressed_backup.id}/download"
+        headers = {**auth_headers, "Accept-Encoding": "gzip, zstd"}
+        async with async_client.stream("GET", url, headers=headers) as response:
+            raw = b"".join([chunk async for chunk in response.aiter_raw()])
+
+        assert response.headers["content-encoding"] == "zstd"
+        assert response.headers["etag"] == f'"{compressed_backup.checksum}-zstd"'
+        assert len(raw) == compressed_backup.compressed_size
+        assert zstandard.ZstdDecompressor().decompressobj().decompress(raw) == PAYLOAD
+
+    @pytest.mark.asyncio
+    async def test_zstd_refused_with_q_zero(
+        self, async_client: AsyncClient, compressed_backup, auth_headers
+    ):
+        """An explicit q=0 for zstd means the client must get plain bytes."""
+        response = await async_client.get(
+            f"/api/backups/{compressed_backup.id}/download",
+            headers={**auth_headers, "Accept-Encoding": "zstd;q=0"},
+        )
+
+        assert "content-encoding" not in response.headers
+        assert response.content == PAYLOAD
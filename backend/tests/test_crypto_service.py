@@ -4,7 +4,7 @@
 
 import pytest
 
-from app.services.crypto_service import CryptoService, crypto_service
+from app.services.crypto_service import CryptoService, DecryptedKeyCache, crypto_service
 
 
 class TestCryptoService:
@@ -108,3 +108,70 @@ class TestCryptoServiceAPIKeys:
         decrypted = crypto_service.decrypt(ciphertext)
 
         assert decrypted == special_key
+
+
+class TestKeyRotation:
+    """Tests for decrypting with previous keys and rotating to the current one."""
+
+    def test_previous_key_still_decrypts(self):
+        """Values encrypted under an old key decrypt after rotation."""
+        old_key, new_key = CryptoService.generate_key(), CryptoService.generate_key()
+        ciphertext = CryptoService(old_key, []).encrypt("secret")
+        rotated = CryptoService(new_key, [old_key])
+
+        assert rotated.decrypt(ciphertext) == "secret"
+        assert rotated.needs_rotation(ciphertext)
+
+    def test_rotate_moves_to_primary_key(self):
+        """Rotated values decrypt with the new key alone."""
+        old_key, new_key = CryptoService.generate_key(), CryptoService.generate_key()
+        ciphertext = CryptoService(old_key, []).encrypt("secret")
+
+        rotated = CryptoService(new_key, [old_key]).rotate(ciphertext)
+
+        assert CryptoService(new_key, []).decrypt(rotated) == "secret"
+        assert not CryptoService(new_key, [old_key]).needs_rotation(rotated)
+
+    def test_unknown_key_fails_to_decrypt(self):
+        """Values from a key that is no longer configured are rejected."""
+        ciphertext = CryptoService(CryptoService.generate_key(), []).encrypt("secret")
+
+        with pytest.raises(ValueError, match="Invalid or corrupted"):
+            CryptoService(CryptoService.generate_key(), []).decrypt(ciphertext)
+
+
+class TestDecryptedKeyCache:
+    """Tests for the run-scoped plaintext cache."""
+
+    def test_decrypts_each_value_once(self, monkeypatch):
+        """Repeated lookups of the same ciphertext decrypt only once."""
+        service = CryptoService()
+        ciphertext = service.encrypt("secret")
+        calls = []
+        original = service.decrypt
+        monkeypatch.setattr(service, "decrypt", lambda c: calls.append(c) or original(c))
+
+        with DecryptedKeyCache(service) as cache:
+            cache.prefetch([ciphertext, ciphertext])
+            assert cache.get(ciphertext) == "secret"
+            assert cache.get(ciphertext) == "secret"
+
+        assert calls == [ciphertext]
+
+    def test_errors_raise_on_lookup(self):
+        """A bad value in a prefetch only raises when that value is requested."""
+        good = crypto_service.encrypt("secret")
+
+        with DecryptedKeyCache(crypto_service) as cache:
+            cache.prefetch([good, "garbage"])
+            assert cache.get(good) == "secret"
+            with pytest.raises(ValueError):
+                cache.get("garbage")
+
+    def test_cleared_on_exit(self):
+        """Plaintexts are dropped when the run ends."""
+        ciphertext = crypto_service.encrypt("secret")
+        with DecryptedKeyCache(crypto_service) as cache:
+            cache.get(ciphertext)
+
+        assert cache._plaintexts == {}
@@ -0,0 +1,104 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Database Pool Tests
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import exc
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.config import Settings
+from app.database import InstrumentedQueuePool, engine_options, pool_status, prewarm_pool
+
+
+@pytest.fixture
+async def file_engine(tmp_path):
+    """Small instrumented pool over a SQLite file."""
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+        poolclass=InstrumentedQueuePool,
+        pool_size=2,
+        max_overflow=0,
+        pool_timeout=0.1,
+    )
+    yield engine
+    await engine.dispose()
+
+
+class TestEngineOptions:
+    """Tests for building engine arguments from settings."""
+
+    def test_postgres_gets_pool_and_statement_cache(self):
+        """Pool sizing and the asyncpg statement cache come from settings."""
+        settings = Settings(
+            database_url="postgresql+asyncpg://u:p@db/x",
+            db_pool_size=7,
+            db_max_overflow=3,
+            db_pool_recycle_seconds=600,
+            db_pool_timeout_seconds=5,
+            db_statement_cache_size=250,
+        )
+
+        options = engine_options(settings)
+
+        assert options["poolclass"] is InstrumentedQueuePool
+        assert options["pool_size"] == 7
+        assert options["max_overflow"] == 3
+        assert options["pool_recycle"] == 600
+        assert options["pool_timeout"] == 5
+        assert options["connect_args"] == {"prepared_statement_cache_size": 250}
+
+    def test_in_memory_sqlite_keeps_default_pool(self):
+        """In-memory SQLite gets no queue pool settings."""
+        options = engine_options(Settings(database_url="sqlite+aiosqlite://"))
+
+        assert "poolclass" not in options
+
+
+class TestPoolInstrumentation:
+    """Tests for pool wait tracking, status and pre-warming."""
+
+    @pytest.mark.asyncio
+    async def test_records_checkouts_and_timeouts(self, file_engine):
+        """Checkouts are counted and exhausted-pool timeouts recorded."""
+        async with file_engine.connect(), file_engine.connect():
+            with pytest.raises(exc.TimeoutError):
+                async with file_engine.connect():
+                    pass
+            status = pool_status(file_engine)
+
+        assert status["checked_out"] == 2
+        assert status["checkouts"] == 3
+        assert status["timeouts"] == 1
+        assert status["wait_seconds_max"] >= 0.1
+
+    @pytest.mark.asyncio
+    async def test_prewarm_opens_idle_connections(self, file_engine):
+        """Pre-warming leaves connections idle in the pool, capped at its size."""
+        opened = await prewarm_pool(5, file_engine)
+
+        status = pool_status(file_engine)
+        assert opened == 2
+        assert status["idle"] == 2
+        assert status["checked_out"] == 0
+
+
+class TestPoolEndpoint:
+    """Tests for the pool stats endpoint."""
+
+    @pytest.mark.asyncio
+    async def test_admin_can_read_pool_stats(
+        self, async_client: AsyncClient, admin_auth_headers: dict
+    ):
+        """Admins get the application pool snapshot."""
+        response = await async_client.get("/api/settings/database/pool", headers=admin_auth_headers)
+
+        assert response.status_code == 200
+        assert "pool_class" in response.json()
+
+    @pytest.mark.asyncio
+    async def test_requires_admin(self, async_client: AsyncClient, auth_headers: dict):
+        """Non-admin users are refused."""
+        response = await async_client.get("/api/settings/database/pool", headers=auth_headers)
+
+        assert response.status_code == 403
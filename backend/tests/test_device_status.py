@@ -0,0 +1,281 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Device Status Cache Tests
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import asyncio
+import time
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import event, select
+
+from app.config import get_settings
+from app.models.backup import Backup
+from app.models.device import Device
+from app.services import device_status
+from app.services.device_status import DeviceStatusCache
+
+INFO = {"uptime": 3600, "firmware_version": "4.0.6", "model": "UDMPRO", "mac_address": "aa:bb"}
+
+
+class FakeController:
+    """Status fetcher that counts calls and can be slowed down or broken."""
+
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self.firmware = "4.0.6"
+        self.slow_hosts: dict[str, float] = {}
+
+    async def __call__(self, ip_address, api_key_encrypted):
+        self.calls += 1
+        await asyncio.sleep(self.slow_hosts.get(ip_address, self.delay))
+        if self.fail:
+            raise ConnectionError("controller unreachable")
+        return {**INFO, "firmware_version": self.firmware}
+
+
+def _device(**overrides):
+    fields = {
+        "id": 1,
+        "name": "HQ",
+        "ip_address": "10.0.0.1",
+        "api_key_encrypted": "k",
+        "device_type": "UDM-Pro",
+    }
+    return Device(**{**fields, **overrides})
+
+
+def _expire(cache, device_id=1):
+    entry = cache._entries[device_id]
+    cache._entries[device_id] = entry._replace(expires_at=0)
+
+
+class TestDeviceStatusCache:
+    """Tests for stale-while-revalidate status caching."""
+
+    @pytest.mark.asyncio
+    async def test_fresh_value_is_reused(self):
+        """Within the TTL the controller is asked only once."""
+        controller = FakeController()
+        cache = DeviceStatusCache(controller, ttl_seconds=60)
+
+        first = await cache.get(_device())
+        second = await cache.get(_device())
+
+        assert controller.calls == 1
+        assert first.is_online and not first.stale
+        assert second.firmware_version == "4.0.6"
+
+    @pytest.mark.asyncio
+    async def test_expired_value_served_while_one_refresh_runs(self):
+        """Expired entries come back immediately and concurrent readers share one refresh."""
+        controller = FakeController()
+        cache = DeviceStatusCache(controller, ttl_seconds=60)
+        await cache.get(_device())
+        _expire(cache)
+        controller.delay, controller.firmware = 0.05, "4.1.0"
+
+        readers = await asyncio.gather(*(cache.get(_device()) for _ in range(10)))
+
+        assert all(r.stale and r.firmware_version == "4.0.6" for r in readers)
+        await asyncio.sleep(0.1)
+        assert controller.calls == 2
+        refreshed = await cache.get(_device())
+        assert not refreshed.stale and refreshed.firmware_version == "4.1.0"
+
+    @pytest.mark.asyncio
+    async def test_first_read_waits_briefly(self):
+        """Without a cached value a slow controller yields a stale placeholder."""
+        controller = FakeController(delay=0.2)
+        cache = DeviceStatusCache(controller, wait_seconds=0.01)
+
+        placeholder = await cache.get(_device())
+        await asyncio.sleep(0.3)
+        loaded = await cache.get(_device())
+
+        assert (placeholder.is_online, placeholder.stale) == (False, True)
+        assert loaded.is_online and controller.calls == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_refresh_keeps_last_known_values(self):
+        """An unreachable controller leaves the old values, marked offline and stale."""
+        controller = FakeController()
+        cache = DeviceStatusCache(controller, ttl_seconds=60)
+        await cache.get(_device())
+        _expire(cache)
+        controller.fail = True
+
+        await cache.get(_device())
+        await asyncio.sleep(0.01)
+        after_failure = await cache.get(_device())
+
+        assert (after_failure.is_online, after_failure.stale) == (False, True)
+        assert after_failure.firmware_version == "4.0.6"
+        assert controller.calls == 2  # no retry until the TTL passes again
+
+    @pytest.mark.asyncio
+    async def test_fetch_timeout_counts_as_offline(self):
+        """A controller slower than the fetch timeout is treated as offline."""
+        cache = DeviceStatusCache(
+            FakeController(delay=1), wait_seconds=1, fetch_timeout_seconds=0.01
+        )
+
+        status = await cache.get(_device())
+
+        assert (status.is_online, status.stale) == (False, True)
+
+    @pytest.mark.asyncio
+    async def test_new_address_invalidates_entry(self):
+        """Changing a device's address discards its cached status."""
+        controller = FakeController()
+        cache = DeviceStatusCache(controller)
+        await cache.get(_device())
+
+        await cache.get(_device(ip_address="10.0.0.2"))
+
+        assert controller.calls == 2
+
+    @pytest.mark.asyncio
+    async def test_get_many_marks_late_devices_pending(self):
+        """Devices slower than the deadline are pending; the rest are returned."""
+        controller = FakeController()
+        controller.slow_hosts["10.0.0.2"] = 0.5
+        cache = DeviceStatusCache(controller)
+        devices = [_device(id=1), _device(id=2, ip_address="10.0.0.2")]
+
+        start = time.monotonic()
+        statuses = await cache.get_many(devices, deadline_seconds=0.05)
+
+        assert time.monotonic() - start < 0.3
+        assert statuses[1].is_online and not statuses[1].pending
+        assert statuses[2].pending and not statuses[2].is_online
+        await asyncio.sleep(0.5)
+        assert (await cache.get(devices[1])).is_online  # refresh kept running
+
+
+@pytest.fixture
+def controller(monkeypatch):
+    """Route the process-wide cache to a fake controller."""
+    device_status.get_status_cache.cache_clear()
+    fake = FakeController()
+    monkeypatch.setattr(device_status, "fetch_device_status", fake)
+    yield fake
+    device_status.get_status_cache.cache_clear()
+
+
+class TestDeviceStatusEndpoint:
+    """Tests for GET /api/devices/{id}/status."""
+
+    @pytest.mark.asyncio
+    async def test_returns_live_status_and_backup_stats(
+        self, async_client: AsyncClient, auth_headers, test_db, test_device, controller
+    ):
+        """Controller fields come from the cache, backup fields from the database."""
+        test_db.add(
+            Backup(
+                device_id=test_device.id,
+                filename="b.unf",
+                file_path="/b.unf",
+                file_size=10,
+                backup_type="manual",
+                status="completed",
+            )
+        )
+        await test_db.commit()
+
+        response = await async_client.get(
+            f"/api/devices/{test_device.id}/status", headers=auth_headers
+        )
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body["is_online"] is True
+        assert body["model"] == "UDMPRO"
+        assert body["backup_count"] == 1
+        assert body["last_backup"] is not None
+
+    @pytest.mark.asyncio
+    async def test_unknown_device(self, async_client: AsyncClient, auth_headers, controller):
+        """Unknown devices are a 404."""
+        response = await async_client.get("/api/devices/999/status", headers=auth_headers)
+
+        assert response.status_code == 404
+
+
+@pytest.fixture
+async def fleet(test_db):
+    """Three active devices and one inactive one."""
+    devices = [
+        Device(
+            name=f"site-{i}",
+            ip_address=f"10.0.1.{i}",
+            api_key_encrypted="k",
+            device_type="UDM-Pro",
+            is_active=i < 3,
+        )
+        for i in range(4)
+    ]
+    test_db.add_all(devices)
+    await test_db.commit()
+    return devices
+
+
+class TestDeviceListEndpoint:
+    """Tests for GET /api/devices."""
+
+    @pytest.mark.asyncio
+    async def test_statuses_fetched_and_written_back_in_one_update(
+        self, async_client: AsyncClient, auth_headers, test_db, test_engine, fleet, controller
+    ):
+        """Active devices get a status and a single UPDATE records what was seen."""
+        updates = []
+
+        @event.listens_for(test_engine.sync_engine, "before_cursor_execute")
+        def count_updates(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith("UPDATE DEVICES"):
+                updates.append(executemany)
+
+        response = await async_client.get("/api/devices", headers=auth_headers)
+        event.remove(test_engine.sync_engine, "before_cursor_execute", count_updates)
+
+        assert response.status_code == 200
+        body = {d["name"]: d for d in response.json()}
+        assert [body[f"site-{i}"]["status"]["is_online"] for i in range(3)] == [True] * 3
+        assert body["site-3"]["status"] is None
+        assert body["site-0"]["firmware_version"] == "4.0.6"
+        # One statement; only SQLite needs it to be an executemany.
+        assert updates == [test_engine.dialect.name != "postgresql"]
+        rows = await test_db.execute(select(Device.name, Device.model, Device.last_seen))
+        seen = {name: (model, last_seen) for name, model, last_seen in rows.all()}
+        assert seen["site-0"][0] == "UDMPRO" and seen["site-0"][1] is not None
+        assert seen["site-3"] == (None, None)
+
+    @pytest.mark.asyncio
+    async def test_slow_controller_bounded_by_deadline(
+        self, async_client: AsyncClient, auth_headers, fleet, controller, monkeypatch
+    ):
+        """A slow controller is reported pending instead of delaying the list."""
+        monkeypatch.setattr(get_settings(), "device_list_deadline_seconds", 0.1)
+        controller.slow_hosts["10.0.1.1"] = 2.0
+
+        start = time.monotonic()
+        response = await async_client.get("/api/devices", headers=auth_headers)
+
+        assert time.monotonic() - start < 1.0
+        body = {d["name"]: d["status"] for d in response.json()}
+        assert body["site-1"]["pending"] is True
+        assert body["site-0"]["pending"] is False and body["site-0"]["is_online"] is True
+        await device_status.get_status_cache().close()
+
+    @pytest.mark.asyncio
+    async def test_without_status(self, async_client: AsyncClient, auth_headers, fleet, controller):
+        """include_status=false skips the controllers entirely."""
+        response = await async_client.get(
+            "/api/devices", params={"include_status": "false"}, headers=auth_headers
+        )
+
+        assert response.status_code == 200
+        assert len(response.json()) == 4
+        assert controller.calls == 0
@@ -0,0 +1,62 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Import Time Tests
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import os
+import subprocess
+import sys
+import time
+
+from app.import_profile import by_package, parse_importtime
+
+# Wall-clock budget for `python -c "import app.main"`, interpreter start included.
+IMPORT_TIME_BUDGET_SECONDS = float(os.environ.get("IMPORT_TIME_BUDGET_SECONDS", "3.0"))
+
+# Only needed once a request actually hashes, signs, decrypts or calls a controller.
+LAZY_MODULES = ("aiohttp", "jose", "passlib", "cryptography")
+
+
+def _run(code: str) -> tuple[float, str]:
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    return time.perf_counter() - start, result.stdout
+
+
+class TestImportTime:
+    """Regression tests for app start-up import cost."""
+
+    def test_import_within_budget(self):
+        """Importing app.main stays within the time budget."""
+        elapsed, _ = _run("import app.main")
+
+        assert elapsed < IMPORT_TIME_BUDGET_SECONDS, (
+            f"import app.main took {elapsed:.2f}s (budget {IMPORT_TIME_BUDGET_SECONDS}s); "
+            "run `python -m app.import_profile` to see what got slower"
+        )
+
+    def test_heavy_dependencies_load_lazily(self):
+        """Heavy dependencies are not imported with the app."""
+        _, stdout = _run(
+            "import sys, app.main; "
+            f"print(' '.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+        )
+
+        assert stdout.strip() == ""
+
+    def test_parse_importtime(self):
+        """-X importtime output is parsed into per-module and per-package costs."""
+        output = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       100 |        100 |   app.config\n"
+            "import time:        50 |        150 | app\n"
+        )
+
+        costs = parse_importtime(output)
+
+        assert [(c.module, c.self_us, c.cumulative_us) for c in costs] == [
+            ("app.config", 100, 100),
+            ("app", 50, 150),
+        ]
+        assert by_package(costs) == {"app": 150}
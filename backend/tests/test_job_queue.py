@@ -0,0 +1,322 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Backup Job Queue Tests
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import asyncio
+from datetime import UTC, datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import select, text
+
+from app.config import get_settings
+from app.models.backup import Backup
+from app.models.backup_job import BackupJob
+from app.models.device import Device
+from app.services.backup_orchestrator import BackupOrchestrator
+from app.services.backup_service import BackupService
+from app.services.job_queue import BackupWorker, JobQueue, retry_delay
+
+T0 = datetime(2024, 6, 30, 12, 0, tzinfo=UTC)
+
+
+class FakeOrchestrator:
+    """Pretends to back up devices, failing the ones in ``fail_ids``."""
+
+    def __init__(self, session_factory, fail_ids=()):
+        self.session_factory = session_factory
+        self.fail_ids = set(fail_ids)
+        self.runs = []
+
+    async def backup_one(self, device, backup_type="scheduled", job_id=None):
+        self.runs.append(device.id)
+        failed = device.id in self.fail_ids
+        async with self.session_factory() as db:
+            backup = Backup(
+                device_id=device.id,
+                filename=f"backup_{device.id}.unf",
+                file_path="",
+                file_size=0,
+                backup_type=backup_type,
+                status="failed" if failed else "completed",
+            )
+            db.add(backup)
+            await db.commit()
+        return SimpleNamespace(
+            status=backup.status,
+            backup_id=backup.id,
+            error_message="unreachable" if failed else None,
+        )
+
+
+class HangingBackupService(BackupService):
+    """Backup service whose controller never answers."""
+
+    def __init__(self, backup_path):
+        super().__init__(backup_path=backup_path)
+        self.started = asyncio.Event()
+
+    async def run_backup(self, db, device, backup, api_key=None):
+        self.started.set()
+        await asyncio.sleep(3600)
+
+
+async def _job(session_factory, job_id):
+    async with session_factory() as db:
+        return await db.get(BackupJob, job_id)
+
+
+class TestJobQueue:
+    """Tests for enqueueing, claiming and settling jobs."""
+
+    @pytest.mark.asyncio
+    async def test_one_active_job_per_device(self, test_db, test_device):
+        """A device with a queued job is not queued again."""
+        assert await JobQueue.enqueue(test_db, [test_device.id], now=T0) == [test_device.id]
+        await test_db.commit()
+
+        assert await JobQueue.enqueue(test_db, [test_device.id], now=T0) == []
+        await test_db.commit()
+        assert len((await test_db.execute(select(BackupJob))).all()) == 1
+
+    @pytest.mark.asyncio
+    async def test_claimed_job_is_leased_to_one_worker(self, test_db, session_factory, test_device):
+        """A leased job is invisible to other workers until the lease lapses."""
+        await JobQueue.enqueue(test_db, [test_device.id], now=T0)
+        await test_db.commit()
+
+        async with session_factory() as db:
+            claimed = await JobQueue.claim(db, "a", 10, now=T0)
+        async with session_factory() as db:
+            assert await JobQueue.claim(db, "b", 10, now=T0 + timedelta(seconds=1)) == []
+
+        assert [(j.status, j.attempts, j.locked_by) for j in claimed] == [("running", 1, "a")]
+
+        async with session_factory() as db:
+            stolen = await JobQueue.claim(db, "b", 10, now=T0 + timedelta(hours=1))
+        async with session_factory() as db:
+            assert not await JobQueue.complete(db, claimed[0].id, "a", None)
+            assert await JobQueue.complete(db, stolen[0].id, "b", None)
+
+    @pytest.mark.asyncio
+    async def test_claims_respect_per_host_limit(self, test_db, session_factory, monkeypatch):
+        """Jobs for a controller already at backup_max_per_host stay queued, across workers."""
+        monkeypatch.setattr(get_settings(), "backup_max_per_host", 1)
+        devices = [
+            Device(name=f"site-{i}", ip_address=host, api_key_encrypted="x", device_type="UDM")
+            for i, host in enumerate(["10.0.9.1", "10.0.9.1", "10.0.9.1", "10.0.9.2"])
+        ]
+        test_db.add_all(devices)
+        await test_db.commit()
+        await JobQueue.enqueue(test_db, [d.id for d in devices], now=T0)
+        await test_db.commit()
+
+        async with session_factory() as db:
+            first = await JobQueue.claim(db, "a", 10, now=T0)
+        async with session_factory() as db:
+            second = await JobQueue.claim(db, "b", 10, now=T0)
+        async with session_factory() as db:
+            assert await JobQueue.complete(db, first[0].id, "a", None)
+        async with session_factory() as db:
+            third = await JobQueue.claim(db, "b", 10, now=T0)
+
+        hosts = {d.id: d.ip_address for d in devices}
+        assert sorted(hosts[j.device_id] for j in first) == ["10.0.9.1", "10.0.9.2"]
+        assert second == []
+        assert [hosts[j.device_id] for j in third] == ["10.0.9.1"]
+
+    @pytest.mark.asyncio
+    async def test_claims_skip_host_being_claimed_elsewhere(
+        self, test_db, session_factory, test_engine
+    ):
+        """A host whose claim lock another worker holds is skipped; other hosts are not."""
+        if test_engine.dialect.name != "postgresql":
+            pytest.skip("advisory locks need PostgreSQL")
+        devices = [
+            Device(name=f"site-{i}", ip_address=host, api_key_encrypted="x", device_type="UDM")
+            for i, host in enumerate(["10.0.9.1", "10.0.9.2"])
+        ]
+        test_db.add_all(devices)
+        await test_db.commit()
+        await JobQueue.enqueue(test_db, [d.id for d in devices], now=T0)
+        await test_db.commit()
+
+        async with test_engine.connect() as conn, conn.begin():
+            await conn.execute(
+                text("SELECT pg_advisory_xact_lock(:lock_id, hashtext(:host))"),
+                {"lock_id": get_settings().job_claim_lock_id, "host": "10.0.9.1"},
+            )
+            async with session_factory() as db:
+                claimed = await JobQueue.claim(db, "a", 10, now=T0)
+
+        assert [j.device_id for j in claimed] == [devices[1].id]
+
+    @pytest.mark.asyncio
+    async def test_reclaim_fails_lost_attempts_backup(self, test_db, session_factory, test_device):
+        """Reclaiming a lapsed lease fails the Backup row the lost attempt left running."""
+        await JobQueue.enqueue(test_db, [test_device.id], now=T0)
+        await test_db.commit()
+        async with session_factory() as db:
+            (job,) = await JobQueue.claim(db, "a", 1, now=T0)
+        async with session_factory() as db:
+            backup = Backup(
+                device_id=test_device.id,
+                filename="lost.unf",
+                file_path="",
+                file_size=0,
+                backup_type="scheduled",
+                status="running",
+            )
+            db.add(backup)
+            await db.flush()
+            (await db.get(BackupJob, job.id)).backup_id = backup.id
+            await db.commit()
+
+        async with session_factory() as db:
+            (reclaimed,) = await JobQueue.claim(db, "b", 1, now=T0 + timedelta(hours=1))
+
+        assert (reclaimed.locked_by, reclaimed.attempts) == ("b", 2)
+        async with session_factory() as db:
+            lost = await db.get(Backup, backup.id)
+        assert (lost.status, lost.error_message) == ("failed", "Lease expired")
+
+    @pytest.mark.asyncio
+    async def test_heartbeat_extends_lease(self, test_db, session_factory, test_device):
+        """A heartbeating worker keeps its job past the original lease."""
+        await JobQueue.enqueue(test_db, [test_device.id], now=T0)
+        await test_db.commit()
+        async with session_factory() as db:
+            (job,) = await JobQueue.claim(db, "a", 1, now=T0)
+
+        later = T0 + timedelta(minutes=4)
+        async with session_factory() as db:
+            assert await JobQueue.heartbeat(db, job.id, "a", now=later)
+        async with session_factory() as db:
+            assert await JobQueue.claim(db, "b", 1, now=T0 + timedelta(minutes=6)) == []
+
+    @pytest.mark.asyncio
+    async def test_failures_back_off_then_give_up(self, test_db, session_factory, test_device):
+        """Failed attempts are requeued later until max_attempts is reached."""
+        await JobQueue.enqueue(test_db, [test_device.id], now=T0)
+        await test_db.commit()
+
+        now = T0
+        for attempt in range(1, 4):
+            async with session_factory() as db:
+                (job,) = await JobQueue.claim(db, "a", 1, now=now)
+                assert job.attempts == attempt
+                assert await JobQueue.fail(db, job, "a", "boom", now=now)
+            job = await _job(session_factory, job.id)
+            if attempt < 3:
+                assert job.status == "queued"
+                assert job.available_at.replace(tzinfo=UTC) > now
+                now = job.available_at.replace(tzinfo=UTC)
+
+        assert (job.status, job.last_error) == ("failed", "boom")
+
+    def test_retry_delay_grows(self):
+        """Backoff doubles per attempt, stays jittered and capped."""
+        assert timedelta(seconds=15) <= retry_delay(1) <= timedelta(seconds=30)
+        assert timedelta(seconds=60) <= retry_delay(3) <= timedelta(seconds=120)
+        assert retry_delay(30) <= timedelta(hours=1)
+
+
+class TestBackupWorker:
+    """Tests for the worker loop."""
+
+    @pytest.mark.asyncio
+    async def test_runs_and_settles_jobs(self, test_db, session_factory, test_device):
+        """Successful jobs complete; failing ones go back to the queue."""
+        other = Device(
+            name="Other", ip_address="10.0.0.2", api_key_encrypted="x", device_type="UDM"
+        )
+        test_db.add(other)
+        await test_db.commit()
+        await JobQueue.enqueue(test_db, [test_device.id, other.id])
+        await test_db.commit()
+        orchestrator = FakeOrchestrator(session_factory, fail_ids=[other.id])
+        worker = BackupWorker(session_factory, orchestrator, worker_id="w1", concurrency=4)
+
+        assert await worker.poll() == 2
+        await asyncio.gather(*worker._active)
+
+        async with session_factory() as db:
+            jobs = {j.device_id: j for j in (await db.execute(select(BackupJob))).scalars()}
+            backups = {b.device_id: b.id for b in (await db.execute(select(Backup))).scalars()}
+        assert sorted(orchestrator.runs) == sorted([test_device.id, other.id])
+        assert (jobs[test_device.id].status, jobs[test_device.id].backup_id) == (
+            "completed",
+            backups[test_device.id],
+        )
+        assert (jobs[other.id].status, jobs[other.id].last_error) == ("queued", "unreachable")
+
+    @pytest.mark.asyncio
+    async def test_respects_concurrency(self, test_db, session_factory, test_device):
+        """A worker never claims more jobs than it has free slots."""
+        devices = [
+            Device(name=f"d{i}", ip_address=f"10.0.1.{i}", api_key_encrypted="x", device_type="UDM")
+            for i in range(5)
+        ]
+        test_db.add_all(devices)
+        await test_db.commit()
+        await JobQueue.enqueue(test_db, [d.id for d in devices])
+        await test_db.commit()
+        worker = BackupWorker(
+            session_factory, FakeOrchestrator(session_factory), worker_id="w1", concurrency=2
+        )
+
+        assert await worker.poll() == 2
+        assert await worker.poll() == 0
+        await asyncio.gather(*worker._active)
+
+    async def _hanging_worker(self, test_db, session_factory, test_device, tmp_path):
+        await JobQueue.enqueue(test_db, [test_device.id])
+        await test_db.commit()
+        service = HangingBackupService(str(tmp_path))
+        worker = BackupWorker(
+            session_factory, BackupOrchestrator(session_factory, service), worker_id="w1"
+        )
+        assert await worker.poll() == 1
+        await asyncio.wait_for(service.started.wait(), 5)
+        return worker
+
+    async def _backups(self, session_factory):
+        async with session_factory() as db:
+            rows = (await db.execute(select(Backup.status, Backup.error_message))).all()
+        return [tuple(row) for row in rows]
+
+    @pytest.mark.asyncio
+    async def test_shutdown_fails_backup_and_requeues_job(
+        self, test_db, session_factory, test_device, tmp_path
+    ):
+        """Stopping the worker waits for its backups to record the cancellation."""
+        worker = await self._hanging_worker(test_db, session_factory, test_device, tmp_path)
+        (task,) = worker._active
+
+        await worker._shutdown()
+
+        assert task.done()
+        assert await self._backups(session_factory) == [("failed", "Cancelled")]
+        async with session_factory() as db:
+            job = (await db.execute(select(BackupJob))).scalar_one()
+        assert (job.status, job.attempts, job.locked_by) == ("queued", 0, None)
+        assert job.backup_id is not None  # recorded when the attempt created its row
+
+    @pytest.mark.asyncio
+    async def test_abandons_job_when_lease_cannot_be_renewed(
+        self, test_db, session_factory, test_device, tmp_path, monkeypatch
+    ):
+        """Heartbeats failing until the lease would lapse stop the backup."""
+        monkeypatch.setattr(get_settings(), "job_visibility_timeout_seconds", 0.3)
+        monkeypatch.setattr(get_settings(), "job_heartbeat_seconds", 0.1)
+
+        async def unreachable(*args, **kwargs):
+            raise ConnectionError("database unreachable")
+
+        monkeypatch.setattr(JobQueue, "heartbeat", unreachable)
+        worker = await self._hanging_worker(test_db, session_factory, test_device, tmp_path)
+        (task,) = worker._active
+
+        await asyncio.wait_for(task, 2)
+
+        assert await self._backups(session_factory) == [("failed", "Cancelled")]
@@ -0,0 +1,114 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Key Rotation Service Tests
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import pytest
+from sqlalchemy import select
+
+from app import main as main_module
+from app.models.device import Device
+from app.services.crypto_service import CryptoService
+from app.services.key_rotation_service import KeyRotationService
+
+
+async def _add_devices(db, crypto, count):
+    devices = [
+        Device(
+            name=f"device-{i}",
+            ip_address=f"10.0.0.{i}",
+            api_key_encrypted=crypto.encrypt(f"key-{i}"),
+            device_type="UDM-Pro",
+        )
+        for i in range(count)
+    ]
+    db.add_all(devices)
+    await db.commit()
+    return devices
+
+
+class TestKeyRotationService:
+    """Tests for batched re-encryption of device API keys."""
+
+    @pytest.mark.asyncio
+    async def test_reencrypts_all_rows_in_batches(self, test_db, session_factory):
+        """Every row ends up under the new key, across several batches."""
+        old_key, new_key = CryptoService.generate_key(), CryptoService.generate_key()
+        await _add_devices(test_db, CryptoService(old_key, []), 5)
+        rotating = CryptoService(new_key, [old_key])
+
+        rotated = await KeyRotationService.reencrypt_all(session_factory, 2, rotating)
+
+        assert rotated == 5
+        new_only = CryptoService(new_key, [])
+        rows = (await test_db.execute(select(Device.name, Device.api_key_encrypted))).all()
+        assert {name: new_only.decrypt(c) for name, c in rows} == {
+            f"device-{i}": f"key-{i}" for i in range(5)
+        }
+
+    @pytest.mark.asyncio
+    async def test_current_rows_untouched(self, test_db, session_factory):
+        """Rows already under the current key are not rewritten."""
+        key = CryptoService.generate_key()
+        devices = await _add_devices(test_db, CryptoService(key, []), 2)
+        before = [d.api_key_encrypted for d in devices]
+
+        rotated = await KeyRotationService.reencrypt_all(
+            session_factory, 10, CryptoService(key, [])
+        )
+
+        assert rotated == 0
+        rows = (await test_db.execute(select(Device.api_key_encrypted).order_by(Device.id))).all()
+        assert [c for (c,) in rows] == before
+
+    @pytest.mark.asyncio
+    async def test_concurrently_changed_row_skipped(self, test_db):
+        """A row rewritten between read and update keeps the newer value."""
+        old_key, new_key = CryptoService.generate_key(), CryptoService.generate_key()
+        (device,) = await _add_devices(test_db, CryptoService(old_key, []), 1)
+        rotating = CryptoService(new_key, [old_key])
+        replacement = rotating.encrypt("replaced")
+
+        original_rotate = rotating.rotate
+
+        def rotate_after_concurrent_edit(ciphertext):
+            # The edit is flushed after the SELECT and before the UPDATE.
+            device.api_key_encrypted = replacement
+            return original_rotate(ciphertext)
+
+        rotating.rotate = rotate_after_concurrent_edit
+        last_id, _ = await KeyRotationService.reencrypt_batch(test_db, 0, 10, rotating)
+
+        assert last_id == device.id
+        await test_db.refresh(device)
+        assert rotating.decrypt(device.api_key_encrypted) == "replaced"
+
+
+class TestLeaderRotation:
+    """Tests for running the re-encryption pass as a leader duty."""
+
+    @pytest.mark.asyncio
+    async def test_runs_once_per_process_as_leader(self, monkeypatch):
+        """Only the leader re-encrypts, and a finished pass is not repeated."""
+        for name, value in (
+            ("scheduler_enabled", False),
+            ("retention_interval_minutes", 0),
+            ("storage_reconcile_interval_minutes", 0),
+            ("scrub_cron", ""),
+            ("fernet_previous_keys", ["old-key"]),
+        ):
+            monkeypatch.setattr(main_module.settings, name, value)
+        monkeypatch.setattr(main_module, "_keys_rotated", False)
+        calls = []
+
+        async def reencrypt_all():
+            calls.append(1)
+            if len(calls) == 1:
+                raise ConnectionError("database went away")
+            return 0
+
+        monkeypatch.setattr(KeyRotationService, "reencrypt_all", reencrypt_all)
+
+        for _ in range(3):
+            await main_module.leader_duties()
+
+        assert len(calls) == 2  # the failed pass is retried, the finished one is not
@@ -0,0 +1,111 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Leader Election Tests
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+
+from app.services.leader_election import LeaderElector
+
+
+class ScriptedElector(LeaderElector):
+    """Elector whose lock and connection checks follow a script."""
+
+    def __init__(self, target, acquire_results, fail_check_after=None):
+        super().__init__(target, retry_seconds=0.01, check_seconds=0.01, node_id="test")
+        self.acquire_results = list(acquire_results)
+        self.fail_check_after = fail_check_after
+        self.checks = 0
+
+    async def try_acquire(self, conn):
+        return self.acquire_results.pop(0) if self.acquire_results else False
+
+    async def check(self, conn):
+        self.checks += 1
+        if self.fail_check_after is not None and self.checks > self.fail_check_after:
+            raise ConnectionError("lock connection lost")
+
+
+async def _until(predicate, timeout=5.0):
+    async def poll():
+        while not predicate():
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(poll(), timeout)
+
+
+class TestLeaderElector:
+    """Tests for leadership transitions."""
+
+    @pytest.mark.asyncio
+    async def test_leads_when_lock_is_free(self, test_engine):
+        """With nobody else holding the lock the process leads immediately."""
+        elector = LeaderElector(test_engine, node_id="test")
+        started = asyncio.Event()
+
+        async def duties():
+            started.set()
+            await asyncio.Event().wait()
+
+        task = asyncio.create_task(elector.run(duties))
+        await asyncio.wait_for(started.wait(), 5)
+        assert elector.status()["role"] == "leader"
+
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert elector.status()["role"] == "inactive"
+
+    @pytest.mark.asyncio
+    async def test_follower_takes_over_when_lock_frees(self, test_engine):
+        """A follower keeps retrying and leads once the lock is free."""
+        elector = ScriptedElector(test_engine, [False, False, True])
+        runs = []
+
+        async def duties():
+            runs.append(elector.role)
+            await asyncio.Event().wait()
+
+        task = asyncio.create_task(elector.run(duties))
+        try:
+            await _until(lambda: runs)
+        finally:
+            task.cancel()
+
+        assert runs == ["leader"]
+        assert elector.elections == 1
+        assert elector.acquire_results == []
+
+    @pytest.mark.asyncio
+    async def test_lost_connection_stops_duties(self, test_engine):
+        """When the lock connection fails the duties are cancelled."""
+        elector = ScriptedElector(test_engine, [True], fail_check_after=2)
+        cancelled = asyncio.Event()
+
+        async def duties():
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        task = asyncio.create_task(elector.run(duties))
+        try:
+            await asyncio.wait_for(cancelled.wait(), 5)
+            await _until(lambda: elector.role == "follower")
+        finally:
+            task.cancel()
+
+
+class TestHealthStatus:
+    """Tests for the scheduler role in the health output."""
+
+    @pytest.mark.asyncio
+    async def test_health_reports_role(self, async_client: AsyncClient):
+        """The health endpoint says whether this process leads."""
+        response = await async_client.get("/api/health")
+
+        assert response.status_code == 200
+        assert response.json()["scheduler"]["role"] in ("inactive", "follower", "leader")
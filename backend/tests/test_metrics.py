@@ -0,0 +1,117 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Metrics Tests
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+
+from app.metrics import instrument_engine, registry, statement_label
+from app.models.backup import Backup
+from app.models.device import Device
+from app.services.backup_service import BackupService
+from app.services.user_cache import user_cache
+
+
+def _sample(name: str, **labels) -> float:
+    return registry.get_sample_value(name, labels) or 0.0
+
+
+async def _chunks(parts):
+    for part in parts:
+        yield part
+
+
+class TestStatementLabel:
+    """Tests for grouping SQL statements into metric labels."""
+
+    def test_groups_by_verb_and_table(self):
+        """Statements are labelled with their verb and main table."""
+        assert statement_label('SELECT backups.id FROM "backups" WHERE x = 1') == "SELECT backups"
+        assert statement_label("INSERT INTO devices (name) VALUES (?)") == "INSERT devices"
+        assert statement_label("UPDATE users SET is_active = 0") == "UPDATE users"
+        assert statement_label("SELECT 1") == "SELECT"
+
+
+class TestMetricsEndpoint:
+    """Tests for request metrics and the /metrics endpoint."""
+
+    @pytest.mark.asyncio
+    async def test_request_latency_by_route_template(
+        self, async_client: AsyncClient, auth_headers: dict
+    ):
+        """Requests are recorded under their route template, not the raw path."""
+        labels = {"method": "GET", "route": "/api/backups/{backup_id}/download", "status": "404"}
+        before = _sample("http_request_duration_seconds_count", **labels)
+
+        await async_client.get("/api/backups/12345/download", headers=auth_headers)
+
+        assert _sample("http_request_duration_seconds_count", **labels) == before + 1
+
+    @pytest.mark.asyncio
+    async def test_unmatched_paths_share_a_label(self, async_client: AsyncClient):
+        """Unknown paths are grouped together."""
+        labels = {"method": "GET", "route": "<unmatched>", "status": "404"}
+        before = _sample("http_request_duration_seconds_count", **labels)
+
+        await async_client.get("/no/such/path")
+
+        assert _sample("http_request_duration_seconds_count", **labels) == before + 1
+
+    @pytest.mark.asyncio
+    async def test_exposition_format(self, async_client: AsyncClient):
+        """/metrics serves Prometheus text including pool gauges."""
+        response = await async_client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert "http_request_duration_seconds_bucket" in response.text
+        assert "db_pool_checked_out" in response.text
+
+    @pytest.mark.asyncio
+    async def test_user_cache_hits_and_misses(self, async_client: AsyncClient, auth_headers: dict):
+        """Authenticated requests show up as user cache lookups on /metrics."""
+        user_cache.clear()
+
+        await async_client.get("/api/backups", headers=auth_headers)
+        await async_client.get("/api/backups", headers=auth_headers)
+        response = await async_client.get("/metrics")
+
+        assert 'user_cache_misses_total{cache="token"} 1.0' in response.text
+        assert 'user_cache_hits_total{cache="token"} 1.0' in response.text
+        assert 'user_cache_entries{cache="user"} 1.0' in response.text
+
+
+class TestInstrumentation:
+    """Tests for database and backup instrumentation."""
+
+    @pytest.mark.asyncio
+    async def test_query_timings(self, test_engine, test_db, test_device: Device):
+        """Statements on an instrumented engine are timed by verb and table."""
+        instrument_engine(test_engine)
+        before = _sample("db_query_duration_seconds_count", statement="SELECT devices")
+
+        await test_db.execute(select(Device))
+
+        assert _sample("db_query_duration_seconds_count", statement="SELECT devices") == before + 1
+
+    @pytest.mark.asyncio
+    async def test_ingest_counts_bytes_per_device(self, test_db, test_device: Device, tmp_path):
+        """Ingested bytes and throughput are reported per device."""
+        backup = Backup(
+            device_id=test_device.id,
+            filename="b.unf",
+            file_path="",
+            file_size=0,
+            backup_type="manual",
+            status="running",
+        )
+        test_db.add(backup)
+        await test_db.commit()
+        device_id = str(test_device.id)
+        before = _sample("backup_ingested_bytes_total", device_id=device_id)
+
+        await BackupService(str(tmp_path)).ingest(test_db, backup, _chunks([b"a" * 100, b"b" * 50]))
+
+        assert _sample("backup_ingested_bytes_total", device_id=device_id) == before + 150
+        assert _sample("backup_last_throughput_bytes_per_second", device_id=device_id) > 0
@@ -0,0 +1,283 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Backup Progress Tests
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import asyncio
+import json
+from datetime import UTC, datetime
+
+import pytest
+from httpx import AsyncClient
+
+from app.config import get_settings
+from app.models.backup import Backup
+from app.models.device import Device
+from app.routers import backups as backups_module
+from app.routers.backups import _progress_stream
+from app.schemas.backup import BackupProgress
+from app.services import progress
+from app.services.backup_orchestrator import BackupOrchestrator
+from app.services.backup_service import BackupService
+from app.services.crypto_service import crypto_service
+from app.services.progress import BackupProgressTracker, ProgressHub, RunProgressTracker
+
+
+def _event(backup_id, phase="downloading", received=0, device_id=1):
+    return BackupProgress(
+        backup_id=backup_id,
+        device_id=device_id,
+        phase=phase,
+        bytes_received=received,
+        at=datetime.now(UTC),
+    )
+
+
+@pytest.fixture
+def hub():
+    """A fresh process-wide hub for the test."""
+    progress.get_progress_hub.cache_clear()
+    yield progress.get_progress_hub()
+    progress.get_progress_hub.cache_clear()
+
+
+class TestProgressHub:
+    """Tests for fan-out and coalescing."""
+
+    @pytest.mark.asyncio
+    async def test_slow_subscriber_gets_latest_per_backup(self):
+        """Intermediate events collapse into the newest one for each backup."""
+        hub = ProgressHub()
+        with hub.subscribe() as subscription:
+            for received in range(100):
+                hub.publish(_event(1, received=received))
+            hub.publish(_event(2))
+            hub.publish(_event(1, phase="completed", received=100))
+
+            batch = await subscription.next_batch()
+
+        assert [(e.backup_id, e.phase, e.bytes_received) for e in batch] == [
+            (2, "downloading", 0),
+            (1, "completed", 100),
+        ]
+        assert hub.subscriber_count == 0
+
+    @pytest.mark.asyncio
+    async def test_new_subscriber_starts_with_in_flight(self):
+        """Subscribing replays backups still running, not finished ones."""
+        hub = ProgressHub()
+        hub.publish(_event(1))
+        hub.publish(_event(2))
+        hub.publish(_event(2, phase="failed"))
+
+        with hub.subscribe() as subscription:
+            batch = await subscription.next_batch(timeout=0)
+
+        assert [e.backup_id for e in batch] == [1]
+
+    @pytest.mark.asyncio
+    async def test_idle_timeout_returns_empty(self):
+        """With nothing published the wait ends empty after the timeout."""
+        with ProgressHub().subscribe() as subscription:
+            assert await subscription.next_batch(timeout=0.01) == []
+
+    def test_tracker_rate_limits(self, monkeypatch):
+        """Byte updates publish at most once per interval; phases always publish."""
+        monkeypatch.setattr(get_settings(), "progress_interval_seconds", 60)
+        hub = ProgressHub()
+        published = []
+        hub.publish = published.append
+        tracker = BackupProgressTracker(1, 1, hub)
+
+        tracker.phase("downloading")
+        for _ in range(50):
+            tracker.advance(10)
+        tracker.finish("completed")
+
+        assert [e.phase for e in published] == ["downloading", "completed"]
+        assert published[-1].bytes_received == 500
+
+    def test_run_tracker_counts(self):
+        """Run events carry running/completed/failed counts and stored bytes."""
+        hub = ProgressHub()
+        published = []
+        hub.publish = published.append
+        run = RunProgressTracker(2, hub)
+
+        run.started()
+        run.started()
+        run.finished("completed", 10)
+        run.finished("failed")
+        run.close()
+
+        last = published[-1]
+        assert (last.phase, last.total, last.running) == ("completed", 2, 0)
+        assert (last.completed, last.failed, last.bytes_stored) == (1, 1, 10)
+        assert len({e.run_id for e in published}) == 1
+
+
+async def _chunks(parts):
+    for part in parts:
+        yield part
+
+
+class TestIngestProgress:
+    """Tests for progress published by the ingest path and fleet runs."""
+
+    @pytest.mark.asyncio
+    async def test_ingest_publishes_download_and_completion(
+        self, test_db, test_device, tmp_path, hub
+    ):
+        """A backup goes downloading -> completed with its byte count."""
+        backup = Backup(
+            device_id=test_device.id,
+            filename="b.unf",
+            file_path="",
+            file_size=0,
+            backup_type="manual",
+            status="running",
+        )
+        test_db.add(backup)
+        await test_db.commit()
+
+        with hub.subscribe() as subscription:
+            await BackupService(backup_path=str(tmp_path)).ingest(
+                test_db, backup, _chunks([b"a" * 100, b"b" * 50])
+            )
+            batch = await subscription.next_batch(timeout=0)
+
+        assert [(e.phase, e.bytes_received) for e in batch] == [("completed", 150)]
+
+    @pytest.mark.asyncio
+    async def test_cancelled_ingest_leaves_nothing_in_flight(
+        self, test_db, test_device, tmp_path, hub
+    ):
+        """A cancelled download publishes a final failed phase."""
+        backup = Backup(
+            device_id=test_device.id,
+            filename="c.unf",
+            file_path="",
+            file_size=0,
+            backup_type="manual",
+            status="running",
+        )
+        test_db.add(backup)
+        await test_db.commit()
+        started = asyncio.Event()
+
+        async def stalled():
+            yield b"a" * 10
+            started.set()
+            await asyncio.sleep(3600)
+            yield b""
+
+        service = BackupService(backup_path=str(tmp_path))
+        task = asyncio.create_task(service.ingest(test_db, backup, stalled()))
+        await started.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        with hub.subscribe() as subscription:
+            batch = await subscription.next_batch(timeout=0)
+        assert batch == []
+        assert list(tmp_path.rglob("*.part")) == []
+
+    @pytest.mark.asyncio
+    async def test_fleet_run_publishes_aggregate(self, test_db, session_factory, tmp_path, hub):
+        """A fleet run reports its totals and each backup's final status."""
+
+        class FailingService(BackupService):
+            async def run_backup(self, db, device, backup, api_key=None):
+                if device.ip_address == "10.0.0.2":
+                    raise ConnectionError("unreachable")
+                return await self.ingest(db, backup, _chunks([b"x" * 10]))
+
+        test_db.add_all(
+            Device(
+                name=f"d{i}",
+                ip_address=f"10.0.0.{i}",
+                api_key_encrypted=crypto_service.encrypt("key"),
+                device_type="UDM-Pro",
+            )
+            for i in (1, 2)
+        )
+        await test_db.commit()
+
+        with hub.subscribe() as subscription:
+            await BackupOrchestrator(session_factory, FailingService(str(tmp_path))).run()
+            batch = await subscription.next_batch(timeout=0)
+
+        runs = [e for e in batch if not isinstance(e, BackupProgress)]
+        backups = sorted(e.phase for e in batch if isinstance(e, BackupProgress))
+        assert backups == ["completed", "failed"]
+        assert len(runs) == 1
+        assert (runs[0].phase, runs[0].completed, runs[0].failed) == ("completed", 1, 1)
+
+
+class TestEventStream:
+    """Tests for the SSE endpoint."""
+
+    @pytest.mark.asyncio
+    async def test_formats_server_sent_events(self, hub):
+        """Events are framed as SSE and filtered by device."""
+        stream = _progress_stream(device_id=1)
+        assert await anext(stream) == "retry: 3000\n\n"
+
+        hub.publish(_event(5, device_id=2))
+        hub.publish(_event(6, device_id=1, received=42))
+        frame = await anext(stream)
+        await stream.aclose()
+
+        kind, data = frame.strip().split("\n")
+        assert kind == "event: backup"
+        assert json.loads(data.removeprefix("data: "))["bytes_received"] == 42
+        assert hub.subscriber_count == 0
+
+    @pytest.mark.asyncio
+    async def test_requires_authentication(self, async_client: AsyncClient):
+        """Anonymous clients are refused."""
+        response = await async_client.get("/api/backups/events")
+
+        assert response.status_code == 401
+
+    @pytest.fixture
+    def finite_stream(self, monkeypatch):
+        """Replace the endless stream so responses can be read in full."""
+
+        async def one_frame(device_id):
+            yield "retry: 3000\n\n"
+
+        monkeypatch.setattr(backups_module, "_progress_stream", one_frame)
+
+    @pytest.mark.asyncio
+    async def test_connects_with_query_token(
+        self, async_client: AsyncClient, auth_headers: dict, finite_stream
+    ):
+        """EventSource clients authenticate with a short-lived ?token=."""
+        issued = await async_client.post("/api/backups/events/token", headers=auth_headers)
+        token = issued.json()["token"]
+
+        response = await async_client.get("/api/backups/events", params={"token": token})
+
+        assert issued.status_code == 200
+        assert issued.json()["expires_in"] == get_settings().events_token_expire_seconds
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert response.text == "retry: 3000\n\n"
+
+    @pytest.mark.asyncio
+    async def test_tokens_are_not_interchangeable(
+        self, async_client: AsyncClient, auth_headers: dict, finite_stream
+    ):
+        """Access tokens don't work in the query string; stream tokens work nowhere else."""
+        access_token = auth_headers["Authorization"].removeprefix("Bearer ")
+        issued = await async_client.post("/api/backups/events/token", headers=auth_headers)
+        stream_token = issued.json()["token"]
+
+        in_query = await async_client.get("/api/backups/events", params={"token": access_token})
+        as_bearer = await async_client.get(
+            "/api/backups", headers={"Authorization": f"Bearer {stream_token}"}
+        )
+
+        assert in_query.status_code == 401
+        assert as_bearer.status_code == 401
@@ -0,0 +1,115 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Relationship Loading Tests
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import pytest
+from httpx import AsyncClient
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.orm import selectinload
+
+from app.models.backup import Backup
+from app.models.device import Device
+from app.models.schedule import Schedule
+from app.schemas.backup import Backup as BackupSchema
+from app.schemas.schedule import Schedule as ScheduleSchema
+from app.services.backup_query_service import BackupQueryService
+
+
+@pytest.fixture
+async def fleet(test_db):
+    """Three devices, each with two backups and a schedule."""
+    devices = [
+        Device(
+            name=f"site-{i}",
+            ip_address=f"10.0.2.{i}",
+            api_key_encrypted="k",
+            device_type="UDM-Pro",
+        )
+        for i in range(3)
+    ]
+    test_db.add_all(devices)
+    await test_db.flush()
+    for device in devices:
+        test_db.add(
+            Schedule(device_id=device.id, name="nightly", interval_hours=24, retention_days=7)
+        )
+        for n in range(2):
+            test_db.add(
+                Backup(
+                    device_id=device.id,
+                    filename=f"{device.name}-{n}.unf",
+                    file_path="",
+                    file_size=n,
+                    backup_type="scheduled",
+                    status="completed",
+                )
+            )
+    await test_db.commit()
+    test_db.expire_all()
+    return devices
+
+
+class TestLazyLoadingRaises:
+    """Relationships must be loaded in the query that fetches the rows."""
+
+    @pytest.mark.asyncio
+    async def test_unloaded_device_raises(self, test_db, fleet):
+        """Touching an unloaded relationship fails instead of issuing a query."""
+        backup = (await test_db.execute(select(Backup).limit(1))).scalar_one()
+
+        with pytest.raises(InvalidRequestError):
+            backup.device  # noqa: B018
+        with pytest.raises(ValidationError):
+            BackupSchema.model_validate(backup)
+
+    @pytest.mark.asyncio
+    async def test_unloaded_collection_raises(self, test_db, fleet):
+        """Collections on Device raise as well."""
+        device = (await test_db.execute(select(Device).limit(1))).scalar_one()
+
+        with pytest.raises(InvalidRequestError):
+            device.backups  # noqa: B018
+
+
+class TestEagerDeviceName:
+    """Device names arrive with the rows, whatever the row count."""
+
+    @pytest.mark.asyncio
+    async def test_backup_page_is_one_query(self, test_db, fleet, assert_queries):
+        """A page of backups and their device names is a single joined query."""
+        with assert_queries(1):
+            rows, _ = await BackupQueryService.list_page_rows(test_db, 50)
+        names = {row["device_name"] for row in rows}
+
+        assert len(rows) == 6
+        assert names == {"site-0", "site-1", "site-2"}
+
+    @pytest.mark.asyncio
+    async def test_schedules_selectinload(self, test_db, fleet, assert_queries):
+        """Schedules load their devices with one extra IN query."""
+        with assert_queries(2):
+            schedules = (
+                (await test_db.execute(select(Schedule).options(selectinload(Schedule.device))))
+                .scalars()
+                .all()
+            )
+        with assert_queries(0):
+            names = sorted(ScheduleSchema.model_validate(s).device_name for s in schedules)
+
+        assert names == ["site-0", "site-1", "site-2"]
+
+    @pytest.mark.asyncio
+    async def test_list_endpoint_query_count_is_flat(
+        self, async_client: AsyncClient, auth_headers, fleet, assert_queries
+    ):
+        """Listing backups costs the same number of queries for any page size."""
+        await async_client.get("/api/backups", headers=auth_headers)  # warm the user cache
+
+        for page_size in (1, 6):
+            with assert_queries(1):
+                response = await async_client.get(
+                    "/api/backups", params={"page_size": page_size}, headers=auth_headers
+                )
+            assert len(response.json()["items"]) == page_size
@@ -0,0 +1,247 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Retention Service Tests
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import func, select
+
+from app.config import get_settings
+from app.models.backup import Backup
+from app.models.backup_rollup import BackupCountBucket
+from app.models.device import Device
+from app.models.schedule import Schedule
+from app.models.storage_counter import DeviceStorageCounter
+from app.services.leader_election import advisory_lock
+from app.services.retention_service import (
+    BackupRef,
+    RetentionPolicy,
+    RetentionService,
+    select_expired,
+)
+
+NOW = datetime(2024, 6, 30, 12, 0, tzinfo=UTC)
+
+
+def _daily_refs(days, status="completed"):
+    """One backup per day at noon, newest first, ids counting up from the newest."""
+    return [BackupRef(i, NOW - timedelta(days=i), status, f"/b/{i}.unf", 10) for i in range(days)]
+
+
+def _kept_ids(refs, policy):
+    expired = {b.id for b in select_expired(refs, policy, NOW)}
+    return sorted(b.id for b in refs if b.id not in expired)
+
+
+class TestSelectExpired:
+    """Tests for the grandfather-father-son keep rules."""
+
+    def test_age_limit(self):
+        """Only backups within retention_days are kept without GFS slots."""
+        assert _kept_ids(_daily_refs(30), RetentionPolicy(days=7)) == list(range(8))
+
+    def test_gfs_slots_extend_retention(self):
+        """Weekly and monthly slots keep the newest backup of older periods."""
+        policy = RetentionPolicy(days=3, keep_daily=5, keep_weekly=3, keep_monthly=3)
+
+        kept = _kept_ids(_daily_refs(90), policy)
+
+        # 4 within the age limit, 5 daily, the newest of 3 ISO weeks
+        # (Sun 30 Jun, Sun 23 Jun, Sun 16 Jun) and of 3 months (30 Jun, 31 May, 30 Apr).
+        assert kept == [0, 1, 2, 3, 4, 7, 14, 30, 61]
+
+    def test_newest_completed_always_kept(self):
+        """A device whose only backups are old keeps its newest completed one."""
+        refs = [
+            BackupRef(1, NOW - timedelta(days=40), "failed", "", 0),
+            BackupRef(2, NOW - timedelta(days=50), "completed", "/b/2.unf", 10),
+            BackupRef(3, NOW - timedelta(days=60), "completed", "/b/3.unf", 10),
+        ]
+
+        assert _kept_ids(refs, RetentionPolicy(days=7)) == [2]
+
+    def test_in_progress_never_expires(self):
+        """Pending and running backups are kept regardless of age."""
+        refs = [
+            BackupRef(1, NOW, "completed", "/b/1.unf", 10),
+            BackupRef(2, NOW - timedelta(days=90), "running", "", 0),
+            BackupRef(3, NOW - timedelta(days=91), "pending", "", 0),
+        ]
+
+        assert _kept_ids(refs, RetentionPolicy(days=1)) == [1, 2, 3]
+
+
+@pytest.fixture
+def backup_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(get_settings(), "backup_path", str(tmp_path))
+    return tmp_path
+
+
+async def _add_daily_backups(db, device, root, days):
+    backups = []
+    for i in range(days):
+        path = root / str(device.id) / f"b{i}.unf"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x" * 10)
+        backups.append(
+            Backup(
+                device_id=device.id,
+                filename=path.name,
+                file_path=str(path),
+                file_size=10,
+                backup_type="scheduled",
+                status="completed",
+                created_at=NOW - timedelta(days=i),
+            )
+        )
+    db.add_all(backups)
+    await db.commit()
+    return backups
+
+
+async def _add_schedule(db, device, **policy):
+    db.add(Schedule(device_id=device.id, name="nightly", interval_hours=24, **policy))
+    await db.commit()
+
+
+class TestRetentionService:
+    """Tests for batched pruning against the database and disk."""
+
+    @pytest.mark.asyncio
+    async def test_prunes_in_batches(self, test_db, session_factory, test_device, backup_root):
+        """Expired rows and files are removed and counters stay consistent."""
+        await _add_schedule(test_db, test_device, retention_days=3)
+        backups = await _add_daily_backups(test_db, test_device, backup_root, 10)
+
+        summary = await RetentionService.prune(session_factory, now=NOW, batch_size=3)
+
+        assert summary.deleted == 6
+        assert summary.bytes_freed == 60
+        remaining = (await test_db.execute(select(Backup.id))).scalars().all()
+        assert sorted(remaining) == sorted(b.id for b in backups[:4])
+        assert sorted(p.name for p in (backup_root / str(test_device.id)).iterdir()) == [
+            f"b{i}.unf" for i in range(4)
+        ]
+        counter = await test_db.get(DeviceStorageCounter, test_device.id)
+        await test_db.refresh(counter)
+        assert (counter.backup_count, counter.total_size) == (4, 40)
+
+    @pytest.mark.asyncio
+    async def test_counts_only_rows_it_deleted(
+        self, test_db, session_factory, test_device, backup_root, monkeypatch
+    ):
+        """A row removed by someone else mid-run is not counted or freed again."""
+        await _add_schedule(test_db, test_device, retention_days=3)
+        backups = await _add_daily_backups(test_db, test_device, backup_root, 10)
+        stolen = backups[-1].id
+        delete_expired = RetentionService._delete
+
+        async def racing_delete(db, device_id, expired):
+            async with session_factory() as other:
+                await other.delete(await other.get(Backup, stolen))
+                await other.commit()
+            return await delete_expired(db, device_id, expired)
+
+        monkeypatch.setattr(RetentionService, "_delete", racing_delete)
+        summary = await RetentionService.prune(session_factory, now=NOW)
+
+        assert (summary.deleted, summary.bytes_freed) == (5, 50)
+        assert summary.devices[0].deleted == 5
+        counter = await test_db.get(DeviceStorageCounter, test_device.id)
+        await test_db.refresh(counter)
+        assert (counter.backup_count, counter.total_size) == (4, 40)
+        counted = await test_db.scalar(select(func.sum(BackupCountBucket.count)))
+        assert counted == 4
+
+    @pytest.mark.asyncio
+    async def test_dry_run_changes_nothing(
+        self, test_db, session_factory, test_device, backup_root
+    ):
+        """A dry run reports what would be freed without deleting."""
+        await _add_schedule(test_db, test_device, retention_days=3)
+        await _add_daily_backups(test_db, test_device, backup_root, 10)
+
+        summary = await RetentionService.prune(session_factory, dry_run=True, now=NOW)
+
+        assert (summary.deleted, summary.bytes_freed) == (6, 60)
+        assert len((await test_db.execute(select(Backup.id))).all()) == 10
+        assert len(list((backup_root / str(test_device.id)).iterdir())) == 10
+
+    @pytest.mark.asyncio
+    async def test_most_generous_schedule_wins(
+        self, test_db, session_factory, test_device, backup_root
+    ):
+        """With several schedules, each limit is the largest configured."""
+        await _add_schedule(test_db, test_device, retention_days=3)
+        await _add_schedule(test_db, test_device, retention_days=1, keep_weekly=2)
+        await _add_daily_backups(test_db, test_device, backup_root, 10)
+
+        summary = await RetentionService.prune(session_factory, dry_run=True, now=NOW)
+
+        # Days 0-3 by age, plus the newest backup of the previous ISO week (day 7).
+        assert summary.deleted == 5
+
+    @pytest.mark.asyncio
+    async def test_devices_without_schedules_untouched(
+        self, test_db, session_factory, test_device: Device, backup_root
+    ):
+        """Devices without a schedule are skipped unless a default is configured."""
+        await _add_daily_backups(test_db, test_device, backup_root, 10)
+
+        summary = await RetentionService.prune(session_factory, now=NOW)
+
+        assert summary.deleted == 0
+
+
+class TestPruneEndpoint:
+    """Tests for the prune endpoint."""
+
+    @pytest.mark.asyncio
+    async def test_defaults_to_dry_run(self, async_client: AsyncClient, admin_auth_headers):
+        """The endpoint only reports unless dry_run=false is passed."""
+        response = await async_client.post("/api/backups/prune", headers=admin_auth_headers)
+
+        assert response.status_code == 200
+        assert response.json()["dry_run"] is True
+
+    @pytest.mark.asyncio
+    async def test_requires_admin(self, async_client: AsyncClient, auth_headers):
+        """Non-admin users are refused."""
+        response = await async_client.post("/api/backups/prune", headers=auth_headers)
+
+        assert response.status_code == 403
+
+    @pytest.mark.asyncio
+    async def test_prunes_through_request_database(
+        self, async_client: AsyncClient, admin_auth_headers, test_db, test_device, backup_root
+    ):
+        """dry_run=false deletes in the database the request's session uses."""
+        await _add_schedule(test_db, test_device, retention_days=3)
+        await _add_daily_backups(test_db, test_device, backup_root, 5)
+
+        response = await async_client.post(
+            "/api/backups/prune", params={"dry_run": "false"}, headers=admin_auth_headers
+        )
+
+        assert response.status_code == 200
+        assert response.json()["deleted"] == 4  # all old; only the newest completed stays
+        assert len((await test_db.execute(select(Backup.id))).all()) == 1
+
+    @pytest.mark.asyncio
+    async def test_conflict_while_another_process_prunes(
+        self, async_client: AsyncClient, admin_auth_headers, test_engine
+    ):
+        """A real prune is refused while another process holds the retention lock."""
+        if test_engine.dialect.name != "postgresql":
+            pytest.skip("advisory locks need PostgreSQL")
+
+        async with advisory_lock(test_engine, get_settings().retention_lock_id):
+            response = await async_client.post(
+                "/api/backups/prune", params={"dry_run": "false"}, headers=admin_auth_headers
+            )
+            dry_run = await async_client.post("/api/backups/prune", headers=admin_auth_headers)
+
+        assert response.status_code == 409
+        assert dry_run.status_code == 200
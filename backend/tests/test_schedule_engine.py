@@ -0,0 +1,204 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Schedule Engine Tests
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import asyncio
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from pydantic import ValidationError
+from sqlalchemy import delete, insert, select, update
+
+from app.models.backup_job import BackupJob
+from app.models.schedule import Schedule
+from app.schemas.schedule import ScheduleCreate
+from app.services.schedule_engine import (
+    ScheduleEngine,
+    ScheduleHeap,
+    SchedulePlan,
+    compile_cron,
+    device_jitter,
+)
+
+T0 = datetime(2024, 6, 30, 1, 0, tzinfo=UTC)
+
+
+class TestJitter:
+    """Tests for per-device load spreading."""
+
+    def test_deterministic_and_bounded(self):
+        """The same device always gets the same offset inside the window."""
+        offsets = [device_jitter(device_id, 900) for device_id in range(500)]
+
+        assert offsets == [device_jitter(device_id, 900) for device_id in range(500)]
+        assert all(timedelta(0) <= o < timedelta(seconds=900) for o in offsets)
+        # 500 devices spread over 15 minutes: no minute gets much more than its share.
+        per_minute = [sum(1 for o in offsets if o // timedelta(minutes=1) == m) for m in range(15)]
+        assert max(per_minute) < 60
+
+    def test_zero_window(self):
+        """Jitter can be disabled."""
+        assert device_jitter(7, 0) == timedelta(0)
+
+
+class TestSchedulePlan:
+    """Tests for next-run computation."""
+
+    def test_cron_is_compiled_once(self):
+        """Schedules sharing an expression share one trigger."""
+        assert compile_cron("0 2 * * *") is compile_cron("0 2 * * *")
+
+    def test_invalid_cron_rejected_by_schema(self):
+        """Bad expressions are refused before they reach the engine."""
+        with pytest.raises(ValidationError):
+            ScheduleCreate(device_id=1, name="bad", cron_expression="61 2 * * *")
+
+    def test_cron_next_run_includes_jitter(self):
+        """The jittered run time is strictly after the reference time."""
+        plan = SchedulePlan(1, timedelta(seconds=90), cron=compile_cron("0 2 * * *"))
+
+        first = plan.next_run(T0)
+        assert first == datetime(2024, 6, 30, 2, 1, 30, tzinfo=UTC)
+        assert plan.next_run(first) == first + timedelta(days=1)
+
+    def test_interval_follows_last_run(self):
+        """Interval schedules run interval after the last run, or soon if overdue."""
+        plan = SchedulePlan(1, timedelta(minutes=5), interval=timedelta(hours=6))
+
+        assert plan.next_run(T0, T0 - timedelta(hours=1)) == T0 + timedelta(hours=5)
+        assert plan.next_run(T0, T0 - timedelta(days=1)) == T0 + timedelta(minutes=5)
+        assert plan.next_run(T0) == T0 + timedelta(minutes=5)
+
+
+class TestScheduleHeap:
+    """Tests for the re-keyable min-heap."""
+
+    def test_rekey_moves_entry(self):
+        """Pushing an existing schedule replaces its old due time."""
+        heap = ScheduleHeap()
+        heap.push(1, T0)
+        heap.push(2, T0 + timedelta(minutes=1))
+        heap.push(1, T0 + timedelta(minutes=2))
+
+        assert len(heap) == 2
+        assert heap.pop_due(T0 + timedelta(minutes=1)) == [2]
+        assert heap.pop_due(T0 + timedelta(minutes=5)) == [1]
+        assert heap.peek() is None
+
+    def test_remove(self):
+        """Removed schedules never come due."""
+        heap = ScheduleHeap()
+        heap.push(1, T0)
+        heap.remove(1)
+
+        assert heap.pop_due(T0 + timedelta(days=1)) == []
+
+
+async def _until(predicate, timeout=5.0):
+    async def poll():
+        while not predicate():
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(poll(), timeout)
+
+
+async def _add_schedule(db, device, **fields):
+    schedule = Schedule(device_id=device.id, name="nightly", **fields)
+    db.add(schedule)
+    await db.commit()
+    return schedule
+
+
+class TestScheduleEngine:
+    """Tests for the engine against the database."""
+
+    @pytest.mark.asyncio
+    async def test_fires_overdue_schedule(self, test_db, session_factory, test_device):
+        """An overdue schedule queues one job and is re-keyed to its next run."""
+        overdue = datetime.now(UTC) - timedelta(minutes=1)
+        schedule = await _add_schedule(test_db, test_device, interval_hours=6, next_run=overdue)
+        engine = ScheduleEngine(session_factory, jitter_seconds=0)
+
+        task = asyncio.create_task(engine.run())
+        try:
+            await _until(lambda: engine.heap.peek() and engine.heap.peek()[0] > overdue)
+        finally:
+            task.cancel()
+
+        jobs = (await test_db.execute(select(BackupJob))).scalars().all()
+        assert [(j.device_id, j.backup_type, j.status) for j in jobs] == [
+            (test_device.id, "scheduled", "queued")
+        ]
+        await test_db.refresh(schedule)
+        assert schedule.last_run is not None
+        assert schedule.next_run.replace(tzinfo=UTC) > datetime.now(UTC) + timedelta(hours=5)
+        assert engine.heap.peek()[1] == schedule.id
+
+    @pytest.mark.asyncio
+    async def test_new_schedule_gets_next_run(self, test_db, session_factory, test_device):
+        """Loading computes and stores next_run for schedules that have none."""
+        schedule = await _add_schedule(test_db, test_device, cron_expression="0 2 * * *")
+        engine = ScheduleEngine(session_factory, jitter_seconds=600)
+
+        await engine.load()
+
+        await test_db.refresh(schedule)
+        assert schedule.next_run is not None
+        assert engine.heap.peek() == (schedule.next_run.replace(tzinfo=UTC), schedule.id)
+
+    @pytest.mark.asyncio
+    async def test_committed_edit_rekeys(self, test_db, session_factory, test_device):
+        """Editing a schedule re-keys it; disabling drops it from the heap."""
+        schedule = await _add_schedule(test_db, test_device, cron_expression="0 2 * * *")
+        engine = ScheduleEngine(session_factory, jitter_seconds=0)
+        task = asyncio.create_task(engine.run())
+        try:
+            await _until(lambda: schedule.id in engine.heap)
+            before = engine.heap.peek()[0]
+
+            schedule.cron_expression = "30 3 * * *"
+            await test_db.commit()
+            await _until(lambda: engine.heap.peek()[0] != before)
+            assert engine.heap.peek()[0].time().isoformat() == "03:30:00"
+
+            schedule.is_enabled = False
+            await test_db.commit()
+            await _until(lambda: schedule.id not in engine.heap)
+        finally:
+            task.cancel()
+
+    @pytest.mark.asyncio
+    async def test_resyncs_edits_from_other_processes(self, test_db, session_factory, test_device):
+        """Core writes skip the session hooks, like edits made on another replica."""
+        engine = ScheduleEngine(session_factory, jitter_seconds=0, resync_seconds=0.05)
+        task = asyncio.create_task(engine.run())
+        try:
+            await _until(lambda: engine._seen is not None)  # loaded with nothing due
+
+            # Explicit updated_at: SQLite's now() only has one-second resolution.
+            later = datetime.now(UTC) + timedelta(seconds=1)
+            await test_db.execute(
+                insert(Schedule).values(
+                    device_id=test_device.id,
+                    name="nightly",
+                    cron_expression="0 2 * * *",
+                    updated_at=later,
+                )
+            )
+            await test_db.commit()
+            await _until(lambda: len(engine.heap) == 1)
+            schedule_id = engine.heap.peek()[1]
+
+            await test_db.execute(
+                update(Schedule)
+                .where(Schedule.id == schedule_id)
+                .values(cron_expression="30 3 * * *", updated_at=later + timedelta(seconds=1))
+            )
+            await test_db.commit()
+            await _until(lambda: engine.heap.peek()[0].time().isoformat() == "03:30:00")
+
+            await test_db.execute(delete(Schedule).where(Schedule.id == schedule_id))
+            await test_db.commit()
+            await _until(lambda: len(engine.heap) == 0)
+        finally:
+            task.cancel()
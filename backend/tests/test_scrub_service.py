@@ -0,0 +1,215 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Integrity Scrubber Tests
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import asyncio
+import hashlib
+import itertools
+import os
+import time
+from contextlib import suppress
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+
+from app.config import get_settings
+from app.models.backup import Backup
+from app.services import schedule_engine
+from app.services.backup_service import BackupService
+from app.services.leader_election import advisory_lock
+from app.services.scrub_service import Scrubber, _Meter
+
+PAYLOAD = os.urandom(300_000)
+_names = itertools.count()
+
+
+async def _chunks(data, size=50_000):
+    for i in range(0, len(data), size):
+        yield data[i : i + size]
+
+
+@pytest.fixture
+def backup_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(get_settings(), "backup_path", str(tmp_path))
+    return tmp_path
+
+
+async def _stored_backup(db, device, root, **service_options):
+    backup = Backup(
+        device_id=device.id,
+        filename=f"backup_{next(_names)}.unf",
+        file_path="",
+        file_size=0,
+        backup_type="scheduled",
+        status="running",
+    )
+    db.add(backup)
+    await db.commit()
+    service = BackupService(backup_path=str(root), **service_options)
+    return await service.ingest(db, backup, _chunks(PAYLOAD))
+
+
+async def _integrity(db):
+    rows = await db.execute(select(Backup.id, Backup.integrity).order_by(Backup.id))
+    return dict(rows.all())
+
+
+class TestScrubber:
+    """Tests for verifying stored backups."""
+
+    @pytest.mark.asyncio
+    async def test_flags_corrupt_and_missing_files(
+        self, test_db, session_factory, test_device, backup_root
+    ):
+        """Intact files pass; flipped bytes and deleted files are recorded."""
+        intact = await _stored_backup(test_db, test_device, backup_root)
+        corrupt = await _stored_backup(test_db, test_device, backup_root)
+        missing = await _stored_backup(test_db, test_device, backup_root)
+        with open(corrupt.file_path, "r+b") as fh:
+            fh.seek(1000)
+            fh.write(b"\x00\xff")
+        os.unlink(missing.file_path)
+
+        progress = await Scrubber(session_factory, workers=2, bandwidth=0).run()
+
+        assert (progress.total, progress.checked) == (3, 3)
+        assert (progress.corrupt, progress.missing) == (1, 1)
+        assert progress.bytes_read == 2 * len(PAYLOAD)
+        assert not progress.running
+        assert await _integrity(test_db) == {
+            intact.id: "ok",
+            corrupt.id: "corrupt",
+            missing.id: "missing",
+        }
+
+    @pytest.mark.asyncio
+    async def test_checks_compressed_and_chunked_layouts(
+        self, test_db, session_factory, test_device, backup_root
+    ):
+        """zstd and deduplicated backups are verified against the plain checksum."""
+        zstd = await _stored_backup(test_db, test_device, backup_root, compression="zstd")
+        chunked = await _stored_backup(test_db, test_device, backup_root, dedup=True)
+        assert zstd.checksum == chunked.checksum == hashlib.sha256(PAYLOAD).hexdigest()
+
+        progress = await Scrubber(session_factory, workers=1, bandwidth=0).run()
+
+        assert progress.checked == 2
+        assert await _integrity(test_db) == {zstd.id: "ok", chunked.id: "ok"}
+
+    @pytest.mark.asyncio
+    async def test_recently_verified_are_skipped(
+        self, test_db, session_factory, test_device, backup_root
+    ):
+        """A second run only picks up backups verified longer than max age ago."""
+        await _stored_backup(test_db, test_device, backup_root)
+        scrubber = Scrubber(session_factory, workers=1, bandwidth=0)
+        await scrubber.run()
+
+        progress = await scrubber.run()
+
+        assert progress.total == progress.checked == 0
+
+    @pytest.mark.asyncio
+    async def test_deadline_stops_between_batches(
+        self, test_db, session_factory, test_device, backup_root
+    ):
+        """A run past its deadline stops and leaves the rest for the next run."""
+        for _ in range(3):
+            await _stored_backup(test_db, test_device, backup_root)
+        scrubber = Scrubber(session_factory, workers=1, bandwidth=0, batch_size=1)
+
+        progress = await scrubber.run(deadline=time.monotonic())
+
+        assert (progress.total, progress.checked) == (3, 0)
+        assert set((await _integrity(test_db)).values()) == {None}
+
+    @pytest.mark.asyncio
+    async def test_skips_while_another_process_scrubs(
+        self, test_db, test_engine, session_factory, test_device, backup_root
+    ):
+        """A run does nothing while another process holds the scrub lock."""
+        if test_engine.dialect.name != "postgresql":
+            pytest.skip("advisory locks need PostgreSQL")
+        await _stored_backup(test_db, test_device, backup_root)
+
+        async with advisory_lock(test_engine, get_settings().scrub_lock_id) as acquired:
+            assert acquired
+            progress = await Scrubber(session_factory, workers=1, bandwidth=0).run()
+
+        assert progress is None
+        assert set((await _integrity(test_db)).values()) == {None}
+
+    @pytest.mark.asyncio
+    async def test_scheduled_run_joins_manual_run(self, session_factory, monkeypatch):
+        """A scheduled run while a manual one is going waits for it instead of doubling up."""
+        calls = []
+
+        class GatedScrubber(Scrubber):
+            async def run(self, device_ids=None, **kwargs):
+                calls.append(device_ids)
+                await asyncio.Event().wait()
+
+        class AlwaysDue:
+            def get_next_fire_time(self, previous, now):
+                return now
+
+        monkeypatch.setattr(schedule_engine, "compile_cron", lambda *args: AlwaysDue())
+        scrubber = GatedScrubber(session_factory)
+        scrubber.start([1])
+        cron = asyncio.create_task(scrubber.run_forever())
+        await asyncio.sleep(0.05)
+
+        assert calls == [[1]]
+        assert scrubber.running
+        cron.cancel()
+        with suppress(asyncio.CancelledError):
+            await cron
+        assert not scrubber.running
+
+
+class TestMeter:
+    """Tests for the per-worker read rate cap."""
+
+    def test_throttles_to_rate(self):
+        """Reading past the budget sleeps until the rate is respected."""
+        meter = _Meter(rate=1_000_000)
+        start = time.monotonic()
+
+        meter.consume(150_000)
+        meter.consume(150_000)
+
+        assert time.monotonic() - start >= 0.29
+        assert meter.total == 300_000
+
+
+class TestScrubEndpoints:
+    """Tests for the scrub status and trigger endpoints."""
+
+    @pytest.mark.asyncio
+    async def test_status_lists_devices(
+        self, async_client: AsyncClient, auth_headers, test_db, test_device, backup_root
+    ):
+        """Each device reports verified and unverified backup counts."""
+        await _stored_backup(test_db, test_device, backup_root)
+
+        response = await async_client.get("/api/backups/scrub", headers=auth_headers)
+
+        assert response.status_code == 200
+        assert response.json()["devices"] == [
+            {
+                "device_id": test_device.id,
+                "last_verified_at": None,
+                "verified": 0,
+                "unverified": 1,
+                "corrupt": 0,
+                "missing": 0,
+            }
+        ]
+
+    @pytest.mark.asyncio
+    async def test_start_requires_admin(self, async_client: AsyncClient, auth_headers):
+        """Non-admin users cannot start a scrub."""
+        response = await async_client.post("/api/backups/scrub", headers=auth_headers)
+
+        assert response.status_code == 403
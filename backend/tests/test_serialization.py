@@ -0,0 +1,134 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - List Serialization Tests
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import json
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from httpx import AsyncClient
+from pydantic import TypeAdapter
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+
+from app.models.backup import Backup
+from app.models.device import Device
+from app.responses import ORJSONResponse
+from app.schemas.backup import Backup as BackupSchema
+from app.schemas.backup import BackupRow, backup_rows
+from app.services.backup_query_service import BackupQueryService
+from tests.bench.serialization import run_benchmark
+
+
+@pytest.fixture
+async def backups(test_db, test_device: Device):
+    """A completed and a failed backup with populated optional fields."""
+    started = datetime(2024, 5, 1, 3, 0, 0, 123456, tzinfo=UTC)
+    rows = [
+        Backup(
+            device_id=test_device.id,
+            filename="ok.unf",
+            file_path="/backups/ok.unf",
+            file_size=1234,
+            checksum="a" * 64,
+            compression="zstd",
+            compressed_size=600,
+            backup_type="scheduled",
+            status="completed",
+            started_at=started,
+            completed_at=started + timedelta(seconds=5),
+            created_at=started,
+        ),
+        Backup(
+            device_id=test_device.id,
+            filename="bad.unf",
+            file_path="",
+            file_size=0,
+            backup_type="manual",
+            status="failed",
+            error_message="unreachable",
+            created_at=started + timedelta(hours=1),
+        ),
+    ]
+    test_db.add_all(rows)
+    await test_db.commit()
+    return rows
+
+
+class TestFastListPath:
+    """Tests that the Core row path matches the schema it stands in for."""
+
+    def test_row_shape_matches_schema(self):
+        """BackupRow carries exactly the Backup schema's fields."""
+        assert list(BackupRow.__annotations__) == list(BackupSchema.model_fields)
+
+    def test_utc_datetimes_render_like_pydantic(self):
+        """orjson output for UTC datetimes matches Pydantic's JSON."""
+        at = datetime(2024, 5, 1, 3, 0, 0, 123456, tzinfo=UTC)
+
+        body = ORJSONResponse({"at": at}).body
+
+        assert body == b'{"at":' + TypeAdapter(datetime).dump_json(at) + b"}"
+
+    @pytest.mark.asyncio
+    async def test_rows_serialize_like_orm_models(self, test_db, test_device, backups):
+        """Row JSON equals model JSON, device name included."""
+        device_name = test_device.name
+        test_db.expire_all()  # compare against values read back, not the ones inserted
+        rows, _ = await BackupQueryService.list_page_rows(test_db, 10)
+        instances = (
+            await test_db.execute(
+                select(Backup)
+                .options(joinedload(Backup.device).load_only(Device.name))
+                .order_by(Backup.created_at.desc(), Backup.id.desc())
+            )
+        ).scalars()
+
+        fast = json.loads(ORJSONResponse(backup_rows.validate_python(rows)).body)
+        slow = [BackupSchema.model_validate(b).model_dump(mode="json") for b in instances]
+
+        assert fast == slow
+        assert [row["device_name"] for row in fast] == [device_name] * 2
+
+    @pytest.mark.asyncio
+    async def test_list_endpoint_pages_rows(
+        self, async_client: AsyncClient, auth_headers, test_device, backups
+    ):
+        """The list endpoint keeps its shape and cursor, now with device names."""
+        first = await async_client.get(
+            "/api/backups", params={"page_size": 1}, headers=auth_headers
+        )
+        body = first.json()
+        second = await async_client.get(
+            "/api/backups",
+            params={"page_size": 1, "cursor": body["next_cursor"]},
+            headers=auth_headers,
+        )
+
+        assert first.status_code == second.status_code == 200
+        assert [item["filename"] for item in body["items"]] == ["bad.unf"]
+        assert body["items"][0]["device_name"] == test_device.name
+        assert [item["filename"] for item in second.json()["items"]] == ["ok.unf"]
+        assert second.json()["next_cursor"] is None
+
+    @pytest.mark.asyncio
+    async def test_by_date_endpoint(
+        self, async_client: AsyncClient, auth_headers, test_device, backups
+    ):
+        """Day listings come back as rows too."""
+        response = await async_client.get("/api/backups/by-date/2024-05-01", headers=auth_headers)
+
+        assert response.status_code == 200
+        assert [item["filename"] for item in response.json()] == ["bad.unf", "ok.unf"]
+
+
+class TestBenchmark:
+    """Smoke test for the serialization benchmark."""
+
+    @pytest.mark.asyncio
+    async def test_reports_both_paths(self):
+        """Both paths produce a positive rows-per-second figure."""
+        rates = await run_benchmark(rows=20, repeat=1)
+
+        assert set(rates) == {"orm", "rows"}
+        assert all(rate > 0 for rate in rates.values())
@@ -0,0 +1,177 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Startup Routine Tests
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import asyncio
+import json
+
+import pytest
+from sqlalchemy import inspect, select, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app import startup as startup_module
+from app.config import get_settings
+from app.init_admin import ensure_admin
+from app.models.settings import SystemSettings
+from app.models.user import User
+from app.services.leader_election import advisory_lock
+from app.startup import (
+    SCHEMA_VERSION_KEY,
+    bootstrap_admin,
+    ensure_schema,
+    schema_fingerprint,
+    startup,
+    wait_for_db,
+)
+
+
+@pytest.fixture
+async def fresh_engine(tmp_path):
+    """Engine over an empty SQLite file."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'fresh.db'}")
+    yield engine
+    await engine.dispose()
+
+
+class TestWaitForDb:
+    """Tests for the backoff database wait."""
+
+    @pytest.mark.asyncio
+    async def test_returns_when_reachable(self, fresh_engine):
+        """A reachable database returns on the first attempt."""
+        await wait_for_db(fresh_engine, timeout_seconds=1)
+
+    @pytest.mark.asyncio
+    async def test_times_out_when_unreachable(self, tmp_path):
+        """An unreachable database raises TimeoutError after the deadline."""
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'missing' / 'x.db'}")
+        try:
+            with pytest.raises(TimeoutError, match="not reachable"):
+                await wait_for_db(engine, timeout_seconds=0.2, initial_delay=0.01)
+        finally:
+            await engine.dispose()
+
+
+class TestEnsureSchema:
+    """Tests for version-gated table creation."""
+
+    @pytest.mark.asyncio
+    async def test_creates_then_skips(self, fresh_engine):
+        """The first boot creates tables; an unchanged second boot does no DDL."""
+        assert await ensure_schema(fresh_engine) is True
+        assert await ensure_schema(fresh_engine) is False
+
+        async with fresh_engine.connect() as conn:
+            stored = (
+                await conn.execute(
+                    select(SystemSettings.value).where(SystemSettings.key == SCHEMA_VERSION_KEY)
+                )
+            ).scalar_one()
+        assert json.loads(stored) == schema_fingerprint()
+
+    @pytest.mark.asyncio
+    async def test_reruns_when_version_changes(self, fresh_engine):
+        """A different stored version triggers create_all and is updated."""
+        await ensure_schema(fresh_engine)
+        async with fresh_engine.begin() as conn:
+            await conn.execute(
+                update(SystemSettings)
+                .where(SystemSettings.key == SCHEMA_VERSION_KEY)
+                .values(value=json.dumps("old"))
+            )
+
+        assert await ensure_schema(fresh_engine) is True
+        assert await ensure_schema(fresh_engine) is False
+
+    @pytest.mark.asyncio
+    async def test_adds_columns_missing_from_existing_tables(self, fresh_engine):
+        """Columns and indexes from newer models are added to an older database."""
+        await ensure_schema(fresh_engine)
+        async with fresh_engine.begin() as conn:
+            await conn.execute(text("DROP INDEX ix_backups_device_id_created_at"))
+            await conn.execute(text("ALTER TABLE backups DROP COLUMN verified_at"))
+            await conn.execute(text("ALTER TABLE schedules DROP COLUMN keep_daily"))
+            await _forget_version(conn)
+
+        assert await ensure_schema(fresh_engine) is True
+
+        async with fresh_engine.connect() as conn:
+            backups, schedules, indexes = await conn.run_sync(
+                lambda sync: (
+                    {c["name"] for c in inspect(sync).get_columns("backups")},
+                    {c["name"] for c in inspect(sync).get_columns("schedules")},
+                    {i["name"] for i in inspect(sync).get_indexes("backups")},
+                )
+            )
+        assert "verified_at" in backups
+        assert "keep_daily" in schedules
+        assert "ix_backups_device_id_created_at" in indexes
+
+    @pytest.mark.asyncio
+    async def test_refuses_required_column_without_default(self, fresh_engine):
+        """A missing NOT NULL column with no default stops startup and is named."""
+        await ensure_schema(fresh_engine)
+        async with fresh_engine.begin() as conn:
+            await conn.execute(text("ALTER TABLE devices DROP COLUMN device_type"))
+            await _forget_version(conn)
+
+        with pytest.raises(RuntimeError, match=r"devices\.device_type"):
+            await ensure_schema(fresh_engine)
+
+
+async def _forget_version(conn):
+    await conn.execute(
+        update(SystemSettings)
+        .where(SystemSettings.key == SCHEMA_VERSION_KEY)
+        .values(value=json.dumps("old"))
+    )
+
+
+class TestStartup:
+    """Tests for coordinating startup across processes."""
+
+    @pytest.mark.asyncio
+    async def test_waits_for_startup_lock(self, test_engine):
+        """Schema setup waits while another process holds the startup lock."""
+        if test_engine.dialect.name != "postgresql":
+            pytest.skip("advisory locks need PostgreSQL")
+
+        async with advisory_lock(test_engine, get_settings().startup_lock_id):
+            task = asyncio.create_task(startup(test_engine))
+            await asyncio.sleep(0.2)
+            assert not task.done()
+        await asyncio.wait_for(task, 5)
+
+    @pytest.mark.asyncio
+    async def test_admin_created_concurrently_is_not_an_error(self, session_factory, monkeypatch):
+        """Losing the race to insert the admin counts as already existing."""
+
+        async def racing_ensure_admin(db, *args):
+            raise IntegrityError("INSERT INTO users", {}, Exception("duplicate key"))
+
+        monkeypatch.setattr(get_settings(), "admin_password", "adminpassword")
+        monkeypatch.setattr(startup_module, "ensure_admin", racing_ensure_admin)
+
+        await bootstrap_admin(session_factory)
+
+
+class TestEnsureAdmin:
+    """Tests for in-process admin bootstrap."""
+
+    @pytest.mark.asyncio
+    async def test_creates_admin_once(self, test_db):
+        """The admin is created on the first call and left alone afterwards."""
+        first = await ensure_admin(test_db, "admin", "admin@localhost", "adminpassword")
+        second = await ensure_admin(test_db, "other", "other@localhost", "adminpassword")
+
+        assert "created" in first
+        assert "already exists" in second
+        admins = (await test_db.execute(select(User).where(User.is_admin))).scalars().all()
+        assert [a.username for a in admins] == ["admin"]
+
+    @pytest.mark.asyncio
+    async def test_rejects_short_password(self, test_db):
+        """Passwords under 8 characters are refused."""
+        with pytest.raises(ValueError, match="at least 8"):
+            await ensure_admin(test_db, "admin", "admin@localhost", "short")
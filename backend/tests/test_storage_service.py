@@ -0,0 +1,177 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - Storage Service Tests
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import delete, insert, select, update
+
+from app.config import get_settings
+from app.models.backup import Backup
+from app.models.device import Device
+from app.models.storage_counter import DeviceStorageCounter
+from app.services.storage_service import StorageService
+
+
+def _backup(device_id, file_size, status="completed"):
+    return Backup(
+        device_id=device_id,
+        filename="b.unf",
+        file_path="",
+        file_size=file_size,
+        backup_type="manual",
+        status=status,
+    )
+
+
+async def _counter(db, device_id):
+    result = await db.execute(
+        select(DeviceStorageCounter)
+        .where(DeviceStorageCounter.device_id == device_id)
+        .execution_options(populate_existing=True)
+    )
+    counter = result.scalar_one_or_none()
+    return (counter.backup_count, counter.total_size) if counter else (0, 0)
+
+
+class TestStorageCounters:
+    """Tests that per-device counters follow backup changes."""
+
+    @pytest.mark.asyncio
+    async def test_completed_backups_are_counted(self, test_db, test_device: Device):
+        """Completed backups add to count and size; others do not."""
+        test_db.add_all(
+            [
+                _backup(test_device.id, 100),
+                _backup(test_device.id, 250),
+                _backup(test_device.id, 0, status="running"),
+            ]
+        )
+        await test_db.commit()
+
+        assert await _counter(test_db, test_device.id) == (2, 350)
+
+    @pytest.mark.asyncio
+    async def test_completion_updates_counter(self, test_db, test_device: Device):
+        """A running backup is counted once it completes with its final size."""
+        backup = _backup(test_device.id, 0, status="running")
+        test_db.add(backup)
+        await test_db.commit()
+        assert await _counter(test_db, test_device.id) == (0, 0)
+
+        backup.status = "completed"
+        backup.file_size = 4096
+        await test_db.commit()
+
+        assert await _counter(test_db, test_device.id) == (1, 4096)
+
+    @pytest.mark.asyncio
+    async def test_delete_updates_counter(self, test_db, test_device: Device):
+        """Deleting a completed backup subtracts it from the counter."""
+        keep, drop = _backup(test_device.id, 10), _backup(test_device.id, 20)
+        test_db.add_all([keep, drop])
+        await test_db.commit()
+
+        await test_db.delete(drop)
+        await test_db.commit()
+
+        assert await _counter(test_db, test_device.id) == (1, 10)
+
+    @pytest.mark.asyncio
+    async def test_reconcile_repairs_drift(self, test_db, test_device: Device):
+        """Reconcile rewrites counters that disagree with the backups table."""
+        test_db.add(_backup(test_device.id, 500))
+        await test_db.commit()
+        await test_db.execute(update(DeviceStorageCounter).values(backup_count=99, total_size=1))
+        await test_db.commit()
+
+        drifted = await StorageService.reconcile(test_db)
+
+        assert drifted == 1
+        assert await _counter(test_db, test_device.id) == (1, 500)
+        assert await StorageService.reconcile(test_db) == 0
+
+    @pytest.mark.asyncio
+    async def test_reconcile_creates_missing_counter(self, test_db, test_device: Device):
+        """A device without a counter row gets one holding its real totals."""
+        test_db.add(_backup(test_device.id, 500))
+        await test_db.commit()
+        await test_db.execute(delete(DeviceStorageCounter))
+        await test_db.commit()
+
+        assert await StorageService.reconcile(test_db) == 1
+        assert await _counter(test_db, test_device.id) == (1, 500)
+
+    @pytest.mark.asyncio
+    async def test_reconcile_tolerates_counter_created_meanwhile(
+        self, test_db, session_factory, test_engine, test_device: Device, monkeypatch
+    ):
+        """A counter row an ingest inserts mid-reconcile is upserted, not a conflict."""
+        if test_engine.dialect.name != "postgresql":
+            pytest.skip("needs concurrent writers")
+        test_db.add(_backup(test_device.id, 500))
+        await test_db.commit()
+        await test_db.execute(delete(DeviceStorageCounter))
+        await test_db.commit()
+        execute = test_db.execute
+        calls = []
+
+        async def racing_execute(statement, *args, **kwargs):
+            calls.append(statement)
+            if len(calls) == 2:  # after the counters were read, before the insert
+                async with session_factory() as other:
+                    await other.execute(
+                        insert(DeviceStorageCounter).values(
+                            device_id=test_device.id, backup_count=0, total_size=0
+                        )
+                    )
+                    await other.commit()
+            return await execute(statement, *args, **kwargs)
+
+        monkeypatch.setattr(test_db, "execute", racing_execute)
+        assert await StorageService.reconcile(test_db) == 1
+        monkeypatch.undo()
+
+        assert await _counter(test_db, test_device.id) == (1, 500)
+
+
+class TestStorageEndpoint:
+    """Tests for GET /api/settings/storage endpoint."""
+
+    @pytest.mark.asyncio
+    async def test_storage_stats(
+        self,
+        async_client: AsyncClient,
+        test_db,
+        test_device: Device,
+        auth_headers: dict,
+        tmp_path,
+        monkeypatch,
+    ):
+        """Stats combine the counters with disk usage of backup_path."""
+        monkeypatch.setattr(get_settings(), "backup_path", str(tmp_path))
+        test_db.add_all([_backup(test_device.id, 100), _backup(test_device.id, 300)])
+        await test_db.commit()
+
+        response = await async_client.get("/api/settings/storage", headers=auth_headers)
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total_backups"] == 2
+        assert data["total_space"] > 0
+        assert 0 <= data["usage_percent"] <= 100
+        assert data["by_device"] == [
+            {
+                "device_id": test_device.id,
+                "device_name": test_device.name,
+                "backup_count": 2,
+                "total_size": 400,
+            }
+        ]
+
+    @pytest.mark.asyncio
+    async def test_storage_stats_unauthenticated(self, async_client: AsyncClient):
+        """Unauthenticated requests should return 401."""
+        response = await async_client.get("/api/settings/storage")
+
+        assert response.status_code == 401
@@ -0,0 +1,49 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - TTL Cache Tests
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import time
+
+from app.services.ttl_cache import TTLCache
+
+
+class TestTTLCache:
+    """Tests for the LRU + TTL cache primitive."""
+
+    def test_hit_and_miss_counters(self):
+        """Lookups should be counted as hits or misses."""
+        cache = TTLCache(max_entries=10, ttl_seconds=60)
+        cache.put("a", 1)
+
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_evicts_least_recently_used(self):
+        """The least recently used entry is evicted when full."""
+        cache = TTLCache(max_entries=2, ttl_seconds=60)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.get("c") == 3
+
+    def test_entries_expire(self, monkeypatch):
+        """Entries are not returned after their TTL."""
+        cache = TTLCache(max_entries=10, ttl_seconds=5)
+        cache.put("a", 1)
+        now = time.monotonic()
+        monkeypatch.setattr(time, "monotonic", lambda: now + 6)
+
+        assert cache.get("a") is None
+        assert len(cache) == 0
+
+    def test_put_never_exceeds_default_ttl(self):
+        """A longer per-entry TTL is capped; a non-positive one is not stored."""
+        cache = TTLCache(max_entries=10, ttl_seconds=5)
+        cache.put("a", 1, ttl_seconds=-1)
+
+        assert cache.get("a") is None
@@ -0,0 +1,72 @@
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# UniFi Backup Manager - User Cache Tests
+# -=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+import time
+
+import pytest
+from httpx import AsyncClient
+
+from app.models.user import User
+from app.services.user_cache import user_cache
+
+
+class TestPayloadCache:
+    """Tests for caching decoded token payloads."""
+
+    def test_expired_token_payload_not_cached(self):
+        """Payloads whose exp is in the past are never cached."""
+        user_cache.put_payload("tok", {"sub": "1", "exp": time.time() - 1})
+
+        assert user_cache.get_payload("tok") is None
+
+
+class TestCurrentUserCaching:
+    """Tests for caching in get_current_user."""
+
+    @pytest.mark.asyncio
+    async def test_repeat_requests_hit_cache(
+        self, async_client: AsyncClient, test_user: User, auth_headers: dict
+    ):
+        """The second request with the same token is served from the cache."""
+        await async_client.get("/api/auth/me", headers=auth_headers)
+        response = await async_client.get("/api/auth/me", headers=auth_headers)
+
+        assert response.status_code == 200
+        assert response.json()["username"] == "testuser"
+        stats = user_cache.stats()
+        assert stats["token_hits"] == 1
+        assert stats["user_hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_deactivation_invalidates(
+        self, async_client: AsyncClient, test_db, test_user: User, auth_headers: dict
+    ):
+        """Disabling a user takes effect on the next request."""
+        assert (await async_client.get("/api/auth/me", headers=auth_headers)).status_code == 200
+
+        test_user.is_active = False
+        await test_db.commit()
+
+        response = await async_client.get("/api/auth/me", headers=auth_headers)
+        assert response.status_code == 403
+
+    @pytest.mark.asyncio
+    async def test_password_change_through_cached_user(
+        self, async_client: AsyncClient, test_user: User, auth_headers: dict
+    ):
+        """Changing the password with a cached user persists and invalidates it."""
+        await async_client.get("/api/auth/me", headers=auth_headers)
+
+        response = await async_client.put(
+            "/api/auth/password",
+            headers=auth_headers,
+            json={"current_password": "testpassword123", "new_password": "newpassword456"},
+        )
+        assert response.status_code == 200
+        assert user_cache.get_user(test_user.id) is None
+
+        login = await async_client.post(
+            "/api/auth/login", json={"username": "testuser", "password": "newpassword456"}
+        )
+        assert login.status_code == 200